@@ -0,0 +1,286 @@
+import os
+import sys
+import time
+import importlib
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEVDW_DIR = os.path.join(ROOT_DIR, "devstage_to_devdw")
+sys.path.append(ROOT_DIR)
+sys.path.append(DEVDW_DIR)
+from db_utils import get_redshift_connection, METADATA_SCHEMA
+from schema_utils import ensure_table
+from summary_utils import SUMMARY_LOAD_LOG
+from step_log_utils import StepLogger
+from retry_utils import retry_call
+from scheduler_utils import ready_tasks, task_ranks
+
+# A backfill rebuilds summary tables one month partition at a time instead of
+# one statement over all history. Each partition is an idempotent replace of
+# its own date range in its own transaction (the table script's
+# backfill_partition), tracked in summary_backfill_state so an interrupted
+# backfill resumes with the partitions that are not done.
+BACKFILL_STATE = "summary_backfill_state"
+BACKFILL_MAX_PARALLEL = int(os.getenv("BACKFILL_MAX_PARALLEL", "4"))
+
+# Backfillable summary tables and the summary tables their partitions read:
+# a month of monthly_customer_summary waits for the same month of
+# daily_customer_summary when both are being rebuilt, and likewise for products.
+BACKFILL_TABLES = {
+    "daily_customer_summary": [],
+    "daily_product_summary": [],
+    "monthly_customer_summary": ["daily_customer_summary"],
+    "monthly_product_summary": ["daily_product_summary"],
+}
+
+
+def month_partitions(first_month, last_month):
+    """[(first day, last day)] of every month from first_month to last_month (YYYY-MM)"""
+    start = date.fromisoformat(f"{first_month}-01")
+    last = date.fromisoformat(f"{last_month}-01")
+    if last < start:
+        raise ValueError(f"Backfill range ends before it starts: {first_month} .. {last_month}")
+    partitions = []
+    while start <= last:
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        partitions.append((start, next_month - timedelta(days=1)))
+        start = next_month
+    return partitions
+
+
+def load_partitions(backfill_id):
+    """{(table, range_start): (range_end, status)} of one backfill"""
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        ensure_table(cur, METADATA_SCHEMA, BACKFILL_STATE)
+        cur.execute(f"""
+            SELECT table_name, range_start, range_end, status
+            FROM {METADATA_SCHEMA}.{BACKFILL_STATE}
+            WHERE backfill_id = %s;
+        """, (backfill_id,))
+        partitions = {(table, start): (end, status) for table, start, end, status in cur.fetchall()}
+        conn.commit()
+        return partitions
+    finally:
+        cur.close()
+        conn.close()
+
+
+def set_partition_state(backfill_id, table, range_start, range_end, status,
+                        rows_deleted=None, rows_inserted=None, wall_seconds=None, error=None):
+    """Record pending / running / done / failed for one partition of a backfill"""
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        ensure_table(cur, METADATA_SCHEMA, BACKFILL_STATE)
+        cur.execute(f"""
+            UPDATE {METADATA_SCHEMA}.{BACKFILL_STATE}
+            SET
+                status = %s,
+                rows_deleted = COALESCE(%s, rows_deleted),
+                rows_inserted = COALESCE(%s, rows_inserted),
+                wall_seconds = COALESCE(%s, wall_seconds),
+                attempts = attempts + %s,
+                error = %s,
+                updated_at = GETDATE()
+            WHERE backfill_id = %s
+              AND table_name = %s
+              AND range_start = %s;
+        """, (status, rows_deleted, rows_inserted, wall_seconds, 1 if status == "running" else 0,
+              error, backfill_id, table, range_start))
+        if cur.rowcount == 0:
+            cur.execute(f"""
+                INSERT INTO {METADATA_SCHEMA}.{BACKFILL_STATE} (
+                    backfill_id,
+                    table_name,
+                    range_start,
+                    range_end,
+                    status,
+                    rows_deleted,
+                    rows_inserted,
+                    wall_seconds,
+                    attempts,
+                    error,
+                    updated_at
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, GETDATE());
+            """, (backfill_id, table, range_start, range_end, status, rows_deleted, rows_inserted,
+                  wall_seconds, 1 if status == "running" else 0, error))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error recording backfill state {table} {range_start}: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def plan_backfill(backfill_id, tables, first_month, last_month):
+    """Record every (table, month) partition of a new backfill as pending"""
+    unknown = [t for t in tables if t not in BACKFILL_TABLES]
+    if unknown:
+        raise ValueError(f"Not backfillable: {', '.join(unknown)}; expected some of {', '.join(BACKFILL_TABLES)}")
+    partitions = month_partitions(first_month, last_month)
+    for table in tables:
+        for range_start, range_end in partitions:
+            set_partition_state(backfill_id, table, range_start, range_end, "pending")
+    print(f"Backfill {backfill_id}: {len(tables)} table(s) x {len(partitions)} month(s) planned.")
+
+
+def prepare_tables():
+    """Create what every partition writes to before partitions run concurrently"""
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        ensure_table(cur, METADATA_SCHEMA, SUMMARY_LOAD_LOG)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def replace_partition(table, range_start, range_end):
+    """One partition in one transaction; returns (rows_deleted, rows_inserted)"""
+    module = importlib.import_module(table)
+    conn = get_redshift_connection()
+    step_log = StepLogger("summary_backfill", f"{table} {range_start:%Y-%m}")
+    cur = step_log.cursor(conn.cursor())
+    try:
+        _, rows_deleted, rows_inserted = module.backfill_partition(cur, range_start, range_end)
+        conn.commit()
+        return rows_deleted, rows_inserted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+        step_log.flush()
+
+
+def run_partition(backfill_id, table, range_start, range_end):
+    """Run one partition, recording its state; returns (succeeded, wall seconds)"""
+    set_partition_state(backfill_id, table, range_start, range_end, "running")
+    start = time.time()
+    try:
+        # A partition replaces its whole range, so a rerun after a transient error is safe
+        rows_deleted, rows_inserted = retry_call(replace_partition, table, range_start, range_end,
+                                                 description=f"backfill {table} {range_start:%Y-%m}")
+    except Exception as e:
+        print(f"Error backfilling {table} {range_start:%Y-%m}: {e}")
+        set_partition_state(backfill_id, table, range_start, range_end, "failed",
+                            wall_seconds=round(time.time() - start, 3), error=str(e)[:512])
+        return False, time.time() - start
+    seconds = time.time() - start
+    set_partition_state(backfill_id, table, range_start, range_end, "done", rows_deleted, rows_inserted,
+                        round(seconds, 3))
+    return True, seconds
+
+
+def run_backfill(backfill_id, workers=BACKFILL_MAX_PARALLEL):
+    """Run every partition of a backfill that is not done yet; returns True when all are done"""
+    os.environ["ETL_RUN_ID"] = backfill_id    # step log rows of all partitions share the backfill id
+    partitions = load_partitions(backfill_id)
+    if not partitions:
+        print(f"No backfill {backfill_id}.")
+        return False
+    tables = sorted({table for table, _ in partitions}, key=list(BACKFILL_TABLES).index)
+    prepare_tables()
+
+    keys = sorted(partitions, key=lambda k: (k[1], tables.index(k[0])))
+    deps = {(table, start): [(u, start) for u in BACKFILL_TABLES[table] if (u, start) in partitions]
+            for table, start in keys}
+    ranks = task_ranks(keys, deps, {k: 1.0 for k in keys})
+    finished = {k for k in keys if partitions[k][1] == "done"}
+    pending = set(keys) - finished
+    total, done_before = len(keys), len(finished)
+
+    print("======================================")
+    print(f"Backfill {backfill_id}: {len(pending)} of {total} partition(s) to run on {workers} worker(s)")
+    print("======================================")
+
+    start = time.time()
+    failed, running = set(), {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # A month waits for its upstream month; after a failure it stays pending for resume
+            for key in ready_tasks(pending, finished, deps, ranks)[:workers - len(running)]:
+                pending.remove(key)
+                running[pool.submit(run_partition, backfill_id, key[0], key[1], partitions[key][0])] = key
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                succeeded, seconds = future.result()
+                (finished if succeeded else failed).add(key)
+                completed = len(finished) - done_before + len(failed)
+                remaining = len(pending) + len(running)
+                eta = (time.time() - start) / completed * remaining / min(workers, max(remaining, 1))
+                print(f"[{len(finished)}/{total}] {key[0]} {key[1]:%Y-%m} "
+                      f"{'done' if succeeded else 'FAILED'} in {seconds:.1f}s; "
+                      f"{remaining} left, ETA {datetime.now() + timedelta(seconds=eta):%H:%M:%S}")
+
+    print(f"Backfill {backfill_id}: {len(finished)}/{total} partition(s) done, "
+          f"{len(failed)} failed, {len(pending)} waiting on a failed month "
+          f"({time.time() - start:.0f}s).")
+    if len(finished) < total:
+        print(f"Resume with: python backfill_utils.py resume {backfill_id}")
+    return len(finished) == total
+
+
+def print_status(backfill_id):
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT table_name, status, COUNT(*), SUM(rows_inserted), SUM(wall_seconds),
+                   MIN(range_start), MAX(range_end)
+            FROM {METADATA_SCHEMA}.{BACKFILL_STATE}
+            WHERE backfill_id = %s
+            GROUP BY table_name, status
+            ORDER BY table_name, status;
+        """, (backfill_id,))
+        print(f"{'table':<28} {'status':<8} {'months':>6} {'rows':>12} {'seconds':>9}  range")
+        for table, status, months, rows, seconds, first, last in cur.fetchall():
+            print(f"{table:<28} {status:<8} {months:>6} {rows or 0:>12} {seconds or 0:>9.1f}  {first} .. {last}")
+        cur.execute(f"""
+            SELECT table_name, range_start, error
+            FROM {METADATA_SCHEMA}.{BACKFILL_STATE}
+            WHERE backfill_id = %s
+              AND status = 'failed'
+            ORDER BY range_start;
+        """, (backfill_id,))
+        for table, range_start, error in cur.fetchall():
+            print(f"  {table} {range_start}: {error}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def option(args, name, default):
+    if name in args:
+        value = args[args.index(name) + 1]
+        del args[args.index(name):args.index(name) + 2]
+        return value
+    return default
+
+
+if __name__ == "__main__":
+    # python backfill_utils.py run <first YYYY-MM> <last YYYY-MM> [table ...] [--parallel N]
+    # python backfill_utils.py resume <backfill_id> [--parallel N]
+    # python backfill_utils.py status <backfill_id>
+    command, args = sys.argv[1], sys.argv[2:]
+    workers = int(option(args, "--parallel", BACKFILL_MAX_PARALLEL))
+    if command == "run":
+        backfill_id = f"backfill-{datetime.now():%Y%m%d%H%M%S}"
+        plan_backfill(backfill_id, args[2:] or list(BACKFILL_TABLES), args[0], args[1])
+        sys.exit(0 if run_backfill(backfill_id, workers) else 1)
+    elif command == "resume":
+        sys.exit(0 if run_backfill(args[0], workers) else 1)
+    elif command == "status":
+        print_status(args[0])
+    else:
+        sys.exit(f"Unknown command {command}")
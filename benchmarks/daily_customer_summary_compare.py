@@ -0,0 +1,261 @@
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "devstage_to_devdw"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, get_batch_date_from_redshift
+from daily_customer_summary import build_summary_select, SUMMARY_COLUMNS
+from schema_utils import CUSTOMER_DAY_SKETCHES
+from redshift_stats import last_query_id, scan_stats
+
+load_dotenv()
+
+# The legacy SELECT predates the HLL sketch columns
+LEGACY_COLUMNS = [c for c in SUMMARY_COLUMNS if c not in CUSTOMER_DAY_SKETCHES]
+
+# Columns that must match between the two versions (timestamps are excluded)
+COMPARE_COLUMNS = LEGACY_COLUMNS[:18]
+
+
+def build_legacy_select(batch_date):
+    """The five-CTE daily_customer_summary SELECT as it was before the single-scan rewrite"""
+    return f"""
+        WITH orders_cte AS (
+            SELECT 
+                CAST(o.orderDate AS DATE) AS summary_date,
+                o.dw_customer_id,
+                COUNT(DISTINCT o.dw_order_id) AS order_count,
+                1 AS order_apd,
+                SUM(od.priceEach * od.quantityOrdered) AS order_cost_amount,
+                0 AS cancelled_order_count,
+                0 AS cancelled_order_amount,
+                0 AS cancelled_order_apd,
+                0 AS shipped_order_count,
+                0 AS shipped_order_amount,
+                0 AS shipped_order_apd,
+                0 AS payment_apd,
+                0 AS payment_amount,
+                COUNT(DISTINCT od.dw_product_id) AS products_ordered_qty,
+                COUNT(od.quantityOrdered) AS products_items_qty,
+                SUM(p.MSRP * od.quantityOrdered) AS order_mrp_amount,
+                0 AS new_customer_apd,
+                0 AS new_customer_paid_apd
+            FROM {DEVDW_SCHEMA}.orders o
+            JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
+            JOIN {DEVDW_SCHEMA}.products p ON od.dw_product_id = p.dw_product_id
+            WHERE CAST(o.orderDate AS DATE) >= '{batch_date}'
+            GROUP BY 1,2
+        ),
+        customers_cte AS (
+            SELECT 
+                CAST(c.src_create_timestamp AS DATE) AS summary_date,
+                c.dw_customer_id,
+                0 AS order_count,
+                0 AS order_apd,
+                0 AS order_cost_amount,
+                0 AS cancelled_order_count,
+                0 AS cancelled_order_amount,
+                0 AS cancelled_order_apd,
+                0 AS shipped_order_count,
+                0 AS shipped_order_amount,
+                0 AS shipped_order_apd,
+                0 AS payment_apd,
+                0 AS payment_amount,
+                0 AS products_ordered_qty,
+                0 AS products_items_qty,
+                0 AS order_mrp_amount,
+                1 AS new_customer_apd,
+                0 AS new_customer_paid_apd
+            FROM {DEVDW_SCHEMA}.customers c
+            WHERE CAST(c.src_create_timestamp AS DATE) >= '{batch_date}'
+        ),
+        cancelled_cte AS (
+            SELECT 
+                CAST(o.cancelledDate AS DATE) AS summary_date,
+                o.dw_customer_id,
+                0 AS order_count,
+                0 AS order_apd,
+                0 AS order_cost_amount,
+                COUNT(o.dw_order_id) AS cancelled_order_count,
+                SUM(od.priceEach * od.quantityOrdered) AS cancelled_order_amount,
+                1 AS cancelled_order_apd,
+                0 AS shipped_order_count,
+                0 AS shipped_order_amount,
+                0 AS shipped_order_apd,
+                0 AS payment_apd,
+                0 AS payment_amount,
+                0 AS products_ordered_qty,
+                0 AS products_items_qty,
+                0 AS order_mrp_amount,
+                0 AS new_customer_apd,
+                0 AS new_customer_paid_apd
+            FROM {DEVDW_SCHEMA}.orders o
+            JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
+            WHERE CAST(o.cancelledDate AS DATE) >= '{batch_date}'
+              AND o.status = 'Cancelled'
+            GROUP BY 1,2
+        ),
+        payments_cte AS (
+            SELECT 
+                CAST(p.paymentDate AS DATE) AS summary_date,
+                p.dw_customer_id,
+                0 AS order_count,
+                0 AS order_apd,
+                0 AS order_cost_amount,
+                0 AS cancelled_order_count,
+                0 AS cancelled_order_amount,
+                0 AS cancelled_order_apd,
+                0 AS shipped_order_count,
+                0 AS shipped_order_amount,
+                0 AS shipped_order_apd,
+                1 AS payment_apd,
+                SUM(p.amount) AS payment_amount,
+                0 AS products_ordered_qty,
+                0 AS products_items_qty,
+                0 AS order_mrp_amount,
+                0 AS new_customer_apd,
+                1 AS new_customer_paid_apd
+            FROM {DEVDW_SCHEMA}.payments p
+            WHERE CAST(p.paymentDate AS DATE) >= '{batch_date}'
+            GROUP BY 1,2
+        ),
+        shipped_cte AS (
+            SELECT 
+                CAST(o.shippedDate AS DATE) AS summary_date,
+                o.dw_customer_id,
+                0 AS order_count,
+                0 AS order_apd,
+                0 AS order_cost_amount,
+                0 AS cancelled_order_count,
+                0 AS cancelled_order_amount,
+                0 AS cancelled_order_apd,
+                COUNT(o.dw_order_id) AS shipped_order_count,
+                SUM(od.priceEach * od.quantityOrdered) AS shipped_order_amount,
+                1 AS shipped_order_apd,
+                0 AS payment_apd,
+                0 AS payment_amount,
+                0 AS products_ordered_qty,
+                0 AS products_items_qty,
+                0 AS order_mrp_amount,
+                0 AS new_customer_apd,
+                0 AS new_customer_paid_apd
+            FROM {DEVDW_SCHEMA}.orders o
+            JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
+            WHERE CAST(o.shippedDate AS DATE) >= '{batch_date}'
+              AND o.status = 'Shipped'
+            GROUP BY 1,2
+        ),
+        combined_cte AS (
+            SELECT * FROM orders_cte
+            UNION ALL
+            SELECT * FROM customers_cte
+            UNION ALL
+            SELECT * FROM cancelled_cte
+            UNION ALL
+            SELECT * FROM payments_cte
+            UNION ALL
+            SELECT * FROM shipped_cte
+        )
+        SELECT
+            summary_date,
+            dw_customer_id,
+            MAX(order_count),
+            MAX(order_apd),
+            MAX(order_cost_amount),
+            MAX(cancelled_order_count),
+            MAX(cancelled_order_amount),
+            MAX(cancelled_order_apd),
+            MAX(shipped_order_count),
+            MAX(shipped_order_amount),
+            MAX(shipped_order_apd),
+            MAX(payment_apd),
+            MAX(payment_amount),
+            MAX(products_ordered_qty),
+            MAX(products_items_qty),
+            MAX(order_mrp_amount),
+            MAX(new_customer_apd),
+            MAX(new_customer_paid_apd),
+            CURRENT_TIMESTAMP,
+            CURRENT_TIMESTAMP,
+            b.etl_batch_no,
+            b.etl_batch_date
+        FROM combined_cte
+        CROSS JOIN j25gokulraj_etl_metadata.batch_control b
+        GROUP BY summary_date, dw_customer_id, b.etl_batch_no, b.etl_batch_date
+        """
+
+
+def run_version(cur, name, select_sql, columns):
+    """Materialize one version into a temp table and return its runtime and scan stats"""
+    columns = ", ".join(columns)
+    start = time.time()
+    cur.execute(f"CREATE TEMP TABLE cmp_{name} ({columns}) AS {select_sql};")
+    elapsed = time.time() - start
+
+    stats = scan_stats(cur, last_query_id(cur))
+
+    cur.execute(f"SELECT COUNT(*) FROM cmp_{name};")
+    row_count = cur.fetchone()[0]
+
+    stats["seconds"] = elapsed
+    stats["rows_out"] = row_count
+    return stats
+
+
+def count_mismatches(cur):
+    """Rows present in one version but not the other"""
+    columns = ", ".join(COMPARE_COLUMNS)
+    cur.execute(f"""
+        SELECT COUNT(*) FROM (
+            (SELECT {columns} FROM cmp_legacy EXCEPT SELECT {columns} FROM cmp_single_scan)
+            UNION ALL
+            (SELECT {columns} FROM cmp_single_scan EXCEPT SELECT {columns} FROM cmp_legacy)
+        ) diff;
+    """)
+    return cur.fetchone()[0]
+
+
+def compare(batch_date=None):
+    """Run the legacy and single-scan SELECTs for the same batch and print a comparison"""
+    batch_date = batch_date or get_batch_date_from_redshift()
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+
+    print("======================================")
+    print(f"Comparing daily_customer_summary SQL for {batch_date}")
+    print("======================================")
+
+    try:
+        # Result cache would make the second run look free
+        cur.execute("SET enable_result_cache_for_session TO off;")
+        results = {
+            "legacy": run_version(cur, "legacy", build_legacy_select(batch_date), LEGACY_COLUMNS),
+            "single_scan": run_version(cur, "single_scan", build_summary_select(batch_date), SUMMARY_COLUMNS),
+        }
+        mismatches = count_mismatches(cur)
+
+        print(f"{'version':<12} {'seconds':>9} {'bytes_scanned':>15} {'est_blocks':>10} {'rows_scanned':>13} {'rows_out':>9}  query_id")
+        for name, r in results.items():
+            print(f"{name:<12} {r['seconds']:>9.2f} {r['bytes_scanned']:>15} {r['est_blocks_from_bytes']:>10} "
+                  f"{r['rows_scanned']:>13} {r['rows_out']:>9}  {r['query_id']}")
+
+        legacy, single = results["legacy"], results["single_scan"]
+        if legacy["bytes_scanned"]:
+            print(f"Bytes scanned: {single['bytes_scanned'] / legacy['bytes_scanned']:.1%} of legacy")
+        if legacy["seconds"]:
+            print(f"Runtime: {single['seconds'] / legacy['seconds']:.1%} of legacy")
+        print(f"Mismatched rows: {mismatches}")
+        return results, mismatches
+
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+        print("Connection closed.")
+
+
+if __name__ == "__main__":
+    compare(sys.argv[1] if len(sys.argv) > 1 else None)
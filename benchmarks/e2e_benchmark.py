@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(ROOT_DIR)
+sys.path.append(BENCH_DIR)
+from db_utils import METADATA_SCHEMA
+from schema_utils import DEVSTAGE_SCHEMA
+from synthetic_data import generate, columns, SOURCE_TABLES
+import standins
+import warehouse_utils
+import storage_utils
+
+# Same order as the production .env lists (scripts / alltable)
+STAGES = [
+    ("source_to_s3", [f"{t}.py" for t in SOURCE_TABLES]),
+    ("s3_to_devstage", [f"{t}.py" for t in SOURCE_TABLES]),
+    ("devstage_to_devdw", [
+        "productlines.py", "products.py", "offices.py", "employees.py", "customers.py",
+        "orders.py", "orderdetails.py", "payments.py", "dimension_history.py",
+        "daily_customer_summary.py", "daily_product_summary.py",
+        "monthly_customer_summary.py", "monthly_product_summary.py",
+    ]),
+]
+COLUMN_ENV = {"customers": "customer_column", "employees": "employees_column",
+              "offices": "offices_column", "orderdetails": "orderdetails_column",
+              "orders": "orders_column", "payments": "payments_column",
+              "productlines": "productlines_column", "products": "products_column"}
+BUCKET = "bench"
+
+
+def bench_env(bench_root):
+    """Environment the table scripts expect from .env, pointed at the substitutes"""
+    env = dict(os.environ)
+    env.update({
+        standins.BENCH_ROOT_ENV: bench_root,
+        warehouse_utils.WAREHOUSE_ENGINE_ENV: "duckdb",
+        warehouse_utils.DUCKDB_PATH_ENV: os.path.join(bench_root, "warehouse.duckdb"),
+        storage_utils.STORAGE_BACKEND_ENV: "local",
+        storage_utils.LOCAL_EXTRACT_DIR_ENV: os.path.join(bench_root, "s3"),
+        "S3_BUCKET_NAME": BUCKET,
+        "AWS_REGION": "local",
+        "REDSHIFT_SCHEMA": DEVSTAGE_SCHEMA,
+        "REDSHIFT_IAM_ROLE": "local",
+        "ETL_TRACE": "0",
+    })
+    env.pop("ETL_PROFILE_DIR", None)
+    env.pop("ETL_TRACE_DIR", None)
+    for table, var in COLUMN_ENV.items():
+        env[var] = ", ".join(columns(table))
+    return env
+
+
+def warehouse_cursor(bench_root):
+    conn = warehouse_utils.DuckDBConnection(os.path.join(bench_root, "warehouse.duckdb"))
+    conn.autocommit = True
+    return conn, conn.cursor()
+
+
+def setup_warehouse(bench_root):
+    """Empty warehouse with every managed table plus the batch control tables"""
+    os.environ.update({k: v for k, v in bench_env(bench_root).items() if k.startswith("WAREHOUSE_")})
+    warehouse_utils.init_warehouse()
+
+
+def set_batch(bench_root, batch_no, batch_date):
+    conn, cur = warehouse_cursor(bench_root)
+    cur.execute(f"DELETE FROM {METADATA_SCHEMA}.batch_control;")
+    cur.execute(f"INSERT INTO {METADATA_SCHEMA}.batch_control VALUES (%s, %s);", (batch_no, batch_date))
+    conn.close()
+
+
+def run_task(stage, script, env):
+    """Run one table script on the substitutes; wall, CPU and peak RSS from wait4"""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "standins.py"), script],
+                            cwd=os.path.join(ROOT_DIR, stage), env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    text = output.decode(errors="replace")
+    failed = proc.returncode != 0 or "Error" in text
+    if failed:
+        print(text[-2000:])
+    return {
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024.0, 1),
+        "returncode": proc.returncode,
+        "failed": failed,
+    }
+
+
+def run_scale(scale, days, work_dir, seed):
+    """Generate a source at this scale and push every batch date through the three stages"""
+    bench_root = os.path.join(work_dir, f"sf{scale}")
+    shutil.rmtree(bench_root, ignore_errors=True)
+    manifest = generate(os.path.join(bench_root, "source"), scale, days=days, fmt="sqlite", seed=seed)
+    setup_warehouse(bench_root)
+    env = bench_env(bench_root)
+
+    results = []
+    for batch_no, batch in enumerate(manifest["batches"], 1):
+        set_batch(bench_root, batch_no, batch["batch_date"])
+        for stage, scripts in STAGES:
+            for script in scripts:
+                table = script[:-3]
+                r = run_task(stage, script, env)
+                rows = batch["rows"].get(table)
+                r.update({
+                    "scale": scale, "batch_date": batch["batch_date"], "stage": stage, "table": table,
+                    "rows": rows,
+                    "rows_per_second": round(rows / r["wall_seconds"], 1) if rows and r["wall_seconds"] else None,
+                })
+                results.append(r)
+                print(f"sf{scale} {batch['batch_date']} {stage:<18} {table:<28} "
+                      f"{r['wall_seconds']:>7.2f}s {r['peak_rss_mb']:>7.1f}MB"
+                      f"{'  FAILED' if r['failed'] else ''}")
+    return results
+
+
+def summarize(results):
+    """Per (scale, stage) and per (scale, stage, table) totals"""
+    summary = {}
+    for r in results:
+        for key in (f"sf{r['scale']}/{r['stage']}", f"sf{r['scale']}/{r['stage']}/{r['table']}"):
+            s = summary.setdefault(key, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_mb": 0.0,
+                                         "rows": 0, "failed": 0})
+            s["wall_seconds"] = round(s["wall_seconds"] + r["wall_seconds"], 3)
+            s["cpu_seconds"] = round(s["cpu_seconds"] + r["cpu_seconds"], 3)
+            s["peak_rss_mb"] = max(s["peak_rss_mb"], r["peak_rss_mb"])
+            s["rows"] += r["rows"] or 0
+            s["failed"] += int(r["failed"])
+    for s in summary.values():
+        s["rows_per_second"] = round(s["rows"] / s["wall_seconds"], 1) if s["rows"] and s["wall_seconds"] else None
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def benchmark(scales=(1,), days=3, work_dir=None, seed=42):
+    """Run the pipeline offline at each scale factor and write results/<time>-<commit>.json"""
+    work_dir = work_dir or os.path.join(ROOT_DIR, "bench_runs")
+    results = []
+    for scale in scales:
+        results.extend(run_scale(scale, days, work_dir, seed))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scales": list(scales),
+        "days": days,
+        "seed": seed,
+        "summary": summarize(results),
+        "tasks": results,
+    }
+    os.makedirs(os.path.join(work_dir, "results"), exist_ok=True)
+    path = os.path.join(work_dir, "results", f"{datetime.now():%Y%m%d%H%M%S}-{report['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("======================================")
+    for key, s in report["summary"].items():
+        if key.count("/") == 1:
+            print(f"{key:<28} {s['wall_seconds']:>8.2f}s {s['peak_rss_mb']:>7.1f}MB "
+                  f"{s['rows_per_second'] or '':>10} rows/s{'  FAILED x' + str(s['failed']) if s['failed'] else ''}")
+    print(f"Results written to {path}")
+    return report
+
+
+def compare(baseline_path, current_path):
+    """Wall time per stage and table: baseline vs current results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["summary"]
+    with open(current_path) as f:
+        current = json.load(f)["summary"]
+    print(f"{'task':<56} {'base_s':>8} {'curr_s':>8} {'change':>8}")
+    for key in sorted(set(baseline) & set(current)):
+        b, c = baseline[key]["wall_seconds"], current[key]["wall_seconds"]
+        change = f"{(c - b) / b * 100:+.0f}%" if b else ""
+        print(f"{key:<56} {b:>8.2f} {c:>8.2f} {change:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--scales", default="1", help="comma separated scale factors, e.g. 1,10,100")
+    parser.add_argument("--days", type=int, default=3, help="batch dates per scale factor")
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"))
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        benchmark([int(s) for s in args.scales.split(",")], args.days, args.work_dir, args.seed)
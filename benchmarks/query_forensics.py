@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Flag thresholds
+SKEW_RATIO_THRESHOLD = 3.0        # busiest slice vs. average slice of one step
+SKEW_MIN_ROWS = 10000             # ignore skew on steps this small
+BROADCAST_ROWS_THRESHOLD = 1000000
+REDISTRIBUTE_ROWS_THRESHOLD = 10000000
+COMPILE_SECONDS_THRESHOLD = 5.0
+WORST_OFFENDERS = 10
+
+# Stages whose statements are ranked as offenders
+FLAGGED_STAGES = ("devstage_to_devdw",)
+
+# System table extracts, one SELECT each. Everything the report needs is
+# captured here, so a dump of these rows is enough to rebuild it offline.
+SYSTEM_QUERIES = {
+    "stl_query": """
+        SELECT query, DATEDIFF(ms, starttime, endtime) AS elapsed_ms, aborted,
+               TRIM(SUBSTRING(querytxt, 1, 200)) AS querytxt
+        FROM stl_query
+        WHERE query IN ({ids});
+    """,
+    "svl_query_summary": """
+        SELECT query, stm, seg, step, TRIM(label) AS label, rows, bytes,
+               CASE WHEN is_diskbased = 't' THEN 1 ELSE 0 END AS is_diskbased, workmem
+        FROM svl_query_summary
+        WHERE query IN ({ids});
+    """,
+    "svl_query_report": """
+        SELECT query, slice, segment, step, TRIM(label) AS label, rows, bytes
+        FROM svl_query_report
+        WHERE query IN ({ids});
+    """,
+    "svl_compile": """
+        SELECT query, segment, compile, DATEDIFF(ms, starttime, endtime) AS compile_ms
+        FROM svl_compile
+        WHERE query IN ({ids});
+    """,
+}
+
+
+def fetch_rows(cur, sql, params=None):
+    cur.execute(sql, params)
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in cur.fetchall()]
+
+
+def fetch_live(run_id):
+    """Step log of the run plus the system table rows of its Redshift queries"""
+    from db_utils import get_redshift_connection, METADATA_SCHEMA
+    from step_log_utils import STEP_LOG
+
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        dump = {"run_id": run_id}
+        dump["step_log"] = fetch_rows(cur, f"""
+            SELECT stage, table_name, step_name, engine, query_id, rowcount, wall_seconds, status
+            FROM {METADATA_SCHEMA}.{STEP_LOG}
+            WHERE run_id = %s
+            ORDER BY start_time;
+        """, (run_id,))
+        ids = sorted(query_ids(dump["step_log"]))
+        for name, sql in SYSTEM_QUERIES.items():
+            dump[name] = fetch_rows(cur, sql.format(ids=", ".join(map(str, ids)))) if ids else []
+        return dump
+    finally:
+        cur.close()
+        conn.close()
+
+
+def query_ids(step_log):
+    """Redshift query ids recorded in the step log (pg_last_query_id() is -1 when none ran)"""
+    ids = set()
+    for step in step_log:
+        qid = step.get("query_id")
+        if step.get("engine") == "redshift" and qid is not None and str(qid).lstrip("-").isdigit():
+            if int(qid) > 0:
+                ids.add(int(qid))
+    return ids
+
+
+def summarize_query(qid, dump):
+    """Bytes scanned, broadcast/redistributed rows, spill, skew and compile time of one query"""
+    summary = [r for r in dump["svl_query_summary"] if r["query"] == qid]
+    report = [r for r in dump["svl_query_report"] if r["query"] == qid]
+    compiles = [r for r in dump["svl_compile"] if r["query"] == qid]
+    query = next((r for r in dump["stl_query"] if r["query"] == qid), {})
+
+    stats = {
+        "query_id": qid,
+        "elapsed_s": (query.get("elapsed_ms") or 0) / 1000.0,
+        "aborted": bool(query.get("aborted")),
+        "bytes_scanned": sum(r["bytes"] or 0 for r in summary if r["label"].startswith("scan")),
+        "rows_broadcast": sum(r["rows"] or 0 for r in summary if r["label"].startswith("bcast")),
+        "rows_redistributed": sum(r["rows"] or 0 for r in summary if r["label"].startswith("dist")),
+        "spill_steps": sum(1 for r in summary if r["is_diskbased"]),
+        "spill_workmem": sum(r["workmem"] or 0 for r in summary if r["is_diskbased"]),
+        "compile_s": sum(r["compile_ms"] or 0 for r in compiles if r["compile"]) / 1000.0,
+        "skew_ratio": 0.0,
+        "skew_step": None,
+    }
+
+    per_step = defaultdict(list)
+    for r in report:
+        per_step[(r["segment"], r["step"], r["label"])].append(r["rows"] or 0)
+    for (segment, step, label), slice_rows in per_step.items():
+        avg = sum(slice_rows) / len(slice_rows)
+        if avg * len(slice_rows) < SKEW_MIN_ROWS or avg == 0:
+            continue
+        ratio = max(slice_rows) / avg
+        if ratio > stats["skew_ratio"]:
+            stats["skew_ratio"] = ratio
+            stats["skew_step"] = f"seg {segment} step {step} {label}"
+    return stats
+
+
+def flags_for(stats):
+    flags = []
+    if stats["spill_steps"]:
+        flags.append("SPILL")
+    if stats["rows_broadcast"] >= BROADCAST_ROWS_THRESHOLD:
+        flags.append("BCAST")
+    if stats["rows_redistributed"] >= REDISTRIBUTE_ROWS_THRESHOLD:
+        flags.append("REDIST")
+    if stats["skew_ratio"] >= SKEW_RATIO_THRESHOLD:
+        flags.append("SKEW")
+    if stats["compile_s"] >= COMPILE_SECONDS_THRESHOLD:
+        flags.append("COMPILE")
+    if stats["aborted"]:
+        flags.append("ABORTED")
+    return flags
+
+
+def build_report(dump):
+    """One entry per recorded Redshift statement of the run"""
+    entries = []
+    for step in dump["step_log"]:
+        ids = query_ids([step])
+        if not ids:
+            continue
+        stats = summarize_query(ids.pop(), dump)
+        stats.update({
+            "stage": step["stage"],
+            "table_name": step["table_name"],
+            "step_name": step["step_name"],
+            "wall_seconds": step["wall_seconds"] or 0,
+        })
+        stats["flags"] = flags_for(stats)
+        entries.append(stats)
+    return entries
+
+
+def print_report(run_id, entries):
+    print("======================================")
+    print(f"Query forensics for run {run_id}: {len(entries)} statement(s)")
+    print("======================================")
+    print(f"{'table':<26} {'step':<44} {'wall_s':>7} {'MB_scan':>8} {'bcast':>10} "
+          f"{'redist':>10} {'spill':>5} {'skew':>5} {'comp_s':>6}  flags")
+    for e in entries:
+        print(f"{e['table_name'][:26]:<26} {e['step_name'][:44]:<44} {e['wall_seconds']:>7.1f} "
+              f"{e['bytes_scanned'] / 1048576:>8.1f} {e['rows_broadcast']:>10} {e['rows_redistributed']:>10} "
+              f"{e['spill_steps']:>5} {e['skew_ratio']:>5.1f} {e['compile_s']:>6.1f}  {','.join(e['flags'])}")
+
+    offenders = [e for e in entries if e["flags"] and e["stage"] in FLAGGED_STAGES]
+    offenders.sort(key=lambda e: e["wall_seconds"], reverse=True)
+    print("--------------------------------------")
+    print(f"Worst devdw offenders (top {WORST_OFFENDERS}):")
+    if not offenders:
+        print("  none")
+    for e in offenders[:WORST_OFFENDERS]:
+        detail = f" ({e['skew_step']})" if "SKEW" in e["flags"] else ""
+        print(f"  {e['table_name']}: {e['step_name']} {e['wall_seconds']:.1f}s "
+              f"query {e['query_id']} [{', '.join(e['flags'])}]{detail}")
+
+
+def forensics(run_id=None, dump_path=None, capture_path=None):
+    """Report a run live from Redshift, or offline from a dump written by --capture"""
+    if dump_path:
+        with open(dump_path) as f:
+            dump = json.load(f)
+        run_id = run_id or dump["run_id"]
+    else:
+        dump = fetch_live(run_id)
+        if capture_path:
+            with open(capture_path, "w") as f:
+                json.dump(dump, f, default=str)
+            print(f"System table dump written to {capture_path}")
+
+    entries = build_report(dump)
+    print_report(run_id, entries)
+    return entries
+
+
+if __name__ == "__main__":
+    # python query_forensics.py <run_id> [--capture dump.json]
+    # python query_forensics.py --dump dump.json
+    args = sys.argv[1:]
+    dump_path = args[args.index("--dump") + 1] if "--dump" in args else None
+    capture_path = args[args.index("--capture") + 1] if "--capture" in args else None
+    positional = [a for a in args if not a.startswith("--") and a not in (dump_path, capture_path)]
+    forensics(positional[0] if positional else None, dump_path, capture_path)
@@ -0,0 +1,32 @@
+def last_query_id(cur):
+    cur.execute("SELECT pg_last_query_id();")
+    return cur.fetchone()[0]
+
+
+def scan_stats(cur, query_id):
+    """Rows/bytes scanned by one query, from stl_scan.
+
+    est_blocks_from_bytes is bytes_scanned rounded up to 1 MB blocks, an
+    estimate, not a block count. rows_pre_filter counts rows in the blocks
+    actually read, so comparing it with the table's row count shows how much
+    zone maps pruned.
+    """
+    cur.execute("""
+        SELECT
+            COALESCE(SUM(bytes), 0),
+            COALESCE(SUM(rows_pre_filter), 0),
+            COALESCE(SUM(rows), 0),
+            COUNT(DISTINCT segment)
+        FROM stl_scan
+        WHERE query = %s
+          AND type = 2;
+    """, (query_id,))
+    bytes_scanned, rows_pre_filter, rows_out, scan_segments = cur.fetchone()
+    return {
+        "query_id": query_id,
+        "bytes_scanned": bytes_scanned,
+        "est_blocks_from_bytes": -(-bytes_scanned // 1048576),
+        "rows_pre_filter": rows_pre_filter,
+        "rows_scanned": rows_out,
+        "scan_segments": scan_segments,
+    }
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, get_batch_date_from_redshift
+from schema_utils import DEVDW_SCHEMA
+from redshift_stats import last_query_id, scan_stats
+
+load_dotenv()
+
+# (name, predicate before the sargable rewrite, predicate after)
+# Each pair selects the same rows; only the "after" form can use zone maps.
+PREDICATE_PAIRS = [
+    (
+        "orders by orderDate",
+        "FROM {dw}.orders o WHERE CAST(o.orderDate AS DATE) >= '{batch_date}'",
+        "FROM {dw}.orders o WHERE o.orderDate >= '{batch_date}'",
+    ),
+    (
+        "payments by paymentDate",
+        "FROM {dw}.payments p WHERE CAST(p.paymentDate AS DATE) >= '{batch_date}'",
+        "FROM {dw}.payments p WHERE p.paymentDate >= '{batch_date}'",
+    ),
+    (
+        "new customers",
+        "FROM {dw}.customers c WHERE CAST(c.src_create_timestamp AS DATE) >= '{batch_date}'",
+        "FROM {dw}.customers c WHERE c.src_create_timestamp >= '{batch_date}'",
+    ),
+    (
+        "ordered lines",
+        "FROM {dw}.orders o JOIN {dw}.orderdetails od ON o.dw_order_id = od.dw_order_id "
+        "WHERE CAST(o.orderDate AS DATE) >= '{batch_date}'",
+        "FROM {dw}.order_line_fact f WHERE f.order_date >= '{batch_date}'",
+    ),
+    (
+        "cancelled lines",
+        "FROM {dw}.orders o JOIN {dw}.orderdetails od ON o.dw_order_id = od.dw_order_id "
+        "WHERE LOWER(TRIM(o.status)) = 'cancelled' AND CAST(o.cancelledDate AS DATE) >= '{batch_date}'",
+        "FROM {dw}.order_line_fact f WHERE f.is_cancelled AND f.cancelled_date >= '{batch_date}'",
+    ),
+]
+
+
+def run_count(cur, from_where):
+    start = time.time()
+    cur.execute(f"SELECT COUNT(*) {from_where};")
+    row_count = cur.fetchone()[0]
+    stats = scan_stats(cur, last_query_id(cur))
+    stats["seconds"] = time.time() - start
+    stats["rows_out"] = row_count
+    return stats
+
+
+def pruning_report(batch_date=None):
+    """Run each before/after predicate pair and print bytes (as estimated blocks) and rows scanned"""
+    batch_date = batch_date or get_batch_date_from_redshift()
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+
+    print("======================================")
+    print(f"Sort key pruning report for {batch_date}")
+    print("======================================")
+
+    try:
+        cur.execute("SET enable_result_cache_for_session TO off;")
+        print(f"{'predicate':<24} {'version':<7} {'est_blocks':>10} {'rows_pre_filter':>16} {'rows_out':>10} {'seconds':>8}")
+        report = []
+        for name, before, after in PREDICATE_PAIRS:
+            for version, sql in (("before", before), ("after", after)):
+                r = run_count(cur, sql.format(dw=DEVDW_SCHEMA, batch_date=batch_date))
+                report.append((name, version, r))
+                print(f"{name:<24} {version:<7} {r['est_blocks_from_bytes']:>10} {r['rows_pre_filter']:>16} "
+                      f"{r['rows_out']:>10} {r['seconds']:>8.2f}")
+        return report
+
+    finally:
+        cur.close()
+        conn.close()
+        print("Connection closed.")
+
+
+if __name__ == "__main__":
+    pruning_report(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,104 @@
+import os
+import re
+import sys
+import types
+import runpy
+import sqlite3
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local substitute for Oracle, installed in place of the oracledb module
+# before a table script is started: $BENCH_ROOT/source/CM_YYYYMMDD.sqlite
+# (synthetic_data.py --format sqlite). Extracts and the warehouse use the
+# local storage backend and the DuckDB engine (see e2e_benchmark.bench_env).
+BENCH_ROOT_ENV = "BENCH_ROOT"
+
+
+def bench_path(*parts):
+    return os.path.join(os.environ[BENCH_ROOT_ENV], *parts)
+
+
+# -- Oracle: one SQLite file per dated CM_ schema ---------------------------
+
+DBLINK_PATTERN = re.compile(r"CREATE\s+PUBLIC\s+DATABASE\s+LINK\s+\w+\s+CONNECT\s+TO\s+(\w+)", re.IGNORECASE)
+TO_DATE_PATTERN = re.compile(r"TO_DATE\(\s*('[^']*')\s*,\s*'[^']*'\s*\)", re.IGNORECASE)
+
+
+class SourceCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._cur = None
+        self.description = None
+
+    def execute(self, sql, *args):
+        link = DBLINK_PATTERN.search(sql)
+        if link:
+            # prepare_dblink picks the dated schema; open its SQLite file
+            self.connection.open_schema(link.group(1))
+            return
+        if re.match(r"\s*(ALTER\s+SESSION|DROP\s+PUBLIC\s+DATABASE\s+LINK)", sql, re.IGNORECASE):
+            return
+        if "v$session" in sql:
+            raise RuntimeError("v$session is not available in the SQLite source")
+        sql = TO_DATE_PATTERN.sub(r"\1", sql.replace("@gokul_dblink", ""))
+        self._cur = self.connection.sqlite.cursor()
+        self._cur.execute(sql, *args)
+        self.description = self._cur.description
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def fetchmany(self, size=None):
+        return self._cur.fetchmany(size) if size else self._cur.fetchmany()
+
+    def close(self):
+        if self._cur is not None:
+            self._cur.close()
+
+
+class SourceConnection:
+    def __init__(self):
+        self.sqlite = None
+
+    def open_schema(self, schema):
+        if self.sqlite is not None:
+            self.sqlite.close()
+        path = bench_path("source", f"{schema}.sqlite")
+        if not os.path.exists(path):
+            raise RuntimeError(f"No synthetic source for {schema}: {path}")
+        self.sqlite = sqlite3.connect(path)
+
+    def cursor(self):
+        return SourceCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        if self.sqlite is not None:
+            self.sqlite.close()
+
+
+def install():
+    """Replace oracledb with the SQLite substitute"""
+    oracledb = types.ModuleType("oracledb")
+    oracledb.connect = lambda *args, **kwargs: SourceConnection()
+    sys.modules["oracledb"] = oracledb
+
+
+def run_script(script, args=()):
+    """Run a table script as __main__ against the substitutes"""
+    install()
+    sys.argv = [script, *args]
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    # python standins.py <script> [args...]
+    run_script(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,378 @@
+import os
+import sys
+import csv
+import json
+import math
+import random
+import sqlite3
+import argparse
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from schema_utils import TABLES, DEVSTAGE_SCHEMA
+
+SOURCE_TABLES = ["offices", "employees", "productlines", "products",
+                 "customers", "orders", "orderdetails", "payments"]
+
+# Row counts of the classicmodels sample schema = scale factor 1.
+# Reference data grows with sqrt(scale), transactional data linearly.
+BASE_ROWS = {"offices": 7, "employees": 23, "productlines": 7, "products": 110,
+             "customers": 122, "orders": 326}
+LINES_PER_ORDER = (1, 18)          # orderdetails per order, ~9 on average
+
+# Daily churn at scale factor 1
+DAILY_NEW_ORDERS = 10
+DAILY_NEW_CUSTOMERS = 1
+CUSTOMER_UPDATE_RATE = 0.02        # share of customers changing per day
+PRODUCT_UPDATE_RATE = 0.01         # MSRP / stock changes
+EMPLOYEE_UPDATE_RATE = 0.005
+SHIP_PROBABILITY = 0.35            # per open order per day
+CANCEL_PROBABILITY = 0.02
+ON_HOLD_PROBABILITY = 0.01
+PAY_PROBABILITY = 0.25             # per unpaid shipped order per day
+WEEKDAY_FACTOR = [1.2, 1.1, 1.0, 1.0, 1.3, 0.6, 0.4]
+
+COUNTRIES = ["USA", "France", "Spain", "Australia", "Germany", "UK", "Japan", "Norway", "Italy", "Singapore"]
+SCALES = ["1:10", "1:12", "1:18", "1:24", "1:32", "1:50", "1:72", "1:700"]
+VENDORS = ["Min Lin Diecast", "Classic Metal Creations", "Highway 66 Mini Classics",
+           "Red Start Diecast", "Motor City Art Classics", "Second Gear Diecast",
+           "Autoart Studio Design", "Welly Diecast Productions", "Unimax Art Galleries",
+           "Studio M Art Models", "Exoto Designs", "Gearbox Collectibles", "Carousel DieCast Legends"]
+
+
+def columns(table):
+    """Source column order, same as the devstage table the extract is COPYed into"""
+    return [name for name, _ in TABLES[DEVSTAGE_SCHEMA][table]["columns"]]
+
+
+def schema_name(batch_date):
+    return f"CM_{batch_date.strftime('%Y%m%d')}"
+
+
+class SourceGenerator:
+    """Evolves a classicmodels-shaped source day by day.
+
+    Each batch date yields the rows whose UPDATE_TIMESTAMP falls on that date,
+    i.e. exactly what the extractors select from that date's CM_ schema.
+    Customers and products are drawn with Pareto weights so a few of them
+    carry most orders, like real order data.
+    """
+
+    def __init__(self, scale, seed=42):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.ref_scale = max(1, round(math.sqrt(scale)))
+        self.next_order = 10100
+        self.next_customer = 100
+        self.next_check = 1
+        self.offices = []
+        self.employees = []
+        self.sales_reps = []
+        self.productlines = []
+        self.products = []
+        self.product_cum_weights = []
+        self.customers = []
+        self.customer_cum_weights = []
+        self.open_orders = {}       # orderNumber -> row, until shipped or cancelled
+        self.unpaid = []            # (customerNumber, amount) of shipped orders
+
+    # -- timestamps -------------------------------------------------------
+
+    def timestamp(self, day):
+        """Business-hours skewed time on the given day"""
+        hour = min(23, max(0, int(self.rng.gauss(13, 3))))
+        return datetime(day.year, day.month, day.day, hour,
+                        self.rng.randrange(60), self.rng.randrange(60))
+
+    def stamp(self, row, day, created=False):
+        ts = self.timestamp(day)
+        if created:
+            row["create_timestamp"] = ts
+        row["update_timestamp"] = max(ts, row["create_timestamp"])
+        return row
+
+    # -- reference data ---------------------------------------------------
+
+    def new_office(self, day):
+        i = len(self.offices) + 1
+        country = self.rng.choice(COUNTRIES)
+        return self.stamp({
+            "officeCode": str(i), "city": f"City {i}", "phone": f"+1 555 {i:04d}",
+            "addressLine1": f"{i} Market Street", "addressLine2": None, "state": None,
+            "country": country, "postalCode": f"{10000 + i}", "territory": "NA" if country == "USA" else "EMEA",
+        }, day, created=True)
+
+    def new_employee(self, day, reports_to, title, office):
+        n = 1002 + len(self.employees)
+        return self.stamp({
+            "employeeNumber": n, "lastName": f"Last{n}", "firstName": f"First{n}",
+            "extension": f"x{n % 10000}", "email": f"e{n}@classicmodelcars.com",
+            "officeCode": office["officeCode"], "reportsTo": reports_to, "jobTitle": title,
+        }, day, created=True)
+
+    def new_product(self, day, line):
+        i = len(self.products) + 1
+        buy = round(self.rng.uniform(15, 110), 2)
+        return self.stamp({
+            "productCode": f"S{self.rng.choice([10, 12, 18, 24, 32, 50, 72, 700])}_{i:05d}",
+            "productName": f"Model {i}", "productLine": line["productLine"],
+            "productScale": self.rng.choice(SCALES), "productVendor": self.rng.choice(VENDORS),
+            "productDescription": f"Die-cast replica {i}", "quantityInStock": self.rng.randint(0, 9000),
+            "buyPrice": buy, "MSRP": round(buy * self.rng.uniform(1.4, 2.2), 2),
+        }, day, created=True)
+
+    def new_customer(self, day):
+        n = self.next_customer
+        self.next_customer += 1
+        return self.stamp({
+            "customerNumber": n, "customerName": f"Customer {n}", "contactLastName": f"Last{n}",
+            "contactFirstName": f"First{n}", "phone": f"555-{n:06d}", "addressLine1": f"{n} Main St",
+            "addressLine2": None, "city": f"City {n % 97}", "state": None, "postalCode": f"{n % 99999:05d}",
+            "country": self.rng.choice(COUNTRIES),
+            "salesRepEmployeeNumber": self.rng.choice(self.sales_reps)["employeeNumber"],
+            "creditLimit": round(self.rng.choice([0, 1, 1, 2, 3]) * self.rng.uniform(20000, 80000), 2),
+        }, day, created=True)
+
+    def add_customer(self, day):
+        customer = self.new_customer(day)
+        self.customers.append(customer)
+        # Cumulative weights keep weighted draws O(log n) as customers grow
+        last = self.customer_cum_weights[-1] if self.customer_cum_weights else 0.0
+        self.customer_cum_weights.append(last + self.rng.paretovariate(1.2))
+        return customer
+
+    def initial_population(self, day):
+        """Reference data and customers as of the first batch date"""
+        self.offices = [self.new_office(day) for _ in range(BASE_ROWS["offices"] * self.ref_scale)]
+        president = self.new_employee(day, None, "President", self.offices[0])
+        self.employees.append(president)
+        managers = []
+        for office in self.offices:
+            manager = self.new_employee(day, president["employeeNumber"], "Sales Manager", office)
+            self.employees.append(manager)
+            managers.append(manager)
+        while len(self.employees) < BASE_ROWS["employees"] * self.ref_scale:
+            manager = self.rng.choice(managers)
+            office = next(o for o in self.offices if o["officeCode"] == manager["officeCode"])
+            rep = self.new_employee(day, manager["employeeNumber"], "Sales Rep", office)
+            self.employees.append(rep)
+            self.sales_reps.append(rep)
+
+        self.productlines = [self.stamp({
+            "productLine": f"Line {i}", "textDescription": f"Product line {i}",
+            "htmlDescription": None, "image": None,
+        }, day, created=True) for i in range(1, BASE_ROWS["productlines"] * self.ref_scale + 1)]
+        total = 0.0
+        for _ in range(BASE_ROWS["products"] * self.scale):
+            self.products.append(self.new_product(day, self.rng.choice(self.productlines)))
+            total += self.rng.paretovariate(1.1)
+            self.product_cum_weights.append(total)
+        for _ in range(BASE_ROWS["customers"] * self.scale):
+            self.add_customer(day)
+
+    # -- transactional data -----------------------------------------------
+
+    def new_order(self, day, order_date):
+        n = self.next_order
+        self.next_order += 1
+        customer = self.rng.choices(self.customers, cum_weights=self.customer_cum_weights)[0]
+        order = self.stamp({
+            "orderNumber": n, "orderDate": order_date,
+            "requiredDate": order_date + timedelta(days=self.rng.randint(7, 14)),
+            "shippedDate": None, "status": "In Process", "comments": None, "cancelledDate": None,
+            "customerNumber": customer["customerNumber"],
+        }, day, created=True)
+        lines = []
+        for line_no, product in enumerate(self.order_products(self.rng.randint(*LINES_PER_ORDER)), 1):
+            lines.append(self.stamp({
+                "orderNumber": n, "productCode": product["productCode"],
+                "quantityOrdered": self.rng.randint(20, 60),
+                "priceEach": round(product["MSRP"] * self.rng.uniform(0.8, 1.0), 2),
+                "orderLineNumber": line_no,
+            }, day, created=True))
+        order["_amount"] = round(sum(l["quantityOrdered"] * l["priceEach"] for l in lines), 2)
+        return order, lines
+
+    def order_products(self, k):
+        """k distinct products, popular ones more likely"""
+        picked = {}
+        for product in self.rng.choices(self.products, cum_weights=self.product_cum_weights, k=4 * k):
+            picked.setdefault(product["productCode"], product)
+            if len(picked) == k:
+                break
+        return list(picked.values())
+
+    def progress_order(self, order, day):
+        """Ship, cancel or hold an open order; returns True if it changed"""
+        r = self.rng.random()
+        if r < CANCEL_PROBABILITY:
+            order.update(status="Cancelled", cancelledDate=day,
+                         comments="Customer cancelled the order")
+        elif r < CANCEL_PROBABILITY + SHIP_PROBABILITY:
+            order.update(status="Shipped", shippedDate=day)
+            self.unpaid.append((order["customerNumber"], order["_amount"]))
+        elif r < CANCEL_PROBABILITY + SHIP_PROBABILITY + ON_HOLD_PROBABILITY and order["status"] != "On Hold":
+            order.update(status="On Hold", comments="Credit limit exceeded")
+        else:
+            return False
+        self.stamp(order, day)
+        return True
+
+    def new_payment(self, day, customer_number, amount):
+        check = f"{chr(65 + self.next_check % 26)}{chr(65 + self.next_check // 26 % 26)}{self.next_check:07d}"
+        self.next_check += 1
+        return self.stamp({
+            "customerNumber": customer_number, "checkNumber": check,
+            "paymentDate": day, "amount": amount,
+        }, day, created=True)
+
+    # -- batches ----------------------------------------------------------
+
+    def first_batch(self, day, history_days=900):
+        """Full initial state: BASE_ROWS orders spread over history_days before day"""
+        self.initial_population(day)
+        changed = {t: [] for t in SOURCE_TABLES}
+        for t in ("offices", "employees", "productlines", "products", "customers"):
+            changed[t] = list(getattr(self, t))
+        for _ in range(BASE_ROWS["orders"] * self.scale):
+            order_date = day - timedelta(days=self.rng.randint(1, history_days))
+            order, lines = self.new_order(day, order_date)
+            changed["orderdetails"].extend(lines)
+            # Historical orders are closed unless they are only a few days old
+            if (day - order_date).days > 10:
+                closed_on = order_date + timedelta(days=self.rng.randint(1, 5))
+                if self.rng.random() < CANCEL_PROBABILITY / (CANCEL_PROBABILITY + SHIP_PROBABILITY):
+                    order.update(status="Cancelled", cancelledDate=closed_on)
+                else:
+                    order.update(status="Shipped", shippedDate=closed_on)
+                    self.unpaid.append((order["customerNumber"], order["_amount"]))
+            if order["status"] in ("In Process", "On Hold"):
+                self.open_orders[order["orderNumber"]] = order
+            changed["orders"].append(order)
+        changed["payments"] = [self.new_payment(day, c, a) for c, a in self.unpaid if self.rng.random() < 0.9]
+        self.unpaid = []
+        return changed
+
+    def next_batch(self, day):
+        """Rows inserted or updated on day"""
+        changed = {t: [] for t in SOURCE_TABLES}
+        factor = WEEKDAY_FACTOR[day.weekday()]
+
+        for _ in range(self.poisson(DAILY_NEW_CUSTOMERS * self.scale * factor)):
+            changed["customers"].append(self.add_customer(day))
+        for customer in self.rng.sample(self.customers, min(len(self.customers),
+                                                            self.poisson(CUSTOMER_UPDATE_RATE * len(self.customers)))):
+            customer["creditLimit"] = round(customer["creditLimit"] * self.rng.uniform(0.8, 1.3), 2)
+            changed["customers"].append(self.stamp(customer, day))
+        for product in self.rng.sample(self.products, min(len(self.products),
+                                                          self.poisson(PRODUCT_UPDATE_RATE * len(self.products)))):
+            product["MSRP"] = round(product["MSRP"] * self.rng.uniform(0.95, 1.1), 2)
+            product["quantityInStock"] = max(0, product["quantityInStock"] + self.rng.randint(-500, 500))
+            changed["products"].append(self.stamp(product, day))
+        for employee in self.rng.sample(self.employees, min(len(self.employees),
+                                                            self.poisson(EMPLOYEE_UPDATE_RATE * len(self.employees)))):
+            if employee["reportsTo"] is not None and employee["jobTitle"] == "Sales Rep":
+                employee["reportsTo"] = self.rng.choice(
+                    [e for e in self.employees if e["jobTitle"] == "Sales Manager"])["employeeNumber"]
+            employee["extension"] = f"x{self.rng.randint(1000, 9999)}"
+            changed["employees"].append(self.stamp(employee, day))
+
+        for number, order in list(self.open_orders.items()):
+            if self.progress_order(order, day):
+                changed["orders"].append(order)
+                if order["status"] in ("Shipped", "Cancelled"):
+                    del self.open_orders[number]
+        for _ in range(self.poisson(DAILY_NEW_ORDERS * self.scale * factor)):
+            order, lines = self.new_order(day, day)
+            self.open_orders[order["orderNumber"]] = order
+            changed["orders"].append(order)
+            changed["orderdetails"].extend(lines)
+
+        still_unpaid = []
+        for customer_number, amount in self.unpaid:
+            if self.rng.random() < PAY_PROBABILITY:
+                changed["payments"].append(self.new_payment(day, customer_number, amount))
+            else:
+                still_unpaid.append((customer_number, amount))
+        self.unpaid = still_unpaid
+        return changed
+
+    def poisson(self, lam):
+        """Poisson draw (normal approximation for large lambda)"""
+        if lam > 50:
+            return max(0, int(round(self.rng.gauss(lam, math.sqrt(lam)))))
+        threshold, k, p = math.exp(-lam), 0, 1.0
+        while True:
+            p *= self.rng.random()
+            if p <= threshold:
+                return k
+            k += 1
+
+
+def write_csv(out_dir, batch_date, changed):
+    schema_dir = os.path.join(out_dir, schema_name(batch_date))
+    os.makedirs(schema_dir, exist_ok=True)
+    for table, rows in changed.items():
+        cols = columns(table)
+        with open(os.path.join(schema_dir, f"{table}.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(cols)
+            writer.writerows([row.get(c) for c in cols] for row in rows)
+
+
+def write_sqlite(out_dir, batch_date, changed):
+    """One SQLite file per CM_ schema; table and column names as in the source"""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{schema_name(batch_date)}.sqlite")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    for table, rows in changed.items():
+        cols = columns(table)
+        conn.execute(f"CREATE TABLE {table} ({', '.join(cols)})")
+        conn.executemany(
+            f"INSERT INTO {table} VALUES ({', '.join('?' for _ in cols)})",
+            ([str(v) if isinstance(v, (date, datetime)) else v for v in (row.get(c) for c in cols)]
+             for row in rows),
+        )
+    conn.commit()
+    conn.close()
+
+
+WRITERS = {"csv": write_csv, "sqlite": write_sqlite}
+
+
+def generate(out_dir, scale=1, start="2005-06-09", days=30, fmt="csv", seed=42):
+    """Write one CM_YYYYMMDD source per batch date and a manifest.json with row counts"""
+    generator = SourceGenerator(scale, seed)
+    write = WRITERS[fmt]
+    first = datetime.strptime(start, "%Y-%m-%d").date()
+    manifest = {"scale": scale, "seed": seed, "format": fmt, "batches": []}
+
+    print("======================================")
+    print(f"Synthetic source: scale {scale}x, {days} batch date(s) from {start} -> {out_dir}")
+    print("======================================")
+    for i in range(days):
+        batch_date = first + timedelta(days=i)
+        changed = generator.first_batch(batch_date) if i == 0 else generator.next_batch(batch_date)
+        write(out_dir, batch_date, changed)
+        counts = {t: len(rows) for t, rows in changed.items()}
+        manifest["batches"].append({"batch_date": str(batch_date), "schema": schema_name(batch_date),
+                                    "rows": counts})
+        print(f"{batch_date}: " + ", ".join(f"{t}={n}" for t, n in counts.items()))
+
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate classicmodels-shaped source data")
+    parser.add_argument("out_dir")
+    parser.add_argument("--scale", type=int, default=1, help="scale factor, 1 to 1000")
+    parser.add_argument("--start", default="2005-06-09", help="first batch date (full load)")
+    parser.add_argument("--days", type=int, default=30, help="number of batch dates")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    generate(args.out_dir, args.scale, args.start, args.days, args.format, args.seed)
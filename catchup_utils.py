@@ -0,0 +1,142 @@
+import os
+import sys
+from datetime import date, timedelta
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, METADATA_SCHEMA
+
+# master.py --catch-up <first_date> <last_date> works off a backlog of
+# batch dates in one go:
+#   - source_to_s3 runs once, against the last batch's source schema, with
+#     the window of the first batch, and splits every extract into one file
+#     per batch by UPDATE_TIMESTAMP (ETL_CATCH_UP_DATES)
+#   - s3_to_devstage and the devdw upserts / SCD2 history run batch by
+#     batch, so every batch keeps its own batch number and effective dates
+#   - the summary tables run once, after the last batch, over the affected
+#     keys of every batch since the last passed one (ETL_CATCH_UP_FIRST_BATCH)
+CATCH_UP_DATES_ENV = "ETL_CATCH_UP_DATES"
+CATCH_UP_FIRST_BATCH_ENV = "ETL_CATCH_UP_FIRST_BATCH"
+
+SUMMARY_TABLES = [
+    "daily_customer_summary",
+    "daily_product_summary",
+    "monthly_customer_summary",
+    "monthly_product_summary",
+]
+
+
+def catch_up_dates(batch_date):
+    """Batch dates one extract covers: every pending date in catch-up mode, else batch_date"""
+    dates = [d.strip() for d in os.getenv(CATCH_UP_DATES_ENV, "").split(",") if d.strip()]
+    return dates or [batch_date]
+
+
+def split_by_batch(df, batch_dates):
+    """[(batch_date, rows)]: each row goes to the batch whose window holds its UPDATE_TIMESTAMP,
+    and also to the batch whose window holds its CREATE_TIMESTAMP.
+
+    The window of a batch runs up to the next batch date; the last one is open.
+    A row created and changed again during the backlog is extracted only in
+    its latest version, so it is loaded in its creation batch as well: the
+    rows that reference it (an order's lines) then find it in the batch they
+    arrive in, and it keeps its original effective date.
+    """
+    if len(batch_dates) == 1:
+        return [(batch_dates[0], df)]
+    columns = {c.lower(): c for c in df.columns}
+    stamps = [pd.to_datetime(df[columns[c]]) for c in ("update_timestamp", "create_timestamp") if c in columns]
+    parts = []
+    for i, batch_date in enumerate(batch_dates):
+        in_window = pd.Series(False, index=df.index)
+        for stamp in stamps:
+            in_stamp_window = stamp >= pd.Timestamp(batch_date)
+            if i + 1 < len(batch_dates):
+                in_stamp_window &= stamp < pd.Timestamp(batch_dates[i + 1])
+            in_window |= in_stamp_window.fillna(False).astype(bool)
+        parts.append((batch_date, df[in_window]))
+    return parts
+
+
+def current_batch():
+    """(etl_batch_no, etl_batch_date) in batch_control, or (0, None) when empty"""
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT etl_batch_no, etl_batch_date
+            FROM {METADATA_SCHEMA}.batch_control
+            ORDER BY etl_batch_no DESC
+            LIMIT 1;
+        """)
+        row = cur.fetchone()
+        return (row[0], str(row[1])) if row else (0, None)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def last_passed_batch():
+    """Highest batch number logged with status 'P', or 0"""
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT MAX(etl_batch_no)
+            FROM {METADATA_SCHEMA}.batch_control_log
+            WHERE etl_batch_status = 'P';
+        """)
+        return cur.fetchone()[0] or 0
+    finally:
+        cur.close()
+        conn.close()
+
+
+def pending_batches(first_date, last_date):
+    """[(etl_batch_no, batch_date)] of every day from first_date to last_date.
+
+    Numbering continues from batch_control. Starting at the current batch's
+    date reruns that batch under its own number, which is how a catch-up
+    that stopped on a failed batch is continued.
+    """
+    current_no, current_date = current_batch()
+    first, last = date.fromisoformat(first_date), date.fromisoformat(last_date)
+    if last < first:
+        raise ValueError(f"Catch-up range ends before it starts: {first_date} .. {last_date}")
+    next_no = current_no if first_date == current_date else current_no + 1
+    return [(next_no + i, str(first + timedelta(days=i))) for i in range((last - first).days + 1)]
+
+
+def set_current_batch(batch_no, batch_date):
+    """Make (batch_no, batch_date) the one row of batch_control"""
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"DELETE FROM {METADATA_SCHEMA}.batch_control;")
+        cur.execute(f"""
+            INSERT INTO {METADATA_SCHEMA}.batch_control (etl_batch_no, etl_batch_date)
+            VALUES (%s, %s);
+        """, (batch_no, batch_date))
+        conn.commit()
+        print(f"Current batch: {batch_no} ({batch_date})")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error setting current batch: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def affected_batch_filter(column):
+    """SQL condition on column selecting the batches summaries recompute for"""
+    current = f"""(
+            SELECT etl_batch_no
+            FROM {METADATA_SCHEMA}.batch_control
+            ORDER BY etl_batch_no DESC
+            LIMIT 1
+        )"""
+    first = os.getenv(CATCH_UP_FIRST_BATCH_ENV)
+    if first:
+        return f"{column} BETWEEN {int(first)} AND {current}"
+    return f"{column} = {current}"
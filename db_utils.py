@@ -1,10 +1,12 @@
 import pandas as pd
 import os
 import io
-import boto3
 import oracledb
-import psycopg2
 from dotenv import load_dotenv
+from profile_utils import span
+from warehouse_utils import connect_warehouse
+from storage_utils import get_storage, storage_backend, write_manifest
+from retry_utils import retry_call
 
 load_dotenv()
 
@@ -17,7 +19,7 @@ service = os.getenv("ORACLE_SERVICE")
 def get_connection():
     """Connect to Oracle"""
     dsn = f"{host}:{port}/{service}"
-    return oracledb.connect(user=user, password=password, dsn=dsn)
+    return retry_call(oracledb.connect, user=user, password=password, dsn=dsn, description="Oracle connect")
 
 def prepare_dblink(cursor, batch_date):
     """Create PUBLIC DBLink for the given batch date"""
@@ -49,11 +51,23 @@ def prepare_dblink(cursor, batch_date):
     return link_name
 
 def upload_to_s3(df, bucket_name, s3_key):
-    s3_client = boto3.client("s3")
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
-    s3_client.put_object(Bucket=bucket_name, Key=s3_key, Body=csv_buffer.getvalue())
-    print(f"Uploaded {s3_key} to S3 bucket '{bucket_name}'")
+    """Write df as CSV to the configured storage backend plus a COPY manifest beside it.
+
+    The manifest is written last, so its presence marks a complete extract;
+    s3_to_devstage COPYs load through it (COPY ... MANIFEST).
+    Returns (request id, bytes written).
+    """
+    storage = get_storage()
+    with span("encode"):
+        csv_buffer = io.StringIO()
+        df.to_csv(csv_buffer, index=False)
+        body = csv_buffer.getvalue().encode("utf-8")
+    # Rewriting the same key is idempotent, so throttled or dropped PUTs are retried here
+    request_id = retry_call(storage.put, bucket_name, s3_key, body, description=f"upload {s3_key}")
+    retry_call(write_manifest, storage, bucket_name, f"{os.path.splitext(s3_key)[0]}.manifest",
+               [s3_key], [len(body)], description=f"manifest {s3_key}")
+    print(f"Uploaded {s3_key} to {storage_backend()} bucket '{bucket_name}'")
+    return request_id, len(body)
 
 REDSHIFT_HOST = os.getenv("REDSHIFT_HOST")
 REDSHIFT_PORT = os.getenv("REDSHIFT_PORT", "5439")
@@ -64,8 +78,8 @@ REDSHIFT_PASSWORD = os.getenv("REDSHIFT_PASSWORD")
 METADATA_SCHEMA = "j25gokulraj_etl_metadata"
 
 def get_redshift_connection():
-    """Connect to Redshift"""
-    return psycopg2.connect(
+    """Connect to Redshift (or local DuckDB when WAREHOUSE_ENGINE=duckdb)"""
+    return connect_warehouse(
         dbname=REDSHIFT_DB,
         user=REDSHIFT_USER,
         password=REDSHIFT_PASSWORD,
@@ -130,20 +144,27 @@ def insert_batch_log():
         cur.close()
         conn.close()
 
-def update_batch_log(status):
-    """Update latest batch record in batch_control_log"""
+def update_batch_log(status, first_batch_no=None):
+    """Update latest batch record in batch_control_log.
+
+    With first_batch_no, the still running ('R') records of the batches
+    from first_batch_no on are closed too (see catchup_utils).
+    """
     conn = get_redshift_connection()
     cur = conn.cursor()
     try:
+        current_batch = f"(SELECT MAX(etl_batch_no) FROM {METADATA_SCHEMA}.batch_control)"
+        batches = f"etl_batch_no = {current_batch}"
+        if first_batch_no is not None:
+            batches += f"""
+           OR (etl_batch_no BETWEEN {int(first_batch_no)} AND {current_batch}
+               AND etl_batch_status = 'R')"""
         sql = f"""
         UPDATE {METADATA_SCHEMA}.batch_control_log
         SET 
             etl_batch_status = %s,
             etl_batch_end_time = CURRENT_TIMESTAMP
-        WHERE etl_batch_no = (
-            SELECT MAX(etl_batch_no)
-            FROM {METADATA_SCHEMA}.batch_control
-        );
+        WHERE {batches};
         """
         cur.execute(sql, (status,))
         conn.commit()
@@ -1,10 +1,12 @@
 import os
 import sys
-import psycopg2
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_utils import get_batch_date_from_redshift
+from step_log_utils import StepLogger
+from warehouse_utils import connect_warehouse
+from summary_utils import record_affected_keys
 
 load_dotenv()
 
@@ -20,7 +22,7 @@ TABLE = "customers"
 
 def get_connection():
     try:
-        conn = psycopg2.connect(
+        conn = connect_warehouse(
             dbname=REDSHIFT_DB,
             user=REDSHIFT_USER,
             password=REDSHIFT_PASSWORD,
@@ -35,7 +37,8 @@ def get_connection():
 
 def load_incremental_customers():
     conn = get_connection()
-    cur = conn.cursor()
+    step_log = StepLogger("devstage_to_devdw", TABLE)
+    cur = step_log.cursor(conn.cursor())
 
    
     BATCH_DATE = get_batch_date_from_redshift()
@@ -120,17 +123,27 @@ def load_incremental_customers():
         WHERE dw.src_customerNumber IS NULL;
         """
         cur.execute(insert_sql)
+
+        # New-customer summary cells of every staged customer
+        record_affected_keys(cur, "new_customer", f"""
+        SELECT CAST(dw.src_create_timestamp AS DATE) AS summary_date, dw.dw_customer_id, CAST(NULL AS INT) AS dw_product_id
+        FROM {DEVDW_SCHEMA}.{TABLE} dw
+        JOIN {DEVSTAGE_SCHEMA}.{TABLE} st
+          ON dw.src_customerNumber = st.customerNumber
+        """)
         conn.commit()
         print("Inserted new customer records where create_timestamp >= batch date.")
 
     except Exception as e:
         conn.rollback()
         print(f"Error during incremental load for {TABLE}: {e}")
+        sys.exit(1)
 
     finally:
         cur.close()
         conn.close()
         print("Connection closed.")
+        step_log.flush()
 
 
 if __name__ == "__main__":
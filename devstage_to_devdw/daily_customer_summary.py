@@ -1,10 +1,16 @@
 import os
 import sys
-import psycopg2
+from datetime import timedelta
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_utils import get_batch_date_from_redshift
+from step_log_utils import StepLogger
+from warehouse_utils import connect_warehouse
+from fact_utils import ORDER_LINE_FACT
+from summary_utils import (
+    stage_summary_rows, stage_affected_cells, replace_summary_cells, replace_summary_range
+)
 #load environment
 load_dotenv()
 REDSHIFT_HOST = os.getenv("REDSHIFT_HOST")
@@ -15,9 +21,42 @@ REDSHIFT_PASSWORD = os.getenv("REDSHIFT_PASSWORD")
 
 DEVDW_SCHEMA = "j25gokulraj_devdw"
 TABLE = "daily_customer_summary"
+STAGING_TABLE = "stg_daily_customer_summary"
+CELLS_TABLE = "daily_customer_cells"
+
+SUMMARY_COLUMNS = [
+    "summary_date",
+    "dw_customer_id",
+    "order_count",
+    "order_apd",
+    "order_cost_amount",
+    "cancelled_order_count",
+    "cancelled_order_amount",
+    "cancelled_order_apd",
+    "shipped_order_count",
+    "shipped_order_amount",
+    "shipped_order_apd",
+    "payment_apd",
+    "payment_amount",
+    "products_ordered_qty",
+    "products_items_qty",
+    "order_mrp_amount",
+    "new_customer_apd",
+    "new_customer_paid_apd",
+    "order_day_sketch",
+    "cancelled_order_day_sketch",
+    "shipped_order_day_sketch",
+    "payment_day_sketch",
+    "new_customer_day_sketch",
+    "new_customer_paid_day_sketch",
+    "dw_create_timestamp",
+    "dw_update_timestamp",
+    "etl_batch_no",
+    "etl_batch_date",
+]
 
 def get_connection():
-    return psycopg2.connect(
+    return connect_warehouse(
         dbname=REDSHIFT_DB,
         user=REDSHIFT_USER,
         password=REDSHIFT_PASSWORD,
@@ -25,214 +64,187 @@ def get_connection():
         port=REDSHIFT_PORT
     )
 
-def load_daily_customer_summary():
-    conn = get_connection()
-    cur = conn.cursor()
-    BATCH_DATE = get_batch_date_from_redshift()
+# Event types fanned out from a single scan of the order lines, plus one
+# pass each over payments and customers.
+EVENT_ORDERED = 1
+EVENT_CANCELLED = 2
+EVENT_SHIPPED = 3
+EVENT_PAYMENT = 4
+EVENT_NEW_CUSTOMER = 5
 
-    print("======================================")
-    print(f"Loading Daily Customer Summary for {BATCH_DATE}")
-    print("======================================")
 
-    try:
-        sql = f"""
-        INSERT INTO {DEVDW_SCHEMA}.{TABLE} (
-            summary_date,
-            dw_customer_id,
-            order_count,
-            order_apd,
-            order_cost_amount,
-            cancelled_order_count,
-            cancelled_order_amount,
-            cancelled_order_apd,
-            shipped_order_count,
-            shipped_order_amount,
-            shipped_order_apd,
-            payment_apd,
-            payment_amount,
-            products_ordered_qty,
-            products_items_qty,
-            order_mrp_amount,
-            new_customer_apd,
-            new_customer_paid_apd,
-            dw_create_timestamp,
-            dw_update_timestamp,
-            etl_batch_no,
-            etl_batch_date
-        )
-        WITH orders_cte AS (
-            SELECT 
-                CAST(o.orderDate AS DATE) AS summary_date,
-                o.dw_customer_id,
-                COUNT(DISTINCT o.dw_order_id) AS order_count,
-                1 AS order_apd,
-                SUM(od.priceEach * od.quantityOrdered) AS order_cost_amount,
-                0 AS cancelled_order_count,
-                0 AS cancelled_order_amount,
-                0 AS cancelled_order_apd,
-                0 AS shipped_order_count,
-                0 AS shipped_order_amount,
-                0 AS shipped_order_apd,
-                0 AS payment_apd,
-                0 AS payment_amount,
-                COUNT(DISTINCT od.dw_product_id) AS products_ordered_qty,
-                COUNT(od.quantityOrdered) AS products_items_qty,
-                SUM(p.MSRP * od.quantityOrdered) AS order_mrp_amount,
-                0 AS new_customer_apd,
-                0 AS new_customer_paid_apd
-            FROM {DEVDW_SCHEMA}.orders o
-            JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
-            JOIN {DEVDW_SCHEMA}.products p ON od.dw_product_id = p.dw_product_id
-            WHERE CAST(o.orderDate AS DATE) >= '{BATCH_DATE}'
-            GROUP BY 1,2
-        ),
-        customers_cte AS (
-            SELECT 
-                CAST(c.src_create_timestamp AS DATE) AS summary_date,
-                c.dw_customer_id,
-                0 AS order_count,
-                0 AS order_apd,
-                0 AS order_cost_amount,
-                0 AS cancelled_order_count,
-                0 AS cancelled_order_amount,
-                0 AS cancelled_order_apd,
-                0 AS shipped_order_count,
-                0 AS shipped_order_amount,
-                0 AS shipped_order_apd,
-                0 AS payment_apd,
-                0 AS payment_amount,
-                0 AS products_ordered_qty,
-                0 AS products_items_qty,
-                0 AS order_mrp_amount,
-                1 AS new_customer_apd,
-                0 AS new_customer_paid_apd
-            FROM {DEVDW_SCHEMA}.customers c
-            WHERE CAST(c.src_create_timestamp AS DATE) >= '{BATCH_DATE}'
+def build_summary_select(batch_date, cells_table=None, date_ceiling=None):
+    """SELECT producing one daily_customer_summary row per (summary_date, dw_customer_id).
+
+    order_line_fact is read once; each line is fanned out to
+    its order/cancelled/shipped event date and everything is folded by one
+    conditional aggregation. With cells_table only those (summary_date,
+    dw_customer_id) cells are produced and batch_date is the earliest of them.
+    With date_ceiling only dates before it are produced (backfill partitions).
+    """
+    def in_range(column):
+        if date_ceiling is None:
+            return f"{column} >= '{batch_date}'"
+        return f"({column} >= '{batch_date}' AND {column} < '{date_ceiling}')"
+
+    line_scope = payment_scope = customer_scope = cell_join = ""
+    if cells_table:
+        line_scope = f"AND f.dw_customer_id IN (SELECT dw_customer_id FROM {cells_table})"
+        payment_scope = f"AND p.dw_customer_id IN (SELECT dw_customer_id FROM {cells_table})"
+        customer_scope = f"AND c.dw_customer_id IN (SELECT dw_customer_id FROM {cells_table})"
+        cell_join = f"""JOIN {cells_table} cells
+          ON cells.summary_date = ev.summary_date
+         AND cells.dw_customer_id = ev.dw_customer_id"""
+
+    return f"""
+        WITH lines AS (
+            SELECT
+                f.dw_order_id,
+                f.dw_customer_id,
+                f.order_date,
+                f.cancelled_date,
+                f.shipped_date,
+                f.is_cancelled,
+                f.is_shipped,
+                f.dw_product_id,
+                f.quantity_ordered AS quantityOrdered,
+                f.cost_amount,
+                f.mrp_amount,
+                f.dw_product_id IS NOT NULL AS has_product
+            FROM {DEVDW_SCHEMA}.{ORDER_LINE_FACT} f
+            WHERE ({in_range("f.order_date")}
+               OR {in_range("f.cancelled_date")}
+               OR {in_range("f.shipped_date")})
+              {line_scope}
         ),
-        cancelled_cte AS (
-            SELECT 
-                CAST(o.cancelledDate AS DATE) AS summary_date,
-                o.dw_customer_id,
-                0 AS order_count,
-                0 AS order_apd,
-                0 AS order_cost_amount,
-                COUNT(o.dw_order_id) AS cancelled_order_count,
-                SUM(od.priceEach * od.quantityOrdered) AS cancelled_order_amount,
-                1 AS cancelled_order_apd,
-                0 AS shipped_order_count,
-                0 AS shipped_order_amount,
-                0 AS shipped_order_apd,
-                0 AS payment_apd,
-                0 AS payment_amount,
-                0 AS products_ordered_qty,
-                0 AS products_items_qty,
-                0 AS order_mrp_amount,
-                0 AS new_customer_apd,
-                0 AS new_customer_paid_apd
-            FROM {DEVDW_SCHEMA}.orders o
-            JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
-            WHERE CAST(o.cancelledDate AS DATE) >= '{BATCH_DATE}'
-              AND o.status = 'Cancelled'
-            GROUP BY 1,2
+        event_types AS (
+            SELECT {EVENT_ORDERED} AS event_type
+            UNION ALL SELECT {EVENT_CANCELLED}
+            UNION ALL SELECT {EVENT_SHIPPED}
         ),
-        payments_cte AS (
-            SELECT 
-                CAST(p.paymentDate AS DATE) AS summary_date,
+        events AS (
+            SELECT
+                CASE e.event_type
+                    WHEN {EVENT_ORDERED} THEN l.order_date
+                    WHEN {EVENT_CANCELLED} THEN l.cancelled_date
+                    ELSE l.shipped_date
+                END AS summary_date,
+                l.dw_customer_id,
+                e.event_type,
+                l.dw_order_id,
+                l.dw_product_id,
+                l.quantityOrdered,
+                l.cost_amount,
+                l.mrp_amount,
+                0 AS payment_amount
+            FROM lines l
+            CROSS JOIN event_types e
+            WHERE (e.event_type = {EVENT_ORDERED} AND {in_range("l.order_date")} AND l.has_product)
+               OR (e.event_type = {EVENT_CANCELLED} AND {in_range("l.cancelled_date")} AND l.is_cancelled)
+               OR (e.event_type = {EVENT_SHIPPED} AND {in_range("l.shipped_date")} AND l.is_shipped)
+            UNION ALL
+            SELECT
+                CAST(p.paymentDate AS DATE),
                 p.dw_customer_id,
-                0 AS order_count,
-                0 AS order_apd,
-                0 AS order_cost_amount,
-                0 AS cancelled_order_count,
-                0 AS cancelled_order_amount,
-                0 AS cancelled_order_apd,
-                0 AS shipped_order_count,
-                0 AS shipped_order_amount,
-                0 AS shipped_order_apd,
-                1 AS payment_apd,
-                SUM(p.amount) AS payment_amount,
-                0 AS products_ordered_qty,
-                0 AS products_items_qty,
-                0 AS order_mrp_amount,
-                0 AS new_customer_apd,
-                1 AS new_customer_paid_apd
+                {EVENT_PAYMENT},
+                NULL,
+                NULL,
+                NULL,
+                0,
+                0,
+                p.amount
             FROM {DEVDW_SCHEMA}.payments p
-            WHERE CAST(p.paymentDate AS DATE) >= '{BATCH_DATE}'
-            GROUP BY 1,2
-        ),
-        shipped_cte AS (
-            SELECT 
-                CAST(o.shippedDate AS DATE) AS summary_date,
-                o.dw_customer_id,
-                0 AS order_count,
-                0 AS order_apd,
-                0 AS order_cost_amount,
-                0 AS cancelled_order_count,
-                0 AS cancelled_order_amount,
-                0 AS cancelled_order_apd,
-                COUNT(o.dw_order_id) AS shipped_order_count,
-                SUM(od.priceEach * od.quantityOrdered) AS shipped_order_amount,
-                1 AS shipped_order_apd,
-                0 AS payment_apd,
-                0 AS payment_amount,
-                0 AS products_ordered_qty,
-                0 AS products_items_qty,
-                0 AS order_mrp_amount,
-                0 AS new_customer_apd,
-                0 AS new_customer_paid_apd
-            FROM {DEVDW_SCHEMA}.orders o
-            JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
-            WHERE CAST(o.shippedDate AS DATE) >= '{BATCH_DATE}'
-              AND o.status = 'Shipped'
-            GROUP BY 1,2
-        ),
-        combined_cte AS (
-            SELECT * FROM orders_cte
+            WHERE {in_range("p.paymentDate")}
+              {payment_scope}
             UNION ALL
-            SELECT * FROM customers_cte
-            UNION ALL
-            SELECT * FROM cancelled_cte
-            UNION ALL
-            SELECT * FROM payments_cte
-            UNION ALL
-            SELECT * FROM shipped_cte
+            SELECT
+                CAST(c.src_create_timestamp AS DATE),
+                c.dw_customer_id,
+                {EVENT_NEW_CUSTOMER},
+                NULL,
+                NULL,
+                NULL,
+                0,
+                0,
+                0
+            FROM {DEVDW_SCHEMA}.customers c
+            WHERE {in_range("c.src_create_timestamp")}
+              {customer_scope}
         )
         SELECT
-            summary_date,
-            dw_customer_id,
-            MAX(order_count),
-            MAX(order_apd),
-            MAX(order_cost_amount),
-            MAX(cancelled_order_count),
-            MAX(cancelled_order_amount),
-            MAX(cancelled_order_apd),
-            MAX(shipped_order_count),
-            MAX(shipped_order_amount),
-            MAX(shipped_order_apd),
-            MAX(payment_apd),
-            MAX(payment_amount),
-            MAX(products_ordered_qty),
-            MAX(products_items_qty),
-            MAX(order_mrp_amount),
-            MAX(new_customer_apd),
-            MAX(new_customer_paid_apd),
+            ev.summary_date,
+            ev.dw_customer_id,
+            COUNT(DISTINCT CASE WHEN ev.event_type = {EVENT_ORDERED} THEN ev.dw_order_id END),
+            MAX(CASE WHEN ev.event_type = {EVENT_ORDERED} THEN 1 ELSE 0 END),
+            SUM(CASE WHEN ev.event_type = {EVENT_ORDERED} THEN ev.cost_amount ELSE 0 END),
+            COUNT(CASE WHEN ev.event_type = {EVENT_CANCELLED} THEN ev.dw_order_id END),
+            SUM(CASE WHEN ev.event_type = {EVENT_CANCELLED} THEN ev.cost_amount ELSE 0 END),
+            MAX(CASE WHEN ev.event_type = {EVENT_CANCELLED} THEN 1 ELSE 0 END),
+            COUNT(CASE WHEN ev.event_type = {EVENT_SHIPPED} THEN ev.dw_order_id END),
+            SUM(CASE WHEN ev.event_type = {EVENT_SHIPPED} THEN ev.cost_amount ELSE 0 END),
+            MAX(CASE WHEN ev.event_type = {EVENT_SHIPPED} THEN 1 ELSE 0 END),
+            MAX(CASE WHEN ev.event_type = {EVENT_PAYMENT} THEN 1 ELSE 0 END),
+            SUM(ev.payment_amount),
+            COUNT(DISTINCT CASE WHEN ev.event_type = {EVENT_ORDERED} THEN ev.dw_product_id END),
+            COUNT(CASE WHEN ev.event_type = {EVENT_ORDERED} THEN ev.quantityOrdered END),
+            SUM(CASE WHEN ev.event_type = {EVENT_ORDERED} THEN ev.mrp_amount ELSE 0 END),
+            MAX(CASE WHEN ev.event_type = {EVENT_NEW_CUSTOMER} THEN 1 ELSE 0 END),
+            MAX(CASE WHEN ev.event_type = {EVENT_PAYMENT} THEN 1 ELSE 0 END),
+            HLL_CREATE_SKETCH(CASE WHEN ev.event_type = {EVENT_ORDERED} THEN ev.summary_date END),
+            HLL_CREATE_SKETCH(CASE WHEN ev.event_type = {EVENT_CANCELLED} THEN ev.summary_date END),
+            HLL_CREATE_SKETCH(CASE WHEN ev.event_type = {EVENT_SHIPPED} THEN ev.summary_date END),
+            HLL_CREATE_SKETCH(CASE WHEN ev.event_type = {EVENT_PAYMENT} THEN ev.summary_date END),
+            HLL_CREATE_SKETCH(CASE WHEN ev.event_type = {EVENT_NEW_CUSTOMER} THEN ev.summary_date END),
+            HLL_CREATE_SKETCH(CASE WHEN ev.event_type = {EVENT_PAYMENT} THEN ev.summary_date END),
             CURRENT_TIMESTAMP,
             CURRENT_TIMESTAMP,
             b.etl_batch_no,
             b.etl_batch_date
-        FROM combined_cte
+        FROM events ev
+        {cell_join}
         CROSS JOIN j25gokulraj_etl_metadata.batch_control b
-        GROUP BY summary_date, dw_customer_id, b.etl_batch_no, b.etl_batch_date;
+        GROUP BY ev.summary_date, ev.dw_customer_id, b.etl_batch_no, b.etl_batch_date
         """
-        cur.execute(sql)
+
+
+def backfill_partition(cur, range_start, range_end):
+    """Recompute [range_start, range_end] from the facts and swap it in; the caller commits"""
+    stage_summary_rows(cur, STAGING_TABLE, SUMMARY_COLUMNS,
+                       build_summary_select(range_start, date_ceiling=range_end + timedelta(days=1)))
+    return replace_summary_range(cur, f"{DEVDW_SCHEMA}.{TABLE}", STAGING_TABLE, SUMMARY_COLUMNS,
+                                 range_start, range_end)
+
+
+def load_daily_customer_summary():
+    conn = get_connection()
+    step_log = StepLogger("devstage_to_devdw", TABLE)
+    cur = step_log.cursor(conn.cursor())
+    BATCH_DATE = get_batch_date_from_redshift()
+
+    print("======================================")
+    print(f"Loading Daily Customer Summary for {BATCH_DATE}")
+    print("======================================")
+
+    try:
+        # Recompute only the cells this batch's orders, lines, payments and
+        # customers touched; rerunning the batch replaces the same cells.
+        first_date, cell_count = stage_affected_cells(cur, CELLS_TABLE, "dw_customer_id")
+        if cell_count:
+            stage_summary_rows(cur, STAGING_TABLE, SUMMARY_COLUMNS,
+                               build_summary_select(first_date, CELLS_TABLE))
+            replace_summary_cells(cur, f"{DEVDW_SCHEMA}.{TABLE}", STAGING_TABLE, SUMMARY_COLUMNS,
+                                  CELLS_TABLE, "dw_customer_id")
         conn.commit()
         print("Daily Customer Summary loaded successfully.")
     except Exception as e:
         conn.rollback()
         print(f"Error loading daily customer summary: {e}")
+        sys.exit(1)
     finally:
         cur.close()
         conn.close()
         print("Connection closed.")
+        step_log.flush()
 
 if __name__ == "__main__":
     load_daily_customer_summary()
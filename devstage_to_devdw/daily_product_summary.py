@@ -1,11 +1,17 @@
 import os
 import sys
-import psycopg2
+from datetime import timedelta
 from dotenv import load_dotenv
 
 # Add parent path for db_utils import
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from db_utils import get_batch_date_from_redshift
+from db_utils import get_batch_date_from_redshift, METADATA_SCHEMA
+from step_log_utils import StepLogger
+from warehouse_utils import connect_warehouse
+from fact_utils import ORDER_LINE_FACT
+from summary_utils import (
+    stage_summary_rows, stage_affected_cells, replace_summary_cells, replace_summary_range
+)
 
 load_dotenv()
 
@@ -19,10 +25,29 @@ REDSHIFT_PASSWORD = os.getenv("REDSHIFT_PASSWORD")
 # Schema/Table
 DEVDW_SCHEMA = "j25Gokulraj_devdw"
 TABLE = "daily_product_summary"
+STAGING_TABLE = "stg_daily_product_summary"
+CELLS_TABLE = "daily_product_cells"
+
+SUMMARY_COLUMNS = [
+    "summary_date",
+    "dw_product_id",
+    "customer_apd",
+    "product_cost_amount",
+    "product_mrp_amount",
+    "cancelled_product_qty",
+    "cancelled_cost_amount",
+    "cancelled_mrp_amount",
+    "cancelled_order_apd",
+    "customer_sketch",
+    "dw_create_timestamp",
+    "dw_update_timestamp",
+    "etl_batch_no",
+    "etl_batch_date",
+]
 
 def get_connection():
     """Create connection to Redshift."""
-    return psycopg2.connect(
+    return connect_warehouse(
         dbname=REDSHIFT_DB,
         user=REDSHIFT_USER,
         password=REDSHIFT_PASSWORD,
@@ -30,76 +55,64 @@ def get_connection():
         port=REDSHIFT_PORT
     )
 
-def load_daily_product_summary():
-    """Load Daily Product Summary using provided SQL logic."""
-    conn = get_connection()
-    cur = conn.cursor()
 
-    # Get batch date dynamically from Redshift metadata
-    etl_batch_date = get_batch_date_from_redshift()  # e.g. 2001-01-01
-    etl_batch_no = 123  # You can replace with dynamic fetch if needed
+def build_summary_select(date_floor, cells_table=None, date_ceiling=None):
+    """SELECT producing one daily_product_summary row per (summary_date, dw_product_id),
+    stamped with the batch in batch_control.
 
-    # Convert to string if datetime object
-    etl_batch_date_str = (
-        etl_batch_date if isinstance(etl_batch_date, str)
-        else etl_batch_date.strftime('%Y-%m-%d')
-    )
-
-    print("======================================")
-    print(f"Loading Daily Product Summary for {etl_batch_date_str}")
-    print("======================================")
-
-    # === Main SQL Script (exact logic from your SQL ===
-    sql = f"""
-    INSERT INTO {DEVDW_SCHEMA}.{TABLE} (
-        summary_date,
-        dw_product_id,
-        customer_apd,
-        product_cost_amount,
-        product_mrp_amount,
-        cancelled_product_qty,
-        cancelled_cost_amount,
-        cancelled_mrp_amount,
-        cancelled_order_apd,
-        dw_create_timestamp,
-        dw_update_timestamp,
-        etl_batch_no,
-        etl_batch_date
-    )
+    With cells_table only those (summary_date, dw_product_id) cells are
+    produced and date_floor is the earliest of them. With date_ceiling only
+    dates before it are produced (backfill partitions).
+    """
+    product_scope = cell_join = order_ceiling = cancelled_ceiling = ""
+    if date_ceiling:
+        order_ceiling = f"AND f.order_date < '{date_ceiling}'"
+        cancelled_ceiling = f"AND f.cancelled_date < '{date_ceiling}'"
+    if cells_table:
+        product_scope = f"AND f.dw_product_id IN (SELECT dw_product_id FROM {cells_table})"
+        cell_join = f"""JOIN {cells_table} cells
+      ON cells.summary_date = combined_cte.summary_date
+     AND cells.dw_product_id = combined_cte.dw_product_id"""
+
+    return f"""
     WITH product_sales_cte AS (
         SELECT
-            CAST(o.orderDate AS DATE) AS summary_date,
-            od.dw_product_id,
-            COUNT(DISTINCT o.dw_customer_id) AS customer_apd,
-            SUM(od.priceEach * od.quantityOrdered) AS product_cost_amount,
-            SUM(p.MSRP * od.quantityOrdered) AS product_mrp_amount,
+            f.order_date AS summary_date,
+            f.dw_product_id,
+            COUNT(DISTINCT f.dw_customer_id) AS customer_apd,
+            SUM(f.cost_amount) AS product_cost_amount,
+            SUM(f.mrp_amount) AS product_mrp_amount,
             0 AS cancelled_product_qty,
             0 AS cancelled_cost_amount,
             0 AS cancelled_mrp_amount,
-            0 AS cancelled_order_apd
-        FROM {DEVDW_SCHEMA}.orders o
-        JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
-        JOIN {DEVDW_SCHEMA}.products p ON od.dw_product_id = p.dw_product_id
-        WHERE CAST(o.orderDate AS DATE) >= '{etl_batch_date_str}'
-        GROUP BY summary_date, od.dw_product_id
+            0 AS cancelled_order_apd,
+            HLL_CREATE_SKETCH(f.dw_customer_id) AS customer_sketch
+        FROM {DEVDW_SCHEMA}.{ORDER_LINE_FACT} f
+        WHERE f.dw_product_id IS NOT NULL
+          AND f.order_date >= '{date_floor}'
+          {order_ceiling}
+          {product_scope}
+        GROUP BY summary_date, f.dw_product_id
     ),
     cancelled_products_cte AS (
         SELECT
-            CAST(o.cancelledDate AS DATE) AS summary_date,
-            od.dw_product_id,
+            f.cancelled_date AS summary_date,
+            f.dw_product_id,
             0 AS customer_apd,
             0 AS product_cost_amount,
             0 AS product_mrp_amount,
-            SUM(od.quantityOrdered) AS cancelled_product_qty,
-            SUM(od.priceEach * od.quantityOrdered) AS cancelled_cost_amount,
-            SUM(p.MSRP * od.quantityOrdered) AS cancelled_mrp_amount,
-            COUNT(DISTINCT o.dw_order_id) AS cancelled_order_apd
-        FROM {DEVDW_SCHEMA}.orders o
-        JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
-        JOIN {DEVDW_SCHEMA}.products p ON od.dw_product_id = p.dw_product_id
-        WHERE LOWER(TRIM(o.status)) = 'cancelled'
-          AND CAST(o.cancelledDate AS DATE) >= '{etl_batch_date_str}'
-        GROUP BY summary_date, od.dw_product_id
+            SUM(f.quantity_ordered) AS cancelled_product_qty,
+            SUM(f.cost_amount) AS cancelled_cost_amount,
+            SUM(f.mrp_amount) AS cancelled_mrp_amount,
+            COUNT(DISTINCT f.dw_order_id) AS cancelled_order_apd,
+            CAST(NULL AS HLLSKETCH) AS customer_sketch
+        FROM {DEVDW_SCHEMA}.{ORDER_LINE_FACT} f
+        WHERE f.dw_product_id IS NOT NULL
+          AND f.is_cancelled
+          AND f.cancelled_date >= '{date_floor}'
+          {cancelled_ceiling}
+          {product_scope}
+        GROUP BY summary_date, f.dw_product_id
     ),
     combined_cte AS (
         SELECT * FROM product_sales_cte
@@ -107,8 +120,8 @@ def load_daily_product_summary():
         SELECT * FROM cancelled_products_cte
     )
     SELECT
-        summary_date,
-        dw_product_id,
+        combined_cte.summary_date,
+        combined_cte.dw_product_id,
         MAX(customer_apd) AS customer_apd,
         MAX(product_cost_amount) AS product_cost_amount,
         MAX(product_mrp_amount) AS product_mrp_amount,
@@ -116,16 +129,55 @@ def load_daily_product_summary():
         MAX(cancelled_cost_amount) AS cancelled_cost_amount,
         MAX(cancelled_mrp_amount) AS cancelled_mrp_amount,
         MAX(cancelled_order_apd) AS cancelled_order_apd,
+        HLL_COMBINE(customer_sketch) AS customer_sketch,
         CURRENT_TIMESTAMP AS dw_create_timestamp,
         CURRENT_TIMESTAMP AS dw_update_timestamp,
-        {etl_batch_no} AS etl_batch_no,
-        '{etl_batch_date_str}' AS etl_batch_date
+        b.etl_batch_no,
+        b.etl_batch_date
     FROM combined_cte
-    GROUP BY summary_date, dw_product_id;
+    {cell_join}
+    CROSS JOIN {METADATA_SCHEMA}.batch_control b
+    GROUP BY combined_cte.summary_date, combined_cte.dw_product_id, b.etl_batch_no, b.etl_batch_date
     """
 
+
+def backfill_partition(cur, range_start, range_end):
+    """Recompute [range_start, range_end] from the facts and swap it in; the caller commits"""
+    stage_summary_rows(cur, STAGING_TABLE, SUMMARY_COLUMNS,
+                       build_summary_select(range_start, date_ceiling=range_end + timedelta(days=1)))
+    return replace_summary_range(cur, f"{DEVDW_SCHEMA}.{TABLE}", STAGING_TABLE, SUMMARY_COLUMNS,
+                                 range_start, range_end)
+
+
+def load_daily_product_summary():
+    """Load Daily Product Summary using provided SQL logic."""
+    conn = get_connection()
+    step_log = StepLogger("devstage_to_devdw", TABLE)
+    cur = step_log.cursor(conn.cursor())
+
+    # Get batch date dynamically from Redshift metadata
+    etl_batch_date = get_batch_date_from_redshift()  # e.g. 2001-01-01
+
+    # Convert to string if datetime object
+    etl_batch_date_str = (
+        etl_batch_date if isinstance(etl_batch_date, str)
+        else etl_batch_date.strftime('%Y-%m-%d')
+    )
+
+    print("======================================")
+    print(f"Loading Daily Product Summary for {etl_batch_date_str}")
+    print("======================================")
+
     try:
-        cur.execute(sql)
+        # Recompute only the cells this batch's order lines touched; rerunning
+        # the batch replaces the same cells.
+        first_date, cell_count = stage_affected_cells(cur, CELLS_TABLE, "dw_product_id",
+                                                      event_types=["order", "cancelled"])
+        if cell_count:
+            stage_summary_rows(cur, STAGING_TABLE, SUMMARY_COLUMNS,
+                               build_summary_select(first_date, CELLS_TABLE))
+            replace_summary_cells(cur, f"{DEVDW_SCHEMA}.{TABLE}", STAGING_TABLE, SUMMARY_COLUMNS,
+                                  CELLS_TABLE, "dw_product_id")
         conn.commit()
         print("Daily Product Summary loaded successfully.")
 
@@ -142,11 +194,13 @@ def load_daily_product_summary():
     except Exception as e:
         conn.rollback()
         print(f"Error loading daily product summary: {e}")
+        sys.exit(1)
 
     finally:
         cur.close()
         conn.close()
         print("Connection closed.")
+        step_log.flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,21 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scd2_utils import maintain_history
+
+load_dotenv()
+
+
+def maintain_all_history():
+    """Maintain every dimension in scd2_utils.SCD2_DIMENSIONS in one batched pass.
+
+    Use this in `alltable` instead of customer_history.py + product_history.py.
+    Pass --full to rescan whole dimensions instead of this batch's rows only.
+    """
+    maintain_history(full_refresh="--full" in sys.argv, task="dimension_history")
+
+
+if __name__ == "__main__":
+    maintain_all_history()
@@ -1,10 +1,12 @@
 import os
 import sys
-import psycopg2
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_utils import get_batch_date_from_redshift
+from step_log_utils import StepLogger
+from warehouse_utils import connect_warehouse
+from schema_utils import ensure_table
 
 #load env
 load_dotenv()
@@ -18,11 +20,13 @@ REDSHIFT_PASSWORD = os.getenv("REDSHIFT_PASSWORD")
 DEVSTAGE_SCHEMA = "j25gokulraj_devstage"
 DEVDW_SCHEMA = "j25gokulraj_devdw"
 TABLE = "employees"
+HIERARCHY_TABLE = "employee_hierarchy"
+MAX_HIERARCHY_DEPTH = 50
 
 
 def get_connection():
     try:
-        conn = psycopg2.connect(
+        conn = connect_warehouse(
             dbname=REDSHIFT_DB,
             user=REDSHIFT_USER,
             password=REDSHIFT_PASSWORD,
@@ -37,7 +41,8 @@ def get_connection():
 
 def load_incremental_employees():
     conn = get_connection()
-    cur = conn.cursor()
+    step_log = StepLogger("devstage_to_devdw", TABLE)
+    cur = step_log.cursor(conn.cursor())
 
     # Get batch date
     BATCH_DATE = get_batch_date_from_redshift()
@@ -47,6 +52,27 @@ def load_incremental_employees():
     print("======================================")
 
     try:
+        ensure_table(cur, DEVDW_SCHEMA, HIERARCHY_TABLE)
+
+        # Capture employees whose reportsTo changes in this batch BEFORE Step 1
+        # overwrites it. Employees with an unresolved manager are retried too,
+        # in case that manager arrives in this batch.
+        changed_sql = f"""
+        CREATE TEMP TABLE changed_employees AS
+        SELECT s.employeeNumber
+        FROM {DEVSTAGE_SCHEMA}.{TABLE} s
+        LEFT JOIN {DEVDW_SCHEMA}.{TABLE} d
+          ON d.employeeNumber = s.employeeNumber
+        WHERE d.employeeNumber IS NULL
+           OR COALESCE(d.reportsTo, -1) <> COALESCE(s.reportsTo, -1)
+        UNION
+        SELECT d.employeeNumber
+        FROM {DEVDW_SCHEMA}.{TABLE} d
+        WHERE d.reportsTo IS NOT NULL
+          AND d.dw_reporting_employee_id IS NULL;
+        """
+        cur.execute(changed_sql)
+        print("Step 0: Captured employees whose reporting line changed.")
 
         update_sql = f"""
         UPDATE {DEVDW_SCHEMA}.{TABLE} d
@@ -119,12 +145,79 @@ def load_incremental_employees():
         reporting_update_sql = f"""
         UPDATE {DEVDW_SCHEMA}.{TABLE} e
         SET dw_reporting_employee_id = r.dw_employee_id
-        FROM {DEVDW_SCHEMA}.{TABLE} r
-        CROSS JOIN j25gokulraj_etl_metadata.batch_control b
-        WHERE e.reportsTo = r.employeeNumber;
+        FROM {DEVDW_SCHEMA}.{TABLE} r,
+             changed_employees ch
+        WHERE e.employeeNumber = ch.employeeNumber
+          AND e.reportsTo = r.employeeNumber;
         """
         cur.execute(reporting_update_sql)
-        print("Step 3: Updated dw_reporting_employee_id for reporting hierarchy.")
+        print("Step 3: Updated dw_reporting_employee_id for changed employees only.")
+
+        # Every path ending in a changed employee's subtree may be stale; the
+        # subtree is read from the closure table before it is modified.
+        # Employees missing from the closure table (first run) are seeded here.
+        affected_sql = f"""
+        CREATE TEMP TABLE affected_employees AS
+        SELECT e.dw_employee_id
+        FROM {DEVDW_SCHEMA}.{TABLE} e
+        JOIN changed_employees ch
+          ON ch.employeeNumber = e.employeeNumber
+        UNION
+        SELECT h.descendant_employee_id
+        FROM {DEVDW_SCHEMA}.{HIERARCHY_TABLE} h
+        JOIN {DEVDW_SCHEMA}.{TABLE} e
+          ON e.dw_employee_id = h.ancestor_employee_id
+        JOIN changed_employees ch
+          ON ch.employeeNumber = e.employeeNumber
+        UNION
+        SELECT e.dw_employee_id
+        FROM {DEVDW_SCHEMA}.{TABLE} e
+        LEFT JOIN {DEVDW_SCHEMA}.{HIERARCHY_TABLE} h
+          ON h.descendant_employee_id = e.dw_employee_id
+         AND h.depth = 0
+        WHERE h.descendant_employee_id IS NULL;
+        """
+        cur.execute(affected_sql)
+
+        delete_paths_sql = f"""
+        DELETE FROM {DEVDW_SCHEMA}.{HIERARCHY_TABLE}
+        USING affected_employees a
+        WHERE {DEVDW_SCHEMA}.{HIERARCHY_TABLE}.descendant_employee_id = a.dw_employee_id;
+        """
+        cur.execute(delete_paths_sql)
+
+        insert_paths_sql = f"""
+        INSERT INTO {DEVDW_SCHEMA}.{HIERARCHY_TABLE} (
+            ancestor_employee_id,
+            descendant_employee_id,
+            depth,
+            dw_create_timestamp,
+            etl_batch_no,
+            etl_batch_date
+        )
+        WITH RECURSIVE walk (descendant_employee_id, ancestor_employee_id, depth) AS (
+            SELECT a.dw_employee_id, a.dw_employee_id, 0
+            FROM affected_employees a
+            UNION ALL
+            SELECT w.descendant_employee_id, e.dw_reporting_employee_id, w.depth + 1
+            FROM walk w
+            JOIN {DEVDW_SCHEMA}.{TABLE} e
+              ON e.dw_employee_id = w.ancestor_employee_id
+            WHERE e.dw_reporting_employee_id IS NOT NULL
+              AND w.depth < {MAX_HIERARCHY_DEPTH}
+        )
+        SELECT
+            w.ancestor_employee_id,
+            w.descendant_employee_id,
+            w.depth,
+            GETDATE(),
+            b.etl_batch_no,
+            b.etl_batch_date
+        FROM walk w
+        CROSS JOIN j25gokulraj_etl_metadata.batch_control b;
+        """
+        cur.execute(insert_paths_sql)
+        print("Step 4: Rebuilt employee_hierarchy paths for affected employees.")
 
         # Commit all changes
         conn.commit()
@@ -133,11 +226,13 @@ def load_incremental_employees():
     except Exception as e:
         conn.rollback()
         print(f"Error during incremental load for {TABLE}: {e}")
+        sys.exit(1)
 
     finally:
         cur.close()
         conn.close()
         print("Connection closed.")
+        step_log.flush()
 
 
 if __name__ == "__main__":
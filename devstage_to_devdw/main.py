@@ -1,7 +1,11 @@
-import subprocess
+import sys
 from dotenv import load_dotenv
 import os
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from profile_utils import enable_profiling
+from trace_utils import init_tracing
+from scheduler_utils import run_stage_tasks
 
 load_dotenv()
 
@@ -9,10 +13,13 @@ alltable = os.getenv("alltable").split(",")
 
 
 def main():
-    for script in alltable:
-        script = script.strip()   
-        print(f"Running {script} ...")
-        subprocess.run(["python", script])
+    enable_profiling(sys.argv)
+    init_tracing()
+    results = run_stage_tasks("devstage_to_devdw", alltable)
+    failed_scripts = [script for script, succeeded in results.items() if not succeeded]
+    if failed_scripts:
+        print(f"\nFailed scripts: {', '.join(failed_scripts)}")
+        sys.exit(1)
     print("\nDEVSTAGE - DEVDW COMPLETED")
 
 if __name__ == "__main__":
@@ -1,11 +1,14 @@
 import os
 import sys
-import psycopg2
+from datetime import timedelta
 from dotenv import load_dotenv
 
 # Add parent path for db_utils import
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_utils import get_batch_date_from_redshift
+from step_log_utils import StepLogger
+from warehouse_utils import connect_warehouse
+from summary_utils import stage_affected_cells, stage_summary_rows, replace_summary_range
 
 # Load environment variables
 load_dotenv()
@@ -19,10 +22,50 @@ REDSHIFT_PASSWORD = os.getenv("REDSHIFT_PASSWORD")
 DEVDW_SCHEMA = "j25gokulraj_devdw"
 TABLE = "monthly_customer_summary"
 DAILY_TABLE = "daily_customer_summary"
+DELTA_TABLE = "monthly_customer_delta"
+CELLS_TABLE = "monthly_customer_cells"
+
+# Column order of build_delta_select
+SUMMARY_COLUMNS = [
+    "start_of_the_month_date",
+    "dw_customer_id",
+    "order_count",
+    "order_apd",
+    "order_apm",
+    "order_cost_amount",
+    "cancelled_order_count",
+    "cancelled_order_amount",
+    "cancelled_order_apd",
+    "cancelled_order_apm",
+    "shipped_order_count",
+    "shipped_order_amount",
+    "shipped_order_apd",
+    "shipped_order_apm",
+    "payment_apd",
+    "payment_apm",
+    "payment_amount",
+    "products_ordered_qty",
+    "products_items_qty",
+    "order_mrp_amount",
+    "new_customer_apd",
+    "new_customer_apm",
+    "new_customer_paid_apd",
+    "new_customer_paid_apm",
+    "order_day_sketch",
+    "cancelled_order_day_sketch",
+    "shipped_order_day_sketch",
+    "payment_day_sketch",
+    "new_customer_day_sketch",
+    "new_customer_paid_day_sketch",
+    "etl_batch_no",
+    "etl_batch_date",
+    "dw_create_timestamp",
+    "dw_update_timestamp",
+]
 
 def get_connection():
     """Create Redshift connection."""
-    return psycopg2.connect(
+    return connect_warehouse(
         dbname=REDSHIFT_DB,
         user=REDSHIFT_USER,
         password=REDSHIFT_PASSWORD,
@@ -31,86 +74,147 @@ def get_connection():
     )
 
 
+def build_delta_select(first_month, cells_table=None, month_ceiling=None):
+    """SELECT of monthly_customer_summary rows per (start_of_the_month_date, dw_customer_id),
+    rolled up from the daily table.
+
+    With cells_table only those (month, dw_customer_id) cells are produced and
+    first_month is the earliest of them. With month_ceiling only months before
+    it are read (backfill partitions).
+    """
+    customer_scope = cell_join = ""
+    if cells_table:
+        customer_scope = f"AND dw_customer_id IN (SELECT dw_customer_id FROM {cells_table})"
+        cell_join = f"""JOIN {cells_table} c
+      ON c.summary_date = d.start_of_the_month_date
+     AND c.dw_customer_id = d.dw_customer_id"""
+    ceiling_filter = f"AND summary_date < '{month_ceiling}'" if month_ceiling else ""
+
+    return f"""
+    SELECT d.*
+    FROM (
+        SELECT
+            DATE_TRUNC('month', summary_date)::date AS start_of_the_month_date,
+            dw_customer_id,
+            SUM(order_count) AS order_count,
+            SUM(order_apd) AS order_apd,
+            COUNT(DISTINCT summary_date) AS order_apm,
+            SUM(order_cost_amount) AS order_cost_amount,
+            SUM(cancelled_order_count) AS cancelled_order_count,
+            SUM(cancelled_order_amount) AS cancelled_order_amount,
+            SUM(cancelled_order_apd) AS cancelled_order_apd,
+            COUNT(DISTINCT CASE WHEN cancelled_order_count > 0 THEN summary_date END) AS cancelled_order_apm,
+            SUM(shipped_order_count) AS shipped_order_count,
+            SUM(shipped_order_amount) AS shipped_order_amount,
+            SUM(shipped_order_apd) AS shipped_order_apd,
+            COUNT(DISTINCT CASE WHEN shipped_order_count > 0 THEN summary_date END) AS shipped_order_apm,
+            SUM(payment_apd) AS payment_apd,
+            COUNT(DISTINCT CASE WHEN payment_amount > 0 THEN summary_date END) AS payment_apm,
+            SUM(payment_amount) AS payment_amount,
+            SUM(products_ordered_qty) AS products_ordered_qty,
+            SUM(products_items_qty) AS products_items_qty,
+            SUM(order_mrp_amount) AS order_mrp_amount,
+            SUM(new_customer_apd) AS new_customer_apd,
+            COUNT(DISTINCT CASE WHEN new_customer_apd > 0 THEN summary_date END) AS new_customer_apm,
+            SUM(new_customer_paid_apd) AS new_customer_paid_apd,
+            COUNT(DISTINCT CASE WHEN new_customer_paid_apd > 0 THEN summary_date END) AS new_customer_paid_apm,
+            HLL_COMBINE(order_day_sketch) AS order_day_sketch,
+            HLL_COMBINE(cancelled_order_day_sketch) AS cancelled_order_day_sketch,
+            HLL_COMBINE(shipped_order_day_sketch) AS shipped_order_day_sketch,
+            HLL_COMBINE(payment_day_sketch) AS payment_day_sketch,
+            HLL_COMBINE(new_customer_day_sketch) AS new_customer_day_sketch,
+            HLL_COMBINE(new_customer_paid_day_sketch) AS new_customer_paid_day_sketch,
+            MAX(CAST(etl_batch_no AS INT)) AS etl_batch_no,
+            MAX(etl_batch_date) AS etl_batch_date,
+            CURRENT_TIMESTAMP AS dw_create_timestamp,
+            CURRENT_TIMESTAMP AS dw_update_timestamp
+        FROM {DEVDW_SCHEMA}.{DAILY_TABLE}
+        WHERE summary_date >= '{first_month}'
+          {ceiling_filter}
+          {customer_scope}
+        GROUP BY 1, 2
+    ) d
+    {cell_join}
+    """
+
+
+def backfill_partition(cur, range_start, range_end):
+    """Recompute the months of [range_start, range_end] from the daily table and swap them in;
+    the caller commits"""
+    stage_summary_rows(cur, DELTA_TABLE, SUMMARY_COLUMNS,
+                       build_delta_select(range_start, month_ceiling=range_end + timedelta(days=1)))
+    return replace_summary_range(cur, f"{DEVDW_SCHEMA}.{TABLE}", DELTA_TABLE, SUMMARY_COLUMNS,
+                                 range_start, range_end, date_column="start_of_the_month_date")
+
+
 def load_monthly_customer_summary(etl_batch_date):
     """Aggregate Monthly Customer Summary correctly."""
     conn = get_connection()
-    cur = conn.cursor()
+    step_log = StepLogger("devstage_to_devdw", TABLE)
+    cur = step_log.cursor(conn.cursor())
 
     print("======================================")
     print(f"Aggregating Monthly Customer Summary for batch_date >= {etl_batch_date}")
     print("======================================")
 
     try:
-        # --- UPDATE existing monthly records ---
-        update_sql = f"""
-        UPDATE {DEVDW_SCHEMA}.{TABLE} m
-        SET
-            order_count = m.order_count + d.order_count,
-            order_apd = m.order_apd + d.order_apd,
-            order_apm = m.order_apm + d.order_apm,
-            order_cost_amount = m.order_cost_amount + d.order_cost_amount,
-            cancelled_order_count = m.cancelled_order_count + d.cancelled_order_count,
-            cancelled_order_amount = m.cancelled_order_amount + d.cancelled_order_amount,
-            cancelled_order_apd = m.cancelled_order_apd + d.cancelled_order_apd,
-            cancelled_order_apm = m.cancelled_order_apm + d.cancelled_order_apm,
-            shipped_order_count = m.shipped_order_count + d.shipped_order_count,
-            shipped_order_amount = m.shipped_order_amount + d.shipped_order_amount,
-            shipped_order_apd = m.shipped_order_apd + d.shipped_order_apd,
-            shipped_order_apm = m.shipped_order_apm + d.shipped_order_apm,
-            payment_apd = m.payment_apd + d.payment_apd,
-            payment_apm = m.payment_apm + d.payment_apm,
-            payment_amount = m.payment_amount + d.payment_amount,
-            products_ordered_qty = m.products_ordered_qty + d.products_ordered_qty,
-            products_items_qty = m.products_items_qty + d.products_items_qty,
-            order_mrp_amount = m.order_mrp_amount + d.order_mrp_amount,
-            new_customer_apd = m.new_customer_apd + d.new_customer_apd,
-            new_customer_apm = m.new_customer_apm + d.new_customer_apm,
-            new_customer_paid_apd = m.new_customer_paid_apd + d.new_customer_paid_apd,
-            new_customer_paid_apm = m.new_customer_paid_apm + d.new_customer_paid_apm,
+        # --- Months x customers touched by this batch ---
+        first_month, cell_count = stage_affected_cells(cur, CELLS_TABLE, "dw_customer_id", grain="month")
+        if not cell_count:
+            conn.commit()
+            print("No affected monthly customer cells.")
+            return
+
+        # --- Recompute those cells once from the daily table, co-located with the target ---
+        delta_sql = f"""
+        CREATE TEMP TABLE {DELTA_TABLE}
+        DISTKEY (dw_customer_id)
+        SORTKEY (start_of_the_month_date, dw_customer_id)
+        AS
+        {build_delta_select(first_month, CELLS_TABLE)};
+        """
+        cur.execute(delta_sql)
+        print("Materialized monthly customer delta.")
+
+        # --- Apply it as one upsert: recomputed cells overwrite, never add ---
+        merge_sql = f"""
+        MERGE INTO {DEVDW_SCHEMA}.{TABLE} AS m
+        USING {DELTA_TABLE} AS d
+           ON m.start_of_the_month_date = d.start_of_the_month_date
+          AND m.dw_customer_id = d.dw_customer_id
+        WHEN MATCHED THEN UPDATE SET
+            order_count = d.order_count,
+            order_apd = d.order_apd,
+            order_apm = d.order_apm,
+            order_cost_amount = d.order_cost_amount,
+            cancelled_order_count = d.cancelled_order_count,
+            cancelled_order_amount = d.cancelled_order_amount,
+            cancelled_order_apd = d.cancelled_order_apd,
+            cancelled_order_apm = d.cancelled_order_apm,
+            shipped_order_count = d.shipped_order_count,
+            shipped_order_amount = d.shipped_order_amount,
+            shipped_order_apd = d.shipped_order_apd,
+            shipped_order_apm = d.shipped_order_apm,
+            payment_apd = d.payment_apd,
+            payment_apm = d.payment_apm,
+            payment_amount = d.payment_amount,
+            products_ordered_qty = d.products_ordered_qty,
+            products_items_qty = d.products_items_qty,
+            order_mrp_amount = d.order_mrp_amount,
+            new_customer_apd = d.new_customer_apd,
+            new_customer_apm = d.new_customer_apm,
+            new_customer_paid_apd = d.new_customer_paid_apd,
+            new_customer_paid_apm = d.new_customer_paid_apm,
+            order_day_sketch = d.order_day_sketch,
+            cancelled_order_day_sketch = d.cancelled_order_day_sketch,
+            shipped_order_day_sketch = d.shipped_order_day_sketch,
+            payment_day_sketch = d.payment_day_sketch,
+            new_customer_day_sketch = d.new_customer_day_sketch,
+            new_customer_paid_day_sketch = d.new_customer_paid_day_sketch,
             dw_update_timestamp = CURRENT_TIMESTAMP,
             etl_batch_no = d.etl_batch_no,
             etl_batch_date = d.etl_batch_date
-        FROM (
-            SELECT
-                DATE_TRUNC('month', summary_date)::date AS start_of_the_month_date,
-                dw_customer_id,
-                SUM(order_count) AS order_count,
-                SUM(order_apd) AS order_apd,
-                COUNT(DISTINCT summary_date) AS order_apm,
-                SUM(order_cost_amount) AS order_cost_amount,
-                SUM(cancelled_order_count) AS cancelled_order_count,
-                SUM(cancelled_order_amount) AS cancelled_order_amount,
-                SUM(cancelled_order_apd) AS cancelled_order_apd,
-                COUNT(DISTINCT CASE WHEN cancelled_order_count > 0 THEN summary_date END) AS cancelled_order_apm,
-                SUM(shipped_order_count) AS shipped_order_count,
-                SUM(shipped_order_amount) AS shipped_order_amount,
-                SUM(shipped_order_apd) AS shipped_order_apd,
-                COUNT(DISTINCT CASE WHEN shipped_order_count > 0 THEN summary_date END) AS shipped_order_apm,
-                SUM(payment_apd) AS payment_apd,
-                COUNT(DISTINCT CASE WHEN payment_amount > 0 THEN summary_date END) AS payment_apm,
-                SUM(payment_amount) AS payment_amount,
-                SUM(products_ordered_qty) AS products_ordered_qty,
-                SUM(products_items_qty) AS products_items_qty,
-                SUM(order_mrp_amount) AS order_mrp_amount,
-                SUM(new_customer_apd) AS new_customer_apd,
-                COUNT(DISTINCT CASE WHEN new_customer_apd > 0 THEN summary_date END) AS new_customer_apm,
-                SUM(new_customer_paid_apd) AS new_customer_paid_apd,
-                COUNT(DISTINCT CASE WHEN new_customer_paid_apd > 0 THEN summary_date END) AS new_customer_paid_apm,
-                MAX(CAST(etl_batch_no AS INT)) AS etl_batch_no,
-                MAX(etl_batch_date) AS etl_batch_date
-            FROM {DEVDW_SCHEMA}.{DAILY_TABLE}
-            WHERE etl_batch_date >= '{etl_batch_date}'
-            GROUP BY 1, 2
-        ) d
-        WHERE m.start_of_the_month_date = d.start_of_the_month_date
-          AND m.dw_customer_id = d.dw_customer_id;
-        """
-        cur.execute(update_sql)
-        print("Updated existing monthly customer summary records.")
-
-        # --- INSERT new monthly records ---
-        insert_sql = f"""
-        INSERT INTO {DEVDW_SCHEMA}.{TABLE} (
+        WHEN NOT MATCHED THEN INSERT (
             start_of_the_month_date,
             dw_customer_id,
             order_count,
@@ -135,12 +239,18 @@ def load_monthly_customer_summary(etl_batch_date):
             new_customer_apm,
             new_customer_paid_apd,
             new_customer_paid_apm,
+            order_day_sketch,
+            cancelled_order_day_sketch,
+            shipped_order_day_sketch,
+            payment_day_sketch,
+            new_customer_day_sketch,
+            new_customer_paid_day_sketch,
             dw_create_timestamp,
             dw_update_timestamp,
             etl_batch_no,
             etl_batch_date
         )
-        SELECT
+        VALUES (
             d.start_of_the_month_date,
             d.dw_customer_id,
             d.order_count,
@@ -165,59 +275,46 @@ def load_monthly_customer_summary(etl_batch_date):
             d.new_customer_apm,
             d.new_customer_paid_apd,
             d.new_customer_paid_apm,
+            d.order_day_sketch,
+            d.cancelled_order_day_sketch,
+            d.shipped_order_day_sketch,
+            d.payment_day_sketch,
+            d.new_customer_day_sketch,
+            d.new_customer_paid_day_sketch,
             CURRENT_TIMESTAMP,
             CURRENT_TIMESTAMP,
             d.etl_batch_no,
             d.etl_batch_date
-        FROM (
-            SELECT
-                DATE_TRUNC('month', summary_date)::date AS start_of_the_month_date,
-                dw_customer_id,
-                SUM(order_count) AS order_count,
-                SUM(order_apd) AS order_apd,
-                COUNT(DISTINCT summary_date) AS order_apm,
-                SUM(order_cost_amount) AS order_cost_amount,
-                SUM(cancelled_order_count) AS cancelled_order_count,
-                SUM(cancelled_order_amount) AS cancelled_order_amount,
-                SUM(cancelled_order_apd) AS cancelled_order_apd,
-                COUNT(DISTINCT CASE WHEN cancelled_order_count > 0 THEN summary_date END) AS cancelled_order_apm,
-                SUM(shipped_order_count) AS shipped_order_count,
-                SUM(shipped_order_amount) AS shipped_order_amount,
-                SUM(shipped_order_apd) AS shipped_order_apd,
-                COUNT(DISTINCT CASE WHEN shipped_order_count > 0 THEN summary_date END) AS shipped_order_apm,
-                SUM(payment_apd) AS payment_apd,
-                COUNT(DISTINCT CASE WHEN payment_amount > 0 THEN summary_date END) AS payment_apm,
-                SUM(payment_amount) AS payment_amount,
-                SUM(products_ordered_qty) AS products_ordered_qty,
-                SUM(products_items_qty) AS products_items_qty,
-                SUM(order_mrp_amount) AS order_mrp_amount,
-                SUM(new_customer_apd) AS new_customer_apd,
-                COUNT(DISTINCT CASE WHEN new_customer_apd > 0 THEN summary_date END) AS new_customer_apm,
-                SUM(new_customer_paid_apd) AS new_customer_paid_apd,
-                COUNT(DISTINCT CASE WHEN new_customer_paid_apd > 0 THEN summary_date END) AS new_customer_paid_apm,
-                MAX(CAST(etl_batch_no AS INT)) AS etl_batch_no,
-                MAX(etl_batch_date) AS etl_batch_date
-            FROM {DEVDW_SCHEMA}.{DAILY_TABLE}
-            WHERE etl_batch_date >= '{etl_batch_date}'
-            GROUP BY 1, 2
-        ) d
-        LEFT JOIN {DEVDW_SCHEMA}.{TABLE} m
-          ON m.start_of_the_month_date = d.start_of_the_month_date
-         AND m.dw_customer_id = d.dw_customer_id
-        WHERE m.dw_customer_id IS NULL;
+        );
+        """
+        cur.execute(merge_sql)
+
+        # --- Cells whose daily rows all disappeared ---
+        vanished_sql = f"""
+        DELETE FROM {DEVDW_SCHEMA}.{TABLE}
+        USING {CELLS_TABLE} c
+        WHERE {DEVDW_SCHEMA}.{TABLE}.start_of_the_month_date = c.summary_date
+          AND {DEVDW_SCHEMA}.{TABLE}.dw_customer_id = c.dw_customer_id
+          AND NOT EXISTS (
+              SELECT 1 FROM {DELTA_TABLE} d
+              WHERE d.start_of_the_month_date = c.summary_date
+                AND d.dw_customer_id = c.dw_customer_id
+          );
         """
-        cur.execute(insert_sql)
+        cur.execute(vanished_sql)
         conn.commit()
         print("Monthly Customer Summary aggregation completed successfully.")
 
     except Exception as e:
         conn.rollback()
         print(f"Error while loading monthly customer summary: {e}")
+        sys.exit(1)
 
     finally:
         cur.close()
         conn.close()
         print("Connection closed.")
+        step_log.flush()
 
 
 if __name__ == "__main__":
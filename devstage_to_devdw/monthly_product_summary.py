@@ -1,11 +1,15 @@
 import os
 import sys
-import psycopg2
+from datetime import timedelta
 from dotenv import load_dotenv
 
 # Add parent path for db_utils import
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_utils import get_batch_date_from_redshift
+from step_log_utils import StepLogger
+from warehouse_utils import connect_warehouse
+from fact_utils import ORDER_LINE_FACT
+from summary_utils import stage_affected_cells, stage_summary_rows, replace_summary_range
 
 # Load environment variable
 load_dotenv()
@@ -18,11 +22,35 @@ REDSHIFT_PASSWORD = os.getenv("REDSHIFT_PASSWORD")
 
 DEVDW_SCHEMA = "j25gokulraj_devdw"
 TABLE = "monthly_product_summary"
+DAILY_TABLE = "daily_product_summary"
+DELTA_TABLE = "monthly_product_delta"
+CELLS_TABLE = "monthly_product_cells"
+
+
+# Column order of build_delta_select
+SUMMARY_COLUMNS = [
+    "start_of_the_month_date",
+    "dw_product_id",
+    "customer_apd",
+    "customer_apm",
+    "product_cost_amount",
+    "product_mrp_amount",
+    "cancelled_product_qty",
+    "cancelled_cost_amount",
+    "cancelled_mrp_amount",
+    "cancelled_order_apd",
+    "cancelled_order_apm",
+    "customer_sketch",
+    "etl_batch_no",
+    "etl_batch_date",
+    "dw_create_timestamp",
+    "dw_update_timestamp",
+]
 
 
 def get_connection():
     """Create a connection to Redshift."""
-    return psycopg2.connect(
+    return connect_warehouse(
         dbname=REDSHIFT_DB,
         user=REDSHIFT_USER,
         password=REDSHIFT_PASSWORD,
@@ -31,10 +59,98 @@ def get_connection():
     )
 
 
+def build_delta_select(first_month, cells_table=None, month_ceiling=None):
+    """SELECT of monthly_product_summary rows per (start_of_the_month_date, dw_product_id)
+    from the order line fact, with the distinct customers merged from the daily
+    customer sketches of daily_product_summary.
+
+    With cells_table only those (month, dw_product_id) cells are produced and
+    first_month is the earliest of them. With month_ceiling only months before
+    it are read (backfill partitions).
+    """
+    product_scope = daily_scope = cell_join = ceiling_filter = daily_ceiling = ""
+    if cells_table:
+        product_scope = f"AND f.dw_product_id IN (SELECT dw_product_id FROM {cells_table})"
+        daily_scope = f"AND dw_product_id IN (SELECT dw_product_id FROM {cells_table})"
+        cell_join = f"""JOIN {cells_table} c
+      ON c.summary_date = d.start_of_the_month_date
+     AND c.dw_product_id = d.dw_product_id"""
+    if month_ceiling:
+        ceiling_filter = f"AND f.order_date < '{month_ceiling}'"
+        daily_ceiling = f"AND summary_date < '{month_ceiling}'"
+
+    return f"""
+    SELECT
+        d.start_of_the_month_date,
+        d.dw_product_id,
+        COALESCE(HLL_CARDINALITY(s.customer_sketch), 0) AS customer_apd,
+        d.customer_apm,
+        d.product_cost_amount,
+        d.product_mrp_amount,
+        d.cancelled_product_qty,
+        d.cancelled_cost_amount,
+        d.cancelled_mrp_amount,
+        d.cancelled_order_apd,
+        d.cancelled_order_apm,
+        s.customer_sketch,
+        d.etl_batch_no,
+        d.etl_batch_date,
+        d.dw_create_timestamp,
+        d.dw_update_timestamp
+    FROM (
+        SELECT
+            DATE_TRUNC('month', f.order_date)::date AS start_of_the_month_date,
+            f.dw_product_id,
+            1 AS customer_apm,
+            SUM(f.cost_amount) AS product_cost_amount,
+            SUM(f.mrp_amount) AS product_mrp_amount,
+            SUM(CASE WHEN f.is_cancelled THEN f.quantity_ordered ELSE 0 END) AS cancelled_product_qty,
+            SUM(CASE WHEN f.is_cancelled THEN f.cost_amount ELSE 0 END) AS cancelled_cost_amount,
+            SUM(CASE WHEN f.is_cancelled THEN f.mrp_amount ELSE 0 END) AS cancelled_mrp_amount,
+            COUNT(DISTINCT CASE WHEN f.is_cancelled THEN f.dw_order_id END) AS cancelled_order_apd,
+            COUNT(DISTINCT CASE WHEN f.is_cancelled THEN DATE_TRUNC('month', f.cancelled_date) END) AS cancelled_order_apm,
+            MAX(f.etl_batch_no) AS etl_batch_no,
+            MAX(f.etl_batch_date) AS etl_batch_date,
+            CURRENT_TIMESTAMP AS dw_create_timestamp,
+            CURRENT_TIMESTAMP AS dw_update_timestamp
+        FROM {DEVDW_SCHEMA}.{ORDER_LINE_FACT} f
+        WHERE f.dw_product_id IS NOT NULL
+          AND f.order_date >= '{first_month}'
+          {ceiling_filter}
+          {product_scope}
+        GROUP BY 1, 2
+    ) d
+    LEFT JOIN (
+        SELECT
+            DATE_TRUNC('month', summary_date)::date AS start_of_the_month_date,
+            dw_product_id,
+            HLL_COMBINE(customer_sketch) AS customer_sketch
+        FROM {DEVDW_SCHEMA}.{DAILY_TABLE}
+        WHERE summary_date >= '{first_month}'
+          {daily_ceiling}
+          {daily_scope}
+        GROUP BY 1, 2
+    ) s
+      ON s.start_of_the_month_date = d.start_of_the_month_date
+     AND s.dw_product_id = d.dw_product_id
+    {cell_join}
+    """
+
+
+def backfill_partition(cur, range_start, range_end):
+    """Recompute the months of [range_start, range_end] from the order line fact and the
+    daily table and swap them in; the caller commits"""
+    stage_summary_rows(cur, DELTA_TABLE, SUMMARY_COLUMNS,
+                       build_delta_select(range_start, month_ceiling=range_end + timedelta(days=1)))
+    return replace_summary_range(cur, f"{DEVDW_SCHEMA}.{TABLE}", DELTA_TABLE, SUMMARY_COLUMNS,
+                                 range_start, range_end, date_column="start_of_the_month_date")
+
+
 def load_monthly_product_summary():
     """Aggregate Monthly Product Summary correctly."""
     conn = get_connection()
-    cur = conn.cursor()
+    step_log = StepLogger("devstage_to_devdw", TABLE)
+    cur = step_log.cursor(conn.cursor())
     BATCH_DATE = get_batch_date_from_redshift()
 
     print("======================================")
@@ -42,48 +158,46 @@ def load_monthly_product_summary():
     print("======================================")
 
     try:
-        sql = f"""
-        -- Step 1️ : UPDATE existing monthly records
-        UPDATE {DEVDW_SCHEMA}.{TABLE}
-        SET 
-            customer_apd = {DEVDW_SCHEMA}.{TABLE}.customer_apd + d.customer_apd,
-            customer_apm = {DEVDW_SCHEMA}.{TABLE}.customer_apm + d.customer_apm,
-            product_cost_amount = {DEVDW_SCHEMA}.{TABLE}.product_cost_amount + d.product_cost_amount,
-            product_mrp_amount = {DEVDW_SCHEMA}.{TABLE}.product_mrp_amount + d.product_mrp_amount,
-            cancelled_product_qty = {DEVDW_SCHEMA}.{TABLE}.cancelled_product_qty + d.cancelled_product_qty,
-            cancelled_cost_amount = {DEVDW_SCHEMA}.{TABLE}.cancelled_cost_amount + d.cancelled_cost_amount,
-            cancelled_mrp_amount = {DEVDW_SCHEMA}.{TABLE}.cancelled_mrp_amount + d.cancelled_mrp_amount,
-            cancelled_order_apd = {DEVDW_SCHEMA}.{TABLE}.cancelled_order_apd + d.cancelled_order_apd,
-            cancelled_order_apm = {DEVDW_SCHEMA}.{TABLE}.cancelled_order_apm + d.cancelled_order_apm,
+        # Step 1️ : Months x products whose order lines changed in this batch
+        first_month, cell_count = stage_affected_cells(cur, CELLS_TABLE, "dw_product_id",
+                                                       event_types=["order"], grain="month")
+        if not cell_count:
+            conn.commit()
+            print("No affected monthly product cells.")
+            return
+
+        # Step 2️ : Recompute those cells once from the order line fact and the daily sketches
+        delta_sql = f"""
+        CREATE TEMP TABLE {DELTA_TABLE}
+        DISTKEY (dw_product_id)
+        SORTKEY (start_of_the_month_date, dw_product_id)
+        AS
+        {build_delta_select(first_month, CELLS_TABLE)};
+        """
+        cur.execute(delta_sql)
+        print("Materialized monthly product delta.")
+
+        # Step 3️ : Overwrite existing and INSERT new monthly records in one upsert
+        merge_sql = f"""
+        MERGE INTO {DEVDW_SCHEMA}.{TABLE} AS m
+        USING {DELTA_TABLE} AS d
+           ON m.start_of_the_month_date = d.start_of_the_month_date
+          AND m.dw_product_id = d.dw_product_id
+        WHEN MATCHED THEN UPDATE SET
+            customer_apd = d.customer_apd,
+            customer_apm = d.customer_apm,
+            product_cost_amount = d.product_cost_amount,
+            product_mrp_amount = d.product_mrp_amount,
+            cancelled_product_qty = d.cancelled_product_qty,
+            cancelled_cost_amount = d.cancelled_cost_amount,
+            cancelled_mrp_amount = d.cancelled_mrp_amount,
+            cancelled_order_apd = d.cancelled_order_apd,
+            cancelled_order_apm = d.cancelled_order_apm,
+            customer_sketch = d.customer_sketch,
             dw_update_timestamp = CURRENT_TIMESTAMP,
             etl_batch_no = d.etl_batch_no,
             etl_batch_date = d.etl_batch_date
-        FROM (
-            SELECT 
-                DATE_TRUNC('month', o.orderDate) AS start_of_the_month_date,
-                od.dw_product_id,
-                COUNT(DISTINCT o.dw_customer_id) AS customer_apd,
-                1 AS customer_apm,
-                SUM(od.priceEach * od.quantityOrdered) AS product_cost_amount,
-                SUM(p.MSRP * od.quantityOrdered) AS product_mrp_amount,
-                SUM(CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN od.quantityOrdered ELSE 0 END) AS cancelled_product_qty,
-                SUM(CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN od.priceEach * od.quantityOrdered ELSE 0 END) AS cancelled_cost_amount,
-                SUM(CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN p.MSRP * od.quantityOrdered ELSE 0 END) AS cancelled_mrp_amount,
-                COUNT(DISTINCT CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN o.dw_order_id END) AS cancelled_order_apd,
-                COUNT(DISTINCT CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN DATE_TRUNC('month', o.cancelledDate) END) AS cancelled_order_apm,
-                MAX(CAST(o.etl_batch_no AS INT)) AS etl_batch_no,
-                MAX(o.etl_batch_date) AS etl_batch_date
-            FROM {DEVDW_SCHEMA}.orders o
-            JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
-            JOIN {DEVDW_SCHEMA}.products p ON od.dw_product_id = p.dw_product_id
-            WHERE (CAST(o.orderDate AS DATE) >= '{BATCH_DATE}' OR CAST(o.cancelledDate AS DATE) >= '{BATCH_DATE}')
-            GROUP BY 1, 2
-        ) d
-        WHERE {DEVDW_SCHEMA}.{TABLE}.start_of_the_month_date = d.start_of_the_month_date
-          AND {DEVDW_SCHEMA}.{TABLE}.dw_product_id = d.dw_product_id;
-
-        -- Step 2️ : INSERT new monthly records
-        INSERT INTO {DEVDW_SCHEMA}.{TABLE} (
+        WHEN NOT MATCHED THEN INSERT (
             start_of_the_month_date,
             dw_product_id,
             customer_apd,
@@ -95,12 +209,13 @@ def load_monthly_product_summary():
             cancelled_mrp_amount,
             cancelled_order_apd,
             cancelled_order_apm,
+            customer_sketch,
             dw_create_timestamp,
             dw_update_timestamp,
             etl_batch_no,
             etl_batch_date
         )
-        SELECT 
+        VALUES (
             d.start_of_the_month_date,
             d.dw_product_id,
             d.customer_apd,
@@ -112,48 +227,40 @@ def load_monthly_product_summary():
             d.cancelled_mrp_amount,
             d.cancelled_order_apd,
             d.cancelled_order_apm,
+            d.customer_sketch,
             CURRENT_TIMESTAMP,
             CURRENT_TIMESTAMP,
             d.etl_batch_no,
             d.etl_batch_date
-        FROM (
-            SELECT 
-                DATE_TRUNC('month', o.orderDate) AS start_of_the_month_date,
-                od.dw_product_id,
-                COUNT(DISTINCT o.dw_customer_id) AS customer_apd,
-                1 AS customer_apm,
-                SUM(od.priceEach * od.quantityOrdered) AS product_cost_amount,
-                SUM(p.MSRP * od.quantityOrdered) AS product_mrp_amount,
-                SUM(CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN od.quantityOrdered ELSE 0 END) AS cancelled_product_qty,
-                SUM(CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN od.priceEach * od.quantityOrdered ELSE 0 END) AS cancelled_cost_amount,
-                SUM(CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN p.MSRP * od.quantityOrdered ELSE 0 END) AS cancelled_mrp_amount,
-                COUNT(DISTINCT CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN o.dw_order_id END) AS cancelled_order_apd,
-                COUNT(DISTINCT CASE WHEN LOWER(TRIM(o.status)) = 'cancelled' THEN DATE_TRUNC('month', o.cancelledDate) END) AS cancelled_order_apm,
-                MAX(CAST(o.etl_batch_no AS INT)) AS etl_batch_no,
-                MAX(o.etl_batch_date) AS etl_batch_date
-            FROM {DEVDW_SCHEMA}.orders o
-            JOIN {DEVDW_SCHEMA}.orderdetails od ON o.dw_order_id = od.dw_order_id
-            JOIN {DEVDW_SCHEMA}.products p ON od.dw_product_id = p.dw_product_id
-            WHERE (CAST(o.orderDate AS DATE) >= '{BATCH_DATE}' OR CAST(o.cancelledDate AS DATE) >= '{BATCH_DATE}')
-            GROUP BY 1, 2
-        ) d
-        LEFT JOIN {DEVDW_SCHEMA}.{TABLE}
-          ON {DEVDW_SCHEMA}.{TABLE}.start_of_the_month_date = d.start_of_the_month_date
-         AND {DEVDW_SCHEMA}.{TABLE}.dw_product_id = d.dw_product_id
-        WHERE {DEVDW_SCHEMA}.{TABLE}.dw_product_id IS NULL;
+        );
         """
+        cur.execute(merge_sql)
 
-        cur.execute(sql)
+        # Step 4️ : Cells whose order lines all disappeared
+        vanished_sql = f"""
+        DELETE FROM {DEVDW_SCHEMA}.{TABLE}
+        USING {CELLS_TABLE} c
+        WHERE {DEVDW_SCHEMA}.{TABLE}.start_of_the_month_date = c.summary_date
+          AND {DEVDW_SCHEMA}.{TABLE}.dw_product_id = c.dw_product_id
+          AND NOT EXISTS (
+              SELECT 1 FROM {DELTA_TABLE} d
+              WHERE d.start_of_the_month_date = c.summary_date
+                AND d.dw_product_id = c.dw_product_id
+          );
+        """
+        cur.execute(vanished_sql)
         conn.commit()
         print("Monthly Product Summary aggregated successfully.")
 
     except Exception as e:
         conn.rollback()
         print(f"Error while loading monthly product summary: {e}")
+        sys.exit(1)
     finally:
         cur.close()
         conn.close()
         print("Connection closed.")
+        step_log.flush()
 
 
 if __name__ == "__main__":
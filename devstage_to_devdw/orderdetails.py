@@ -1,10 +1,12 @@
 import os
 import sys
-import psycopg2
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_utils import get_batch_date_from_redshift
+from step_log_utils import StepLogger
+from warehouse_utils import connect_warehouse
+from fact_utils import refresh_order_line_fact
 
 load_dotenv()
 
@@ -20,7 +22,7 @@ TABLE = "orderdetails"
 
 def get_connection():
     try:
-        conn = psycopg2.connect(
+        conn = connect_warehouse(
             dbname=REDSHIFT_DB,
             user=REDSHIFT_USER,
             password=REDSHIFT_PASSWORD,
@@ -35,7 +37,8 @@ def get_connection():
 
 def load_incremental_orderdetails():
     conn = get_connection()
-    cur = conn.cursor()
+    step_log = StepLogger("devstage_to_devdw", TABLE)
+    cur = step_log.cursor(conn.cursor())
 
     # Get batch date
     BATCH_DATE = get_batch_date_from_redshift()
@@ -108,17 +111,23 @@ def load_incremental_orderdetails():
         """
         cur.execute(insert_sql)
 
+        # Keep the shared order line fact in step with this batch; refreshed once, here,
+        # since orders (header changes are picked up from devstage) always runs first
+        refresh_order_line_fact(cur)
+
         conn.commit()
         print("Inserted new orderdetails records successfully.")
 
     except Exception as e:
         conn.rollback()
         print(f"Error during incremental load for {TABLE}: {e}")
+        sys.exit(1)
 
     finally:
         cur.close()
         conn.close()
         print("Connection closed.")
+        step_log.flush()
 
 if __name__ == "__main__":
     load_incremental_orderdetails()
@@ -1,10 +1,12 @@
 import os
 import sys
-import psycopg2
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_utils import get_batch_date_from_redshift
+from step_log_utils import StepLogger
+from warehouse_utils import connect_warehouse
+from summary_utils import record_affected_keys
 
 load_dotenv()
 
@@ -20,7 +22,7 @@ TABLE = "payments"
 
 def get_connection():
     try:
-        conn = psycopg2.connect(
+        conn = connect_warehouse(
             dbname=REDSHIFT_DB,
             user=REDSHIFT_USER,
             password=REDSHIFT_PASSWORD,
@@ -35,7 +37,8 @@ def get_connection():
 
 def load_incremental_payments():
     conn = get_connection()
-    cur = conn.cursor()
+    step_log = StepLogger("devstage_to_devdw", TABLE)
+    cur = step_log.cursor(conn.cursor())
 
     # Get current batch date
     BATCH_DATE = get_batch_date_from_redshift()
@@ -45,6 +48,16 @@ def load_incremental_payments():
     print("======================================")
 
     try:
+        # Summary cells of staged payments, before and after this load
+        staged_payment_keys = f"""
+        SELECT CAST(d.paymentDate AS DATE) AS summary_date, d.dw_customer_id, CAST(NULL AS INT) AS dw_product_id
+        FROM {DEVDW_SCHEMA}.{TABLE} d
+        JOIN {DEVSTAGE_SCHEMA}.{TABLE} s
+          ON d.src_customerNumber = s.customerNumber
+         AND d.checkNumber = s.checkNumber
+        """
+        record_affected_keys(cur, "payment", staged_payment_keys)
+
         update_sql = f"""
         UPDATE {DEVDW_SCHEMA}.{TABLE} d
         SET
@@ -101,6 +114,7 @@ def load_incremental_payments():
         WHERE d.src_customerNumber IS NULL;
         """
         cur.execute(insert_sql)
+        record_affected_keys(cur, "payment", staged_payment_keys)
 
         conn.commit()
         print("Inserted new payment records successfully.")
@@ -108,11 +122,13 @@ def load_incremental_payments():
     except Exception as e:
         conn.rollback()
         print(f"Error during incremental load for {TABLE}: {e}")
+        sys.exit(1)
 
     finally:
         cur.close()
         conn.close()
         print("Connection closed.")
+        step_log.flush()
 
 if __name__ == "__main__":
     load_incremental_payments()
@@ -0,0 +1,149 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import METADATA_SCHEMA
+from summary_utils import record_affected_keys
+from schema_utils import ensure_table
+
+DEVSTAGE_SCHEMA = "j25gokulraj_devstage"
+DEVDW_SCHEMA = "j25gokulraj_devdw"
+ORDER_LINE_FACT = "order_line_fact"
+CHANGED_ORDERS_TABLE = "olf_changed_orders"
+
+
+def create_order_line_fact(cur):
+    """Create the denormalized order line fact if it does not exist yet"""
+    ensure_table(cur, DEVDW_SCHEMA, ORDER_LINE_FACT)
+
+
+def record_fact_keys(cur):
+    """Record every summary key the changed orders' fact lines currently map to"""
+    lines = f"""
+        SELECT f.*
+        FROM {DEVDW_SCHEMA}.{ORDER_LINE_FACT} f
+        JOIN {CHANGED_ORDERS_TABLE} c
+          ON c.dw_order_id = f.dw_order_id
+    """
+    record_affected_keys(cur, "order", f"""
+        SELECT l.order_date AS summary_date, l.dw_customer_id, l.dw_product_id FROM ({lines}) l
+    """)
+    record_affected_keys(cur, "cancelled", f"""
+        SELECT l.cancelled_date AS summary_date, l.dw_customer_id, l.dw_product_id FROM ({lines}) l
+        WHERE l.is_cancelled
+    """)
+    record_affected_keys(cur, "shipped", f"""
+        SELECT l.shipped_date AS summary_date, l.dw_customer_id, l.dw_product_id FROM ({lines}) l
+        WHERE l.is_shipped
+    """)
+
+
+def refresh_order_line_fact(cur):
+    """Replace fact lines of every order touched by this batch.
+
+    An order is touched if its header, one of its lines, or the MSRP source of
+    one of its products was staged in this batch (devstage holds only the
+    current batch). The first run, on an empty fact, loads everything.
+    Summary keys of both the replaced and the new lines are recorded for the
+    affected-cell recompute in the summary scripts.
+    """
+    create_order_line_fact(cur)
+
+    cur.execute(f"SELECT 1 FROM {DEVDW_SCHEMA}.{ORDER_LINE_FACT} LIMIT 1;")
+    full_load = cur.fetchone() is None
+
+    cur.execute(f"DROP TABLE IF EXISTS {CHANGED_ORDERS_TABLE};")
+    if full_load:
+        cur.execute(f"""
+            CREATE TEMP TABLE {CHANGED_ORDERS_TABLE} DISTKEY (dw_order_id) AS
+            SELECT dw_order_id FROM {DEVDW_SCHEMA}.orders;
+        """)
+    else:
+        cur.execute(f"""
+            CREATE TEMP TABLE {CHANGED_ORDERS_TABLE} DISTKEY (dw_order_id) AS
+            SELECT o.dw_order_id
+            FROM {DEVDW_SCHEMA}.orders o
+            JOIN {DEVSTAGE_SCHEMA}.orders s
+              ON s.orderNumber = o.src_orderNumber
+            UNION
+            SELECT od.dw_order_id
+            FROM {DEVDW_SCHEMA}.orderdetails od
+            JOIN {DEVSTAGE_SCHEMA}.orderdetails s
+              ON s.orderNumber = od.src_orderNumber
+             AND s.productCode = od.src_productCode
+            UNION
+            SELECT od.dw_order_id
+            FROM {DEVDW_SCHEMA}.orderdetails od
+            JOIN {DEVDW_SCHEMA}.products p
+              ON p.dw_product_id = od.dw_product_id
+            JOIN {DEVSTAGE_SCHEMA}.products s
+              ON s.productCode = p.src_productCode;
+        """)
+
+    # Old version of the changed lines: their summary cells lose these facts
+    record_fact_keys(cur)
+
+    cur.execute(f"""
+        DELETE FROM {DEVDW_SCHEMA}.{ORDER_LINE_FACT}
+        USING {CHANGED_ORDERS_TABLE} c
+        WHERE {DEVDW_SCHEMA}.{ORDER_LINE_FACT}.dw_order_id = c.dw_order_id;
+    """)
+
+    # dw_product_id comes from the products join, so it is NULL for a line whose
+    # product row is missing; the summaries filter on it to keep their INNER JOIN
+    cur.execute(f"""
+        INSERT INTO {DEVDW_SCHEMA}.{ORDER_LINE_FACT} (
+            dw_order_id,
+            dw_customer_id,
+            dw_product_id,
+            src_orderNumber,
+            src_productCode,
+            order_date,
+            cancelled_date,
+            shipped_date,
+            status,
+            is_cancelled,
+            is_shipped,
+            quantity_ordered,
+            price_each,
+            msrp,
+            cost_amount,
+            mrp_amount,
+            dw_create_timestamp,
+            etl_batch_no,
+            etl_batch_date
+        )
+        SELECT
+            o.dw_order_id,
+            o.dw_customer_id,
+            p.dw_product_id,
+            od.src_orderNumber,
+            od.src_productCode,
+            CAST(o.orderDate AS DATE),
+            CAST(o.cancelledDate AS DATE),
+            CAST(o.shippedDate AS DATE),
+            o.status,
+            LOWER(TRIM(o.status)) = 'cancelled',
+            LOWER(TRIM(o.status)) = 'shipped',
+            od.quantityOrdered,
+            od.priceEach,
+            p.MSRP,
+            od.priceEach * od.quantityOrdered,
+            p.MSRP * od.quantityOrdered,
+            GETDATE(),
+            b.etl_batch_no,
+            b.etl_batch_date
+        FROM {CHANGED_ORDERS_TABLE} c
+        JOIN {DEVDW_SCHEMA}.orders o
+          ON o.dw_order_id = c.dw_order_id
+        JOIN {DEVDW_SCHEMA}.orderdetails od
+          ON od.dw_order_id = o.dw_order_id
+        LEFT JOIN {DEVDW_SCHEMA}.products p
+          ON p.dw_product_id = od.dw_product_id
+        CROSS JOIN {METADATA_SCHEMA}.batch_control b;
+    """)
+    inserted = cur.rowcount
+
+    # New version of the changed lines: their summary cells gain these facts
+    record_fact_keys(cur)
+    print(f"Refreshed {ORDER_LINE_FACT} for {'all' if full_load else 'changed'} orders ({inserted} lines).")
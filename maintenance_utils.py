@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, METADATA_SCHEMA
+from schema_utils import DEVDW_SCHEMA, ensure_table
+from step_log_utils import StepLogger, STEP_LOG
+from warehouse_utils import warehouse_engine
+
+load_dotenv()
+
+# Thresholds (percent) above which a touched table gets maintenance
+UNSORTED_PCT_THRESHOLD = float(os.getenv("VACUUM_UNSORTED_PCT", "10"))
+DELETED_PCT_THRESHOLD = float(os.getenv("VACUUM_DELETED_PCT", "5"))
+STATS_OFF_THRESHOLD = float(os.getenv("ANALYZE_STATS_OFF_PCT", "10"))
+MAINTENANCE_BUDGET_SECONDS = int(os.getenv("MAINTENANCE_BUDGET_SECONDS", "900"))
+
+# devstage is truncated every batch, so only tables that outlive a run count
+MAINTAINED_SCHEMAS = (DEVDW_SCHEMA, METADATA_SCHEMA)
+
+
+def redshift_now():
+    """Current Redshift timestamp (UTC, same clock as the stl_* system tables)"""
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT GETDATE();")
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def fetch_touched_tables(cur, since):
+    """Health of every table in MAINTAINED_SCHEMAS written to since the given timestamp"""
+    schemas = ", ".join(f"'{s.lower()}'" for s in MAINTAINED_SCHEMAS)
+    cur.execute(f"""
+        SELECT
+            ti."schema",
+            ti."table",
+            COALESCE(ti.unsorted, 0),
+            COALESCE(ti.stats_off, 0),
+            CASE WHEN ti.tbl_rows > 0
+                 THEN 100.0 * (ti.tbl_rows - ti.estimated_visible_rows) / ti.tbl_rows
+                 ELSE 0 END AS deleted_pct,
+            ti.tbl_rows
+        FROM svv_table_info ti
+        WHERE ti."schema" IN ({schemas})
+          AND ti.table_id IN (
+              SELECT tbl FROM stl_insert WHERE starttime >= %s
+              UNION
+              SELECT tbl FROM stl_delete WHERE starttime >= %s
+          );
+    """, (since, since))
+    return cur.fetchall()
+
+
+def plan_maintenance(tables):
+    """Decide which commands each table needs; worst tables first"""
+    plan = []
+    for schema, table, unsorted, stats_off, deleted_pct, tbl_rows in tables:
+        target = f"{schema}.{table}"
+        needs_sort = unsorted > UNSORTED_PCT_THRESHOLD
+        needs_delete = deleted_pct > DELETED_PCT_THRESHOLD
+        if needs_sort and needs_delete:
+            plan.append((unsorted + deleted_pct, target, f"VACUUM FULL {target};"))
+        elif needs_sort:
+            plan.append((unsorted, target, f"VACUUM SORT ONLY {target};"))
+        elif needs_delete:
+            plan.append((deleted_pct, target, f"VACUUM DELETE ONLY {target};"))
+        if stats_off > STATS_OFF_THRESHOLD:
+            plan.append((stats_off, target, f"ANALYZE {target} PREDICATE COLUMNS;"))
+    plan.sort(key=lambda p: p[0], reverse=True)
+    return plan
+
+
+def vacuum_full_history(cur):
+    """{"VACUUM FULL <table>": wall seconds of its latest successful run} from the step log"""
+    ensure_table(cur, METADATA_SCHEMA, STEP_LOG)
+    cur.execute(f"""
+        SELECT step_name, wall_seconds
+        FROM {METADATA_SCHEMA}.{STEP_LOG}
+        WHERE stage = 'maintenance'
+          AND step_name LIKE %s
+          AND status = 'S'
+        ORDER BY start_time;
+    """, ("VACUUM FULL %",))
+    return {step: float(seconds) for step, seconds in cur.fetchall() if seconds is not None}
+
+
+def run_table_maintenance(since, budget_seconds=MAINTENANCE_BUDGET_SECONDS):
+    """VACUUM/ANALYZE only the tables of this run that crossed a threshold, within a time budget"""
+    if warehouse_engine() != "redshift":
+        print(f"Table maintenance skipped: not needed on {warehouse_engine()}.")
+        return
+    conn = get_redshift_connection()
+    # VACUUM cannot run inside a transaction block
+    conn.autocommit = True
+    step_log = StepLogger("maintenance", "touched tables")
+    cur = step_log.cursor(conn.cursor())
+
+    print("======================================")
+    print(f"Post-load table maintenance (budget {budget_seconds}s)")
+    print("======================================")
+
+    start = time.time()
+    try:
+        plan = plan_maintenance(fetch_touched_tables(cur, since))
+        if not plan:
+            print("No touched table crossed a maintenance threshold.")
+        # The budget is only checked between commands, so a VACUUM FULL that
+        # last took longer than what is left would overrun it
+        vacuum_seconds = vacuum_full_history(cur) if plan else {}
+        for severity, target, sql in plan:
+            elapsed = time.time() - start
+            if elapsed >= budget_seconds:
+                print(f"Budget exhausted after {elapsed:.0f}s; skipped: {sql}")
+                continue
+            step = sql.rstrip(";")
+            if vacuum_seconds.get(step, 0) > budget_seconds - elapsed:
+                print(f"Last {step} took {vacuum_seconds[step]:.0f}s, "
+                      f"{budget_seconds - elapsed:.0f}s of budget left; skipped: {sql}")
+                continue
+            print(f"{sql} (severity {severity:.1f})")
+            cur.execute(sql, step=step)
+        print(f"Table maintenance finished in {time.time() - start:.0f}s.")
+
+    except Exception as e:
+        # Maintenance never fails the batch
+        print(f"Error during table maintenance: {e}")
+
+    finally:
+        cur.close()
+        conn.close()
+        print("Connection closed.")
+        step_log.flush()
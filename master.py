@@ -1,6 +1,19 @@
 import subprocess
+import sys
 import os
+import time
 from db_utils import insert_batch_log, update_batch_log
+from maintenance_utils import redshift_now, run_table_maintenance
+from step_log_utils import current_run_id
+from profile_utils import enable_profiling
+from trace_utils import init_tracing, trace_span, export, TRACE_DIR_ENV
+from task_state_utils import plan_resume, stage_tables, RESUME_ENV
+from scheduler_utils import predict_run
+from summary_utils import purge_affected_keys
+from catchup_utils import (
+    pending_batches, set_current_batch, last_passed_batch, SUMMARY_TABLES,
+    CATCH_UP_DATES_ENV, CATCH_UP_FIRST_BATCH_ENV
+)
 
 # Paths to your main ETL scripts
 ETL_STAGES = [
@@ -16,18 +29,50 @@ def run_stage(script_path):
     print(f"Running ETL stage: {script_path}")
     print("=====================================================")
 
-    result = subprocess.run(["python", script_path])
+    # ETL_PROFILE_DIR is inherited, so --profile reaches every stage and table task
+    with trace_span(script_path, "stage") as attributes:
+        result = subprocess.run(["python", script_path])
+        attributes["returncode"] = result.returncode
     return result.returncode == 0
 
 def main():
+    # --resume <run_id>: rerun only the tasks of that run that are not done, and their dependents
+    if "--resume" in sys.argv:
+        os.environ["ETL_RUN_ID"] = sys.argv[sys.argv.index("--resume") + 1]
+        os.environ[RESUME_ENV] = "1"
     print("=====================================================")
     print("Starting FULL ETL PIPELINE: Source → S3 → DevStage → DevDW")
+    # Stage scripts inherit ETL_RUN_ID, so their step log rows share this run id
+    print(f"Run id: {current_run_id()}")
+    enable_profiling(sys.argv)
+    tracing = init_tracing()
     print("=====================================================")
 
-    # Step 1: Insert batch log (mark as running)
-    insert_batch_log()
+    with trace_span(f"run {current_run_id()}", "run"):
+        # --catch-up <first_date> <last_date>: work off a backlog of batch dates in one run
+        if "--catch-up" in sys.argv:
+            position = sys.argv.index("--catch-up")
+            run_catch_up(sys.argv[position + 1], sys.argv[position + 2])
+        else:
+            run_pipeline()
+
+    if tracing:
+        export(os.environ[TRACE_DIR_ENV], ("chrome", "otlp"))
+
+
+def run_pipeline():
+    # Step 1: Insert batch log (mark as running); a resumed run reopens its batch
+    if os.getenv(RESUME_ENV):
+        plan_resume(current_run_id())
+        update_batch_log("R")
+    else:
+        insert_batch_log()
+    started = time.time()
+    predicted_seconds = predict_run()
 
     try:
+        run_started = redshift_now()
+
         # Step 2: Run all ETL stages one by one
         for stage in ETL_STAGES:
             success = run_stage(stage)
@@ -35,12 +80,19 @@ def main():
                 print(f"ETL stage failed: {stage}")
                 update_batch_log("F")
                 print("ETL pipeline stopped due to failure.")
+                print(f"Resume with: python master.py --resume {current_run_id()}")
                 return
             print(f"ETL stage completed successfully: {stage}")
 
-        # Step 3: If all stages succeed → mark as Passed
+        # Step 3: VACUUM/ANALYZE the tables this run touched, where needed
+        with trace_span("table maintenance", "stage"):
+            run_table_maintenance(run_started)
+
+        # Step 4: If all stages succeed → mark as Passed
         update_batch_log("P")
+        purge_affected_keys()
         print("All ETL stages completed successfully.")
+        print(f"Run took {time.time() - started:.0f}s (predicted {predicted_seconds:.0f}s).")
 
     except Exception as e:
         print(f"Pipeline failed with error: {e}")
@@ -49,5 +101,63 @@ def main():
     finally:
         print("ETL pipeline execution finished.")
 
+def run_catch_up(first_date, last_date):
+    """Extract once for every pending batch, upsert batch by batch, summarize once"""
+    batches = pending_batches(first_date, last_date)
+    # Summaries last ran for the last passed batch; everything after it is recomputed
+    first_summary_batch = min(last_passed_batch() + 1, batches[0][0])
+    devdw_tables = stage_tables()["devstage_to_devdw"]
+    base_run_id = current_run_id()
+    started = time.time()
+    print("=====================================================")
+    print(f"Catching up {len(batches)} batch(es): {first_date} .. {last_date}")
+    print(f"Summaries recomputed once for batches {first_summary_batch} .. {batches[-1][0]}")
+    print("=====================================================")
+
+    os.environ[CATCH_UP_DATES_ENV] = ",".join(batch_date for _, batch_date in batches)
+    try:
+        run_started = redshift_now()
+        for i, (batch_no, batch_date) in enumerate(batches):
+            last_batch = i == len(batches) - 1
+            set_current_batch(batch_no, batch_date)
+            # One run id per batch keeps the task state of each batch apart
+            os.environ["ETL_RUN_ID"] = f"{base_run_id}-{batch_no}"
+            insert_batch_log()
+            if last_batch:
+                os.environ[CATCH_UP_FIRST_BATCH_ENV] = str(first_summary_batch)
+                os.environ["alltable"] = ",".join(f"{t}.py" for t in devdw_tables)
+            else:
+                os.environ["alltable"] = ",".join(f"{t}.py" for t in devdw_tables if t not in SUMMARY_TABLES)
+
+            # The first batch's extract already wrote the files of every batch
+            with trace_span(f"batch {batch_no} ({batch_date})", "batch"):
+                for stage in ETL_STAGES if i == 0 else ETL_STAGES[1:]:
+                    if not run_stage(stage):
+                        print(f"ETL stage failed: {stage} (batch {batch_no}, {batch_date})")
+                        update_batch_log("F")
+                        print("Catch-up stopped due to failure.")
+                        print(f"Continue with: python master.py --catch-up {batch_date} {last_date}")
+                        return
+                    print(f"ETL stage completed successfully: {stage} (batch {batch_no})")
+            # Batches before the last stay 'R' until the summaries covering them have run
+            if not last_batch:
+                print(f"Batch {batch_no} ({batch_date}) applied; summaries pending.")
+
+        with trace_span("table maintenance", "stage"):
+            run_table_maintenance(run_started)
+
+        update_batch_log("P", first_summary_batch)
+        purge_affected_keys()
+        print(f"Caught up {len(batches)} batch(es) in {time.time() - started:.0f}s.")
+
+    except Exception as e:
+        print(f"Catch-up failed with error: {e}")
+        update_batch_log("F")
+
+    finally:
+        os.environ.pop(CATCH_UP_DATES_ENV, None)
+        os.environ.pop(CATCH_UP_FIRST_BATCH_ENV, None)
+        print("ETL pipeline execution finished.")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,213 @@
+import os
+import re
+import sys
+import json
+import shutil
+import difflib
+import hashlib
+import subprocess
+from collections import Counter
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEVDW_DIR = os.path.join(ROOT_DIR, "devstage_to_devdw")
+
+# While ETL_PLAN_CAPTURE_DIR is set, table scripts EXPLAIN their statements
+# instead of loading: writes to permanent tables are explained and skipped,
+# SELECTs and temp table statements are explained and run (later statements
+# read the temp tables, and their row counts drive the planner's choices).
+PLAN_CAPTURE_ENV = "ETL_PLAN_CAPTURE_DIR"
+PLAN_BASELINE = os.getenv("PLAN_BASELINE", os.path.join(ROOT_DIR, "plan_baseline.json"))
+# A statement whose estimated cost grows by more than this factor is a regression
+PLAN_COST_RATIO = float(os.getenv("PLAN_COST_RATIO", "2.0"))
+
+# Join distribution strategies that move a whole table across the cluster
+MOVING_DISTRIBUTIONS = ("DS_BCAST_INNER", "DS_DIST_BOTH")
+
+WRITE_PATTERN = re.compile(
+    r"^\s*(CREATE\s+TEMP\s+TABLE|CREATE\s+TABLE(?:\s+IF\s+NOT\s+EXISTS)?|DROP\s+TABLE(?:\s+IF\s+EXISTS)?"
+    r"|INSERT\s+INTO|DELETE\s+FROM|UPDATE|MERGE\s+INTO|TRUNCATE(?:\s+TABLE)?|COPY|ALTER\s+TABLE"
+    r"|VACUUM|ANALYZE|GRANT)\s*([\w.]*)",
+    re.IGNORECASE,
+)
+EXPLAINABLE_PATTERN = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|CREATE\s+TEMP\s+TABLE\s+.*\bAS\b)",
+                                 re.IGNORECASE | re.DOTALL)
+CATALOG_PATTERN = re.compile(r"\b(information_schema|pg_\w+|svv_\w+|stl_\w+|svl_\w+)\b", re.IGNORECASE)
+COST_PATTERN = re.compile(r"\s*\(cost=([\d.]+)\.\.([\d.]+) rows=(\d+) width=(\d+)\)")
+DISTRIBUTION_PATTERN = re.compile(r"\bDS_[A-Z_]+\b")
+LITERAL_PATTERN = re.compile(r"'[^']*'")
+
+_statement_counts = Counter()
+
+
+def plan_capture_enabled():
+    return bool(os.getenv(PLAN_CAPTURE_ENV))
+
+
+def write_plan(record):
+    path = os.path.join(os.environ[PLAN_CAPTURE_ENV], f"plans-{os.getpid()}.jsonl")
+    with open(path, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+def capture_plan(cur, table, step, sql, params=None):
+    """EXPLAIN one statement of a table script; returns True if it should still run.
+
+    Statements are keyed "<table>/<step>#<n>" (n-th statement with that step
+    name in the script), so a plan keeps its key when unrelated statements are
+    added around it.
+    """
+    write = WRITE_PATTERN.match(sql)
+    # Reads run; so do writes to temp tables (CREATE TEMP TABLE or an unqualified target)
+    run = (write is None or write.group(1).upper().startswith("CREATE TEMP")
+           or bool(write.group(2)) and "." not in write.group(2))
+
+    if EXPLAINABLE_PATTERN.match(sql) and not CATALOG_PATTERN.search(sql):
+        _statement_counts[(table, step)] += 1
+        record = {
+            "key": f"{table}/{step}#{_statement_counts[(table, step)]}",
+            "table": table,
+            "step": step,
+            "sql": " ".join(sql.split()),
+            "plan": [],
+            "error": None,
+        }
+        try:
+            cur.execute(f"EXPLAIN {sql}", params)
+            record["plan"] = [row[0] for row in cur.fetchall()]
+        except Exception as e:
+            # An aborted transaction fails the rest of the script; the diff reports it
+            record["error"] = str(e)[:512]
+        write_plan(record)
+    return run
+
+
+def normalize_plan(lines):
+    """Plan text without costs, row estimates and literals: the shape to compare"""
+    return [LITERAL_PATTERN.sub("'?'", COST_PATTERN.sub("", line)).rstrip() for line in lines]
+
+
+def summarize_plan(record):
+    plan = record["plan"]
+    top = COST_PATTERN.search(plan[0]) if plan else None
+    shape = normalize_plan(plan)
+    return {
+        "table": record["table"],
+        "step": record["step"],
+        "sql": record["sql"],
+        "cost": float(top.group(2)) if top else None,
+        "rows": int(top.group(3)) if top else None,
+        "distributions": dict(Counter(DISTRIBUTION_PATTERN.findall("\n".join(plan)))),
+        "shape_hash": hashlib.md5("\n".join(shape).encode()).hexdigest(),
+        "shape": shape,
+        "error": record["error"],
+    }
+
+
+def collect(capture_dir):
+    """Merge a capture's plan files into {key: summary} and write plans.json"""
+    plans = {}
+    for name in sorted(os.listdir(capture_dir)):
+        if name.startswith("plans-") and name.endswith(".jsonl"):
+            with open(os.path.join(capture_dir, name)) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        plans[record["key"]] = summarize_plan(record)
+    path = os.path.join(capture_dir, "plans.json")
+    with open(path, "w") as f:
+        json.dump(plans, f, indent=2, sort_keys=True)
+    print(f"{len(plans)} plan(s) written to {path}")
+    return path
+
+
+def compare_plan(base, current):
+    """Regressions and changes of one statement's plan against its baseline"""
+    regressions, changes = [], []
+    if current["error"] and not base["error"]:
+        regressions.append(f"EXPLAIN failed: {current['error']}")
+    for dist in MOVING_DISTRIBUTIONS:
+        before, after = base["distributions"].get(dist, 0), current["distributions"].get(dist, 0)
+        if after > before:
+            regressions.append(f"{dist} x{after} (baseline x{before})")
+    if base["cost"] and current["cost"] and current["cost"] > base["cost"] * PLAN_COST_RATIO:
+        regressions.append(f"cost {base['cost']:.2f} -> {current['cost']:.2f} "
+                           f"(x{current['cost'] / base['cost']:.1f})")
+    if current["shape_hash"] != base["shape_hash"]:
+        changes.append("plan shape changed")
+    return regressions, changes
+
+
+def diff(plans_path, baseline_path=PLAN_BASELINE):
+    """Print plan regressions against the baseline; returns the number of regressions"""
+    with open(plans_path) as f:
+        current = json.load(f)
+    if not os.path.exists(baseline_path):
+        print(f"No plan baseline at {baseline_path}; accept this capture with: "
+              f"python plan_utils.py accept {plans_path}")
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    print("======================================")
+    print(f"Plan diff: {plans_path} vs {baseline_path}")
+    print("======================================")
+    regression_count = 0
+    for key in sorted(set(baseline) | set(current)):
+        if key not in current:
+            print(f"MISSING  {key}")
+            continue
+        if key not in baseline:
+            flags = {d: n for d, n in current[key]["distributions"].items() if d in MOVING_DISTRIBUTIONS}
+            print(f"NEW      {key}{f'  {flags}' if flags else ''}")
+            continue
+        regressions, changes = compare_plan(baseline[key], current[key])
+        if regressions:
+            regression_count += 1
+            print(f"REGRESSED {key}: {'; '.join(regressions)}")
+        elif changes:
+            print(f"CHANGED  {key}: {'; '.join(changes)}")
+        if regressions or changes:
+            for line in difflib.unified_diff(baseline[key]["shape"], current[key]["shape"],
+                                             "baseline", "current", lineterm="", n=1):
+                print(f"    {line}")
+    print("======================================")
+    print(f"{regression_count} plan regression(s) across {len(current)} statement(s).")
+    return regression_count
+
+
+def accept(plans_path, baseline_path=PLAN_BASELINE):
+    shutil.copyfile(plans_path, baseline_path)
+    print(f"Plan baseline updated from {plans_path}")
+
+
+def capture(scripts=None):
+    """Run the devdw table scripts in plan-capture mode against the current batch_control batch"""
+    sys.path.append(ROOT_DIR)
+    from dotenv import load_dotenv
+    from step_log_utils import current_run_id
+
+    load_dotenv()
+    scripts = scripts or [s.strip() for s in os.getenv("alltable").split(",")]
+    capture_dir = os.path.join(ROOT_DIR, "plans", current_run_id())
+    os.makedirs(capture_dir, exist_ok=True)
+    env = dict(os.environ, **{PLAN_CAPTURE_ENV: capture_dir, "ETL_TRACE": "0"})
+    env.pop("ETL_PROFILE_DIR", None)
+    for script in scripts:
+        print(f"Explaining {script} ...")
+        subprocess.run(["python", script], cwd=DEVDW_DIR, env=env)
+    return collect(capture_dir)
+
+
+if __name__ == "__main__":
+    # python plan_utils.py capture [script.py ...]   explain, collect and diff against the baseline
+    # python plan_utils.py diff <plans.json> [baseline.json]
+    # python plan_utils.py accept <plans.json>        make a capture the new baseline
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == "capture":
+        sys.exit(1 if diff(capture(args)) else 0)
+    elif command == "diff":
+        sys.exit(1 if diff(*args) else 0)
+    elif command == "accept":
+        accept(args[0])
+    else:
+        sys.exit(f"Unknown command {command}")
@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import runpy
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_RUNNER = os.path.abspath(__file__)
+
+# Set by --profile on master.py or a stage runner; inherited by every table task
+PROFILE_DIR_ENV = "ETL_PROFILE_DIR"
+SAMPLE_INTERVAL_SECONDS = 0.005
+
+_spans = []
+
+
+def profiling_enabled():
+    return bool(os.getenv(PROFILE_DIR_ENV))
+
+
+def enable_profiling(argv):
+    """Turn profiling on for this process and its children if --profile was passed"""
+    if "--profile" not in argv:
+        return profiling_enabled()
+    if not profiling_enabled():
+        sys.path.append(ROOT_DIR)
+        from step_log_utils import current_run_id
+        os.environ[PROFILE_DIR_ENV] = os.path.join(ROOT_DIR, "profiles", current_run_id())
+    print(f"Profiling table tasks into {os.environ[PROFILE_DIR_ENV]}")
+    return True
+
+
+def task_command(stage, script):
+    """Command line of one table task, wrapped in the profiler when profiling is on"""
+    if profiling_enabled():
+        return ["python", PROFILE_RUNNER, stage, script]
+    return ["python", script]
+
+
+@contextmanager
+def span(name):
+    """Named timing span (fetch, encode, upload, ...); free when profiling is off"""
+    if not profiling_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _spans.append((name, start, time.perf_counter() - start))
+
+
+class StackSampler(threading.Thread):
+    """Samples the main thread's stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL_SECONDS):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.counts = Counter()
+        self.main_id = threading.main_thread().ident
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.main_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def write_artifacts(base, profiler, sampler, total_seconds):
+    profiler.dump_stats(f"{base}.prof")
+    with open(f"{base}.collapsed", "w") as f:
+        for stack, count in sampler.counts.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(f"{base}.spans.txt", "w") as f:
+        f.write(f"{'span':<20} {'start_s':>9} {'seconds':>9}\n")
+        t0 = _spans[0][1] if _spans else 0
+        for name, start, seconds in _spans:
+            f.write(f"{name:<20} {start - t0:>9.3f} {seconds:>9.3f}\n")
+        f.write(f"{'total':<20} {'':>9} {total_seconds:>9.3f}\n")
+
+
+def profile_script(stage, script, args=()):
+    """Run a table script as __main__ under cProfile plus the stack sampler.
+
+    Writes <table>.prof (pstats), <table>.collapsed (flame graph input) and
+    <table>.spans.txt into $ETL_PROFILE_DIR/<stage>/.
+    """
+    out_dir = os.path.join(os.environ[PROFILE_DIR_ENV], stage)
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, os.path.splitext(os.path.basename(script))[0])
+
+    sys.argv = [script, *args]
+    profiler = cProfile.Profile()
+    sampler = StackSampler()
+    exit_code = 0
+    start = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        profiler.disable()
+        sampler.stop()
+        write_artifacts(base, profiler, sampler, time.perf_counter() - start)
+        print(f"Profile written to {base}.prof / .collapsed / .spans.txt")
+    return exit_code
+
+
+if __name__ == "__main__":
+    # python profile_utils.py <stage> <script> [args...]
+    # Go through the importable module so spans recorded by the script's own
+    # "from profile_utils import span" land in the list that gets written.
+    sys.path.append(ROOT_DIR)
+    import profile_utils
+    sys.exit(profile_utils.profile_script(sys.argv[1], sys.argv[2], sys.argv[3:]))
@@ -0,0 +1,63 @@
+import os
+import re
+import time
+import random
+
+# Transient error classes, recognised from the error text so no driver has
+# to be imported here. Anything else is permanent and fails immediately.
+TRANSIENT_ERRORS = [
+    ("connection", re.compile(
+        r"server closed the connection|connection (reset|refused|timed out)|could not connect to server"
+        r"|SSL SYSCALL|terminating connection|EOF detected|connection already closed", re.IGNORECASE)),
+    ("throttling", re.compile(
+        r"SlowDown|Throttl|RequestLimitExceeded|TooManyRequests|RequestTimeout|ServiceUnavailable"
+        r"|Service Unavailable|(Status Code|HTTP)\W{0,3}503", re.IGNORECASE)),
+    ("oracle_network", re.compile(r"ORA-(03113|03114|03135|12170|12514|12537|12541|12543|12547)|DPY-40(05|11)")),
+    ("serialization", re.compile(r"Serializable isolation violation|ERROR:\s*1023", re.IGNORECASE)),
+]
+
+# attempts includes the first try; delays are "full jitter":
+# uniform(0, min(cap_seconds, base_seconds * 2 ** (attempt - 1)))
+RETRY_POLICIES = {
+    "connection": {"attempts": 4, "base_seconds": 2, "cap_seconds": 60},
+    "throttling": {"attempts": 6, "base_seconds": 1, "cap_seconds": 30},
+    "oracle_network": {"attempts": 4, "base_seconds": 5, "cap_seconds": 120},
+    "serialization": {"attempts": 3, "base_seconds": 5, "cap_seconds": 60},
+}
+# No retry is started once this much time has gone into one call or task
+RETRY_BUDGET_SECONDS = float(os.getenv("RETRY_BUDGET_SECONDS", "600"))
+
+
+def transient_class(error):
+    """Retry class of an exception or error message, or None if it is not transient"""
+    text = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error or "")
+    for error_class, pattern in TRANSIENT_ERRORS:
+        if pattern.search(text):
+            return error_class
+    return None
+
+
+def retry_delay(error_class, attempt, elapsed_seconds):
+    """Seconds to wait before attempt + 1, or None when the error should not be retried"""
+    policy = RETRY_POLICIES.get(error_class)
+    if policy is None or attempt >= policy["attempts"] or elapsed_seconds >= RETRY_BUDGET_SECONDS:
+        return None
+    return random.uniform(0, min(policy["cap_seconds"], policy["base_seconds"] * 2 ** (attempt - 1)))
+
+
+def retry_call(fn, *args, description=None, **kwargs):
+    """fn(*args, **kwargs), retried on transient errors. Only for idempotent calls."""
+    start = time.time()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            error_class = transient_class(e)
+            delay = retry_delay(error_class, attempt, time.time() - start)
+            if delay is None:
+                raise
+            print(f"Transient {error_class} error in {description or fn.__name__} "
+                  f"(attempt {attempt}): {e}; retrying in {delay:.1f}s")
+            time.sleep(delay)
@@ -1,7 +1,11 @@
-import subprocess
+import sys
 from dotenv import load_dotenv
 import os
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from profile_utils import enable_profiling
+from trace_utils import init_tracing
+from scheduler_utils import run_stage_tasks
 
 load_dotenv()
 
@@ -14,25 +18,15 @@ if not scripts:
 script_list = [s.strip() for s in scripts.split(",") if s.strip()]
 
 def main():
+    enable_profiling(sys.argv)
+    init_tracing()
     print("===============================================")
     print("Starting S3 → Redshift ETL for All Tables")
     print("===============================================")
 
-    success_count = 0
-    failed_scripts = []
-
-    for script in script_list:
-        print(f"\n Running {script} ...")
-        try:
-            result = subprocess.run(["python", script], check=True)
-            print(f" Completed: {script}")
-            success_count += 1
-        except subprocess.CalledProcessError:
-            print(f" Failed: {script}")
-            failed_scripts.append(script)
-        except Exception as e:
-            print(f" Unexpected error running {script}: {e}")
-            failed_scripts.append(script)
+    results = run_stage_tasks("s3_to_devstage", script_list)
+    success_count = sum(results.values())
+    failed_scripts = [script for script, succeeded in results.items() if not succeeded]
 
     print("\n===============================================")
     print(" ETL Summary")
@@ -43,6 +37,8 @@ def main():
     else:
         print(" All ETL scripts ran successfully!")
     print("===============================================")
+    if failed_scripts:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,11 @@
 import os
 import sys
-import psycopg2
 from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_utils import get_batch_date_from_redshift
+from step_log_utils import StepLogger
+from warehouse_utils import connect_warehouse
+from storage_utils import table_key, object_url
 
 load_dotenv()
 
@@ -23,7 +25,7 @@ BATCH_DATE = get_batch_date_from_redshift()
 
 def get_connection():
     try:
-        conn = psycopg2.connect(
+        conn = connect_warehouse(
             dbname=REDSHIFT_DB,
             user=REDSHIFT_USER,
             password=REDSHIFT_PASSWORD,
@@ -38,9 +40,10 @@ def get_connection():
 
 def load_s3_to_redshift():
     conn = get_connection()
-    cur = conn.cursor()
+    step_log = StepLogger("s3_to_devstage", TABLE)
+    cur = step_log.cursor(conn.cursor())
 
-    s3_path = f"s3://{S3_BUCKET_NAME}/{TABLE.upper()}/{BATCH_DATE}/{TABLE}.csv"
+    s3_path = object_url(S3_BUCKET_NAME, table_key(TABLE, BATCH_DATE, f"{TABLE}.manifest"))
     print("======================================")
     print(f"Loading data from S3 to {TABLE}")
     print(f"S3 Path: {s3_path}")
@@ -52,12 +55,13 @@ def load_s3_to_redshift():
         cur.execute(truncate_sql)
         print(f"Old data cleared from {TABLE}")
 
-        # Step 2: COPY new data
+        # Step 2: COPY new data through the manifest, written once the CSV is complete
         copy_sql = f"""
             COPY {REDSHIFT_SCHEMA}.{TABLE}
             FROM '{s3_path}'
             IAM_ROLE '{REDSHIFT_IAM_ROLE}'
             REGION '{AWS_REGION}'
+            MANIFEST
             FORMAT AS CSV
             IGNOREHEADER 1
             DELIMITER ','
@@ -71,11 +75,13 @@ def load_s3_to_redshift():
     except Exception as e:
         conn.rollback()
         print(f"Error during COPY for {TABLE}: {e}")
+        sys.exit(1)
 
     finally:
         cur.close()
         conn.close()
         print("Connection closed.")
+        step_log.flush()
 
 if __name__ == "__main__":
     load_s3_to_redshift()
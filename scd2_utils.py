@@ -0,0 +1,177 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, get_batch_date_from_redshift, METADATA_SCHEMA
+from step_log_utils import StepLogger
+
+DEVDW_SCHEMA = "j25gokulraj_devdw"
+
+# Declarative SCD2 config.
+# Each dimension is read ONCE per run into a snapshot temp table; every
+# attribute group listed under "groups" gets its own history table and its own
+# hash, so tracking another group costs no extra scan of the dimension.
+SCD2_DIMENSIONS = {
+    "customers": {
+        "source_table": "customers",
+        "key": "dw_customer_id",
+        "groups": {
+            "customer_history": ["creditLimit"],
+        },
+    },
+    "products": {
+        "source_table": "products",
+        "key": "dw_product_id",
+        "groups": {
+            "product_history": ["MSRP"],
+        },
+    },
+}
+
+
+def hash_expr(alias, columns):
+    """MD5 of the tracked columns, NULL-safe and order-stable"""
+    parts = [f"COALESCE(CAST({alias}.{col} AS VARCHAR), '')" for col in columns]
+    return "MD5(" + " || '|' || ".join(parts) + ")"
+
+
+def snapshot_table(name):
+    return f"scd2_snapshot_{name}"
+
+
+def build_snapshot_sql(name, config, full_refresh=False):
+    """One scan of the dimension: key, all tracked columns and one hash per group"""
+    columns = []
+    for group_columns in config["groups"].values():
+        for col in group_columns:
+            if col not in columns:
+                columns.append(col)
+
+    select_cols = ",\n            ".join(f"s.{col}" for col in columns)
+    hash_cols = ",\n            ".join(
+        f"{hash_expr('s', group_columns)} AS hash_{history_table}"
+        for history_table, group_columns in config["groups"].items()
+    )
+    # Only rows the dimension loader touched in this batch can have changed
+    where = "" if full_refresh else "WHERE s.etl_batch_no = b.etl_batch_no"
+
+    return f"""
+        CREATE TEMP TABLE {snapshot_table(name)}
+        DISTKEY ({config['key']})
+        AS
+        SELECT
+            s.{config['key']},
+            {select_cols},
+            {hash_cols}
+        FROM {DEVDW_SCHEMA}.{config['source_table']} s
+        CROSS JOIN {METADATA_SCHEMA}.batch_control b
+        {where};
+        """
+
+
+def build_close_sql(name, config, history_table, columns):
+    """Close active versions whose hash differs from the snapshot"""
+    key = config["key"]
+    return f"""
+        UPDATE {DEVDW_SCHEMA}.{history_table} h
+        SET
+            effective_to_date = DATEADD(day, -1, b.etl_batch_date),
+            dw_active_record_ind = 0,
+            dw_update_timestamp = GETDATE(),
+            update_etl_batch_no = b.etl_batch_no,
+            update_etl_batch_date = b.etl_batch_date
+        FROM {snapshot_table(name)} s
+        CROSS JOIN {METADATA_SCHEMA}.batch_control b
+        WHERE h.{key} = s.{key}
+          AND h.dw_active_record_ind = 1
+          AND {hash_expr('h', columns)} <> s.hash_{history_table};
+        """
+
+
+def build_insert_sql(name, config, history_table, columns):
+    """Insert a new active version for new keys and keys closed by build_close_sql"""
+    key = config["key"]
+    insert_cols = ",\n            ".join(columns)
+    select_cols = ",\n            ".join(f"s.{col}" for col in columns)
+    return f"""
+        INSERT INTO {DEVDW_SCHEMA}.{history_table} (
+            {key},
+            {insert_cols},
+            effective_from_date,
+            effective_to_date,
+            dw_active_record_ind,
+            dw_create_timestamp,
+            dw_update_timestamp,
+            create_etl_batch_no,
+            create_etl_batch_date,
+            update_etl_batch_no,
+            update_etl_batch_date
+        )
+        SELECT
+            s.{key},
+            {select_cols},
+            b.etl_batch_date AS effective_from_date,
+            NULL AS effective_to_date,
+            1 AS dw_active_record_ind,
+            GETDATE() AS dw_create_timestamp,
+            GETDATE() AS dw_update_timestamp,
+            b.etl_batch_no AS create_etl_batch_no,
+            b.etl_batch_date AS create_etl_batch_date,
+            NULL AS update_etl_batch_no,
+            NULL AS update_etl_batch_date
+        FROM {snapshot_table(name)} s
+        CROSS JOIN {METADATA_SCHEMA}.batch_control b
+        LEFT JOIN {DEVDW_SCHEMA}.{history_table} h
+          ON s.{key} = h.{key}
+         AND h.dw_active_record_ind = 1
+        WHERE h.{key} IS NULL;
+        """
+
+
+def apply_scd2(cur, names=None, full_refresh=False):
+    """Run snapshot, close-out and insert for the given dimensions on an open cursor"""
+    names = names or list(SCD2_DIMENSIONS)
+    for name in names:
+        config = SCD2_DIMENSIONS[name]
+        cur.execute(build_snapshot_sql(name, config, full_refresh))
+        print(f"Snapshot taken for {name} ({len(config['groups'])} attribute group(s)).")
+
+        for history_table, columns in config["groups"].items():
+            cur.execute(build_close_sql(name, config, history_table, columns))
+            print(f"Closed changed {history_table} records ({', '.join(columns)}).")
+            cur.execute(build_insert_sql(name, config, history_table, columns))
+            print(f"Inserted new active {history_table} records.")
+
+        cur.execute(f"DROP TABLE {snapshot_table(name)};")
+
+
+def maintain_history(names=None, full_refresh=False, task=None):
+    """Maintain SCD2 history for many dimensions in one connection and one transaction.
+
+    task is the table task name the step log is kept under (customer_history, ...).
+    """
+    conn = get_redshift_connection()
+    step_log = StepLogger("devstage_to_devdw", task or ",".join(names or SCD2_DIMENSIONS) + " history")
+    cur = step_log.cursor(conn.cursor())
+
+    BATCH_DATE = get_batch_date_from_redshift()
+    print("======================================")
+    print(f"Maintaining SCD2 History: {', '.join(names or SCD2_DIMENSIONS)}")
+    print(f"Batch Date: {BATCH_DATE}")
+    print("======================================")
+
+    try:
+        apply_scd2(cur, names, full_refresh)
+        conn.commit()
+        print("SCD2 history maintained successfully.")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error maintaining SCD2 history: {e}")
+        raise
+
+    finally:
+        cur.close()
+        conn.close()
+        print("Connection closed.")
+        step_log.flush()
@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import heapq
+import statistics
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, METADATA_SCHEMA
+from step_log_utils import current_run_id, STEP_LOG
+from task_state_utils import run_table_task, stage_tables, upstream_tasks
+from warehouse_utils import warehouse_engine
+
+# Table tasks of one stage run concurrently on up to ETL_MAX_PARALLEL workers.
+# Ready tasks start longest first, where "longest" is the task's historical
+# duration plus the longest chain of tasks waiting on it (its critical path).
+MAX_PARALLEL_ENV = "ETL_MAX_PARALLEL"
+HISTORY_RUNS = int(os.getenv("SCHEDULE_HISTORY_RUNS", "5"))
+HISTORY_DAYS = int(os.getenv("SCHEDULE_HISTORY_DAYS", "30"))
+DEFAULT_TASK_SECONDS = 60.0
+
+
+def max_parallel():
+    workers = int(os.getenv(MAX_PARALLEL_ENV, "1"))
+    if workers > 1 and warehouse_engine() == "duckdb":
+        # One DuckDB file takes a single writing process at a time
+        print(f"{MAX_PARALLEL_ENV}={workers} ignored on the DuckDB engine; running tasks one by one.")
+        return 1
+    return max(workers, 1)
+
+
+def task_history(stage, tables):
+    """Median wall seconds of each table's last HISTORY_RUNS successful tasks"""
+    samples = {}
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT table_name, wall_seconds
+            FROM {METADATA_SCHEMA}.{STEP_LOG}
+            WHERE stage = %s
+              AND step_name = 'task'
+              AND status = 'S'
+              AND start_time >= %s
+            ORDER BY start_time DESC;
+        """, (stage, datetime.now() - timedelta(days=HISTORY_DAYS)))
+        for table, seconds in cur.fetchall():
+            if table in tables and len(samples.setdefault(table, [])) < HISTORY_RUNS:
+                samples[table].append(float(seconds))
+    except Exception as e:
+        print(f"No task history for {stage}: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+    known = [statistics.median(s) for s in samples.values() if s]
+    default = statistics.median(known) if known else DEFAULT_TASK_SECONDS
+    return {t: statistics.median(samples[t]) if samples.get(t) else default for t in tables}
+
+
+def stage_dependencies(stage, tables):
+    """{table: [tables of the same stage it waits for]}"""
+    return {t: [u for s, u in upstream_tasks(stage, t, {stage: tables}) if s == stage] for t in tables}
+
+
+def task_ranks(tables, deps, durations):
+    """Duration of each task plus the longest chain of tasks that depend on it"""
+    dependents = {t: [d for d in tables if t in deps[d]] for t in tables}
+    ranks = {}
+
+    def rank(t):
+        if t not in ranks:
+            ranks[t] = durations[t] + max((rank(d) for d in dependents[t]), default=0.0)
+        return ranks[t]
+    for t in tables:
+        rank(t)
+    return ranks
+
+
+def ready_tasks(pending, finished, deps, ranks):
+    # A failed upstream task still releases its dependents, as the sequential runners did
+    return sorted((t for t in pending if all(d in finished for d in deps[t])), key=lambda t: -ranks[t])
+
+
+def simulate(tables, deps, durations, ranks, workers):
+    """Predicted {table: (start, end)} seconds from stage start under the same scheduling"""
+    clock, pending, finished, running, schedule = 0.0, set(tables), set(), [], {}
+    while pending or running:
+        for t in ready_tasks(pending, finished, deps, ranks)[:workers - len(running)]:
+            pending.remove(t)
+            schedule[t] = (clock, clock + durations[t])
+            heapq.heappush(running, (clock + durations[t], t))
+        clock, t = heapq.heappop(running)
+        finished.add(t)
+    return schedule
+
+
+def critical_path(schedule, deps):
+    """Chain ending at the last task to finish, following each task's latest-finishing upstream"""
+    if not schedule:
+        return []
+    path = [max(schedule, key=lambda t: schedule[t][1])]
+    while True:
+        upstream = [d for d in deps[path[-1]] if d in schedule]
+        if not upstream:
+            return list(reversed(path))
+        path.append(max(upstream, key=lambda d: schedule[d][1]))
+
+
+def run_stage_tasks(stage, scripts):
+    """Run a stage's table scripts under the scheduler; returns {script: succeeded}"""
+    current_run_id()    # fixed before any worker thread starts a task
+    workers = max_parallel()
+    scripts = {s.strip()[:-3]: s.strip() for s in scripts if s.strip()}
+    tables = list(scripts)
+    deps = stage_dependencies(stage, tables)
+    durations = task_history(stage, tables)
+    ranks = task_ranks(tables, deps, durations)
+    predicted = simulate(tables, deps, durations, ranks, workers)
+    makespan = max((end for _, end in predicted.values()), default=0.0)
+    print(f"Scheduling {len(tables)} {stage} task(s) on {workers} worker(s); "
+          f"predicted finish {datetime.now() + timedelta(seconds=makespan):%H:%M:%S} ({makespan:.0f}s)")
+
+    start = time.time()
+    pending, finished, running, actual, results = set(tables), set(), {}, {}, {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for t in ready_tasks(pending, finished, deps, ranks)[:workers - len(running)]:
+                pending.remove(t)
+                actual[t] = (time.time() - start, None)
+                running[pool.submit(run_table_task, stage, scripts[t])] = t
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                t = running.pop(future)
+                try:
+                    results[scripts[t]] = future.result()
+                except Exception as e:
+                    print(f"Unexpected error running {scripts[t]}: {e}")
+                    results[scripts[t]] = False
+                actual[t] = (actual[t][0], time.time() - start)
+                finished.add(t)
+
+    print_schedule_report(stage, workers, predicted, actual, deps)
+    return results
+
+
+def print_schedule_report(stage, workers, predicted, actual, deps):
+    print("======================================")
+    print(f"Schedule report: {stage} ({workers} worker(s))")
+    print("======================================")
+    print(f"{'task':<28} {'pred_start':>10} {'pred_s':>8} {'act_start':>10} {'act_s':>8}")
+    for t in sorted(actual, key=lambda t: actual[t][0]):
+        ps, pe = predicted[t]
+        a_start, a_end = actual[t]
+        print(f"{t:<28} {ps:>10.1f} {pe - ps:>8.1f} {a_start:>10.1f} {a_end - a_start:>8.1f}")
+    for label, schedule in (("Predicted", predicted), ("Actual", actual)):
+        path = critical_path(schedule, deps)
+        length = schedule[path[-1]][1] if path else 0.0
+        print(f"{label} critical path ({length:.1f}s): {' -> '.join(path)}")
+
+
+def predict_run():
+    """Predicted completion time of all three stages from task history"""
+    workers = max_parallel()
+    total, parts = 0.0, []
+    for stage, tables in stage_tables().items():
+        deps = stage_dependencies(stage, tables)
+        durations = task_history(stage, tables)
+        schedule = simulate(tables, deps, durations, task_ranks(tables, deps, durations), workers)
+        makespan = max((end for _, end in schedule.values()), default=0.0)
+        total += makespan
+        parts.append(f"{stage} {makespan:.0f}s")
+    print(f"Predicted completion {datetime.now() + timedelta(seconds=total):%H:%M:%S} "
+          f"({', '.join(parts)})")
+    return total
@@ -0,0 +1,491 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, METADATA_SCHEMA
+
+DEVSTAGE_SCHEMA = "j25gokulraj_devstage"
+DEVDW_SCHEMA = "j25gokulraj_devdw"
+
+# Column encodings: the leading sort key column stays RAW so zone maps stay
+# tight, sketches stay RAW, everything else gets AZ64 (numbers/dates) or ZSTD.
+AZ64_TYPES = ("INT", "SMALLINT", "BIGINT", "DECIMAL", "DATE", "TIMESTAMP")
+
+STAGE_AUDIT_COLUMNS = [
+    ("create_timestamp", "TIMESTAMP"),
+    ("update_timestamp", "TIMESTAMP"),
+]
+
+DW_AUDIT_COLUMNS = [
+    ("src_create_timestamp", "TIMESTAMP"),
+    ("src_update_timestamp", "TIMESTAMP"),
+    ("dw_create_timestamp", "TIMESTAMP"),
+    ("dw_update_timestamp", "TIMESTAMP"),
+    ("etl_batch_no", "INT"),
+    ("etl_batch_date", "DATE"),
+]
+
+SUMMARY_AUDIT_COLUMNS = [
+    ("dw_create_timestamp", "TIMESTAMP"),
+    ("dw_update_timestamp", "TIMESTAMP"),
+    ("etl_batch_no", "INT"),
+    ("etl_batch_date", "DATE"),
+]
+
+HISTORY_AUDIT_COLUMNS = [
+    ("effective_from_date", "DATE"),
+    ("effective_to_date", "DATE"),
+    ("dw_active_record_ind", "SMALLINT"),
+    ("dw_create_timestamp", "TIMESTAMP"),
+    ("dw_update_timestamp", "TIMESTAMP"),
+    ("create_etl_batch_no", "INT"),
+    ("create_etl_batch_date", "DATE"),
+    ("update_etl_batch_no", "INT"),
+    ("update_etl_batch_date", "DATE"),
+]
+
+CUSTOMER_COLUMNS = [
+    ("customerName", "VARCHAR(50)"),
+    ("contactLastName", "VARCHAR(50)"),
+    ("contactFirstName", "VARCHAR(50)"),
+    ("phone", "VARCHAR(50)"),
+    ("addressLine1", "VARCHAR(50)"),
+    ("addressLine2", "VARCHAR(50)"),
+    ("city", "VARCHAR(50)"),
+    ("state", "VARCHAR(50)"),
+    ("postalCode", "VARCHAR(15)"),
+    ("country", "VARCHAR(50)"),
+    ("salesRepEmployeeNumber", "INT"),
+    ("creditLimit", "DECIMAL(10,2)"),
+]
+
+EMPLOYEE_COLUMNS = [
+    ("employeeNumber", "INT"),
+    ("lastName", "VARCHAR(50)"),
+    ("firstName", "VARCHAR(50)"),
+    ("extension", "VARCHAR(10)"),
+    ("email", "VARCHAR(100)"),
+    ("officeCode", "VARCHAR(10)"),
+    ("reportsTo", "INT"),
+    ("jobTitle", "VARCHAR(50)"),
+]
+
+OFFICE_COLUMNS = [
+    ("officeCode", "VARCHAR(10)"),
+    ("city", "VARCHAR(50)"),
+    ("phone", "VARCHAR(50)"),
+    ("addressLine1", "VARCHAR(50)"),
+    ("addressLine2", "VARCHAR(50)"),
+    ("state", "VARCHAR(50)"),
+    ("country", "VARCHAR(50)"),
+    ("postalCode", "VARCHAR(15)"),
+    ("territory", "VARCHAR(10)"),
+]
+
+PRODUCTLINE_COLUMNS = [
+    ("productLine", "VARCHAR(50)"),
+    ("textDescription", "VARCHAR(4000)"),
+    ("htmlDescription", "VARCHAR(65535)"),
+    ("image", "VARCHAR(65535)"),
+]
+
+PRODUCT_COLUMNS = [
+    ("productName", "VARCHAR(70)"),
+    ("productLine", "VARCHAR(50)"),
+    ("productScale", "VARCHAR(10)"),
+    ("productVendor", "VARCHAR(50)"),
+    ("productDescription", "VARCHAR(65535)"),
+    ("quantityInStock", "INT"),
+    ("buyPrice", "DECIMAL(10,2)"),
+    ("MSRP", "DECIMAL(10,2)"),
+]
+
+ORDER_COLUMNS = [
+    ("orderDate", "DATE"),
+    ("requiredDate", "DATE"),
+    ("shippedDate", "DATE"),
+    ("status", "VARCHAR(15)"),
+    ("comments", "VARCHAR(4000)"),
+    ("cancelledDate", "DATE"),
+]
+
+ORDERDETAIL_COLUMNS = [
+    ("quantityOrdered", "INT"),
+    ("priceEach", "DECIMAL(10,2)"),
+    ("orderLineNumber", "SMALLINT"),
+]
+
+PAYMENT_COLUMNS = [
+    ("checkNumber", "VARCHAR(50)"),
+    ("paymentDate", "DATE"),
+    ("amount", "DECIMAL(10,2)"),
+]
+
+DAILY_CUSTOMER_METRICS = [
+    "order_count", "order_apd", "order_cost_amount",
+    "cancelled_order_count", "cancelled_order_amount", "cancelled_order_apd",
+    "shipped_order_count", "shipped_order_amount", "shipped_order_apd",
+    "payment_apd", "payment_amount", "products_ordered_qty", "products_items_qty",
+    "order_mrp_amount", "new_customer_apd", "new_customer_paid_apd",
+]
+
+MONTHLY_CUSTOMER_METRICS = [
+    "order_count", "order_apd", "order_apm", "order_cost_amount",
+    "cancelled_order_count", "cancelled_order_amount", "cancelled_order_apd", "cancelled_order_apm",
+    "shipped_order_count", "shipped_order_amount", "shipped_order_apd", "shipped_order_apm",
+    "payment_apd", "payment_apm", "payment_amount", "products_ordered_qty", "products_items_qty",
+    "order_mrp_amount", "new_customer_apd", "new_customer_apm",
+    "new_customer_paid_apd", "new_customer_paid_apm",
+]
+
+# Mergeable HLL sketches of active days, kept beside the exact *_apd flags.
+# monthly_customer_summary combines the daily ones into distinct-day counts
+# per month, and HLL_COMBINE over monthly rows rolls up to quarters/years.
+CUSTOMER_DAY_SKETCHES = [
+    "order_day_sketch", "cancelled_order_day_sketch", "shipped_order_day_sketch",
+    "payment_day_sketch", "new_customer_day_sketch", "new_customer_paid_day_sketch",
+]
+
+# Distinct-customer sketch of the product summaries; monthly_product_summary
+# merges the daily ones into its customer_apd.
+PRODUCT_SKETCHES = ["customer_sketch"]
+
+DAILY_PRODUCT_METRICS = [
+    "customer_apd", "product_cost_amount", "product_mrp_amount",
+    "cancelled_product_qty", "cancelled_cost_amount", "cancelled_mrp_amount",
+    "cancelled_order_apd",
+]
+
+MONTHLY_PRODUCT_METRICS = [
+    "customer_apd", "customer_apm", "product_cost_amount", "product_mrp_amount",
+    "cancelled_product_qty", "cancelled_cost_amount", "cancelled_mrp_amount",
+    "cancelled_order_apd", "cancelled_order_apm",
+]
+
+
+def metric_type(name):
+    return "DECIMAL(18,2)" if name.endswith("_amount") else "BIGINT"
+
+
+def summary_columns(key_columns, metrics, sketches):
+    return (key_columns
+            + [(m, metric_type(m)) for m in metrics]
+            + [(s, "HLLSKETCH") for s in sketches]
+            + SUMMARY_AUDIT_COLUMNS)
+
+
+# Declarative physical design for every managed table.
+# diststyle: "KEY" (needs distkey), "ALL" or "EVEN"; sortkey is compound.
+TABLES = {
+    DEVSTAGE_SCHEMA: {
+        "customers": {
+            "columns": [("customerNumber", "INT")] + CUSTOMER_COLUMNS + STAGE_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["customerNumber"],
+        },
+        "employees": {
+            "columns": EMPLOYEE_COLUMNS + STAGE_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["employeeNumber"],
+        },
+        "offices": {
+            "columns": OFFICE_COLUMNS + STAGE_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["officeCode"],
+        },
+        "productlines": {
+            "columns": PRODUCTLINE_COLUMNS + STAGE_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["productLine"],
+        },
+        "products": {
+            "columns": [("productCode", "VARCHAR(15)")] + PRODUCT_COLUMNS + STAGE_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["productCode"],
+        },
+        "orders": {
+            "columns": [("orderNumber", "INT")] + ORDER_COLUMNS
+                       + [("customerNumber", "INT")] + STAGE_AUDIT_COLUMNS,
+            "diststyle": "EVEN", "sortkey": ["orderNumber"],
+        },
+        "orderdetails": {
+            "columns": [("orderNumber", "INT"), ("productCode", "VARCHAR(15)")]
+                       + ORDERDETAIL_COLUMNS + STAGE_AUDIT_COLUMNS,
+            "diststyle": "EVEN", "sortkey": ["orderNumber", "productCode"],
+        },
+        "payments": {
+            "columns": [("customerNumber", "INT")] + PAYMENT_COLUMNS + STAGE_AUDIT_COLUMNS,
+            "diststyle": "EVEN", "sortkey": ["customerNumber", "checkNumber"],
+        },
+    },
+    DEVDW_SCHEMA: {
+        "customers": {
+            "columns": [("dw_customer_id", "INT IDENTITY(1,1)"), ("src_customerNumber", "INT")]
+                       + CUSTOMER_COLUMNS + DW_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["src_customerNumber"],
+        },
+        "employees": {
+            "columns": [("dw_employee_id", "INT IDENTITY(1,1)")] + EMPLOYEE_COLUMNS
+                       + [("dw_office_id", "INT"), ("dw_reporting_employee_id", "INT")] + DW_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["employeeNumber"],
+        },
+        "offices": {
+            "columns": [("dw_office_id", "INT IDENTITY(1,1)")] + OFFICE_COLUMNS + DW_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["officeCode"],
+        },
+        "productlines": {
+            "columns": [("dw_product_line_id", "INT IDENTITY(1,1)")] + PRODUCTLINE_COLUMNS + DW_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["productLine"],
+        },
+        "products": {
+            "columns": [("dw_product_id", "INT IDENTITY(1,1)"), ("src_productCode", "VARCHAR(15)")]
+                       + PRODUCT_COLUMNS + DW_AUDIT_COLUMNS,
+            "diststyle": "ALL", "sortkey": ["src_productCode"],
+        },
+        "orders": {
+            "columns": [("dw_order_id", "INT IDENTITY(1,1)"), ("dw_customer_id", "INT"), ("src_orderNumber", "INT")]
+                       + ORDER_COLUMNS + [("src_customerNumber", "INT")] + DW_AUDIT_COLUMNS,
+            "diststyle": "KEY", "distkey": "dw_order_id", "sortkey": ["orderDate"],
+        },
+        "orderdetails": {
+            "columns": [("dw_orderdetail_id", "INT IDENTITY(1,1)"), ("dw_order_id", "INT"), ("dw_product_id", "INT"),
+                        ("src_orderNumber", "INT"), ("src_productCode", "VARCHAR(15)")]
+                       + ORDERDETAIL_COLUMNS + DW_AUDIT_COLUMNS,
+            "diststyle": "KEY", "distkey": "dw_order_id", "sortkey": ["dw_order_id"],
+        },
+        "payments": {
+            "columns": [("dw_payment_id", "INT IDENTITY(1,1)"), ("dw_customer_id", "INT"), ("src_customerNumber", "INT")]
+                       + PAYMENT_COLUMNS + DW_AUDIT_COLUMNS,
+            "diststyle": "KEY", "distkey": "dw_customer_id", "sortkey": ["paymentDate"],
+        },
+        "customer_history": {
+            "columns": [("dw_customer_id", "INT"), ("creditLimit", "DECIMAL(10,2)")] + HISTORY_AUDIT_COLUMNS,
+            "diststyle": "KEY", "distkey": "dw_customer_id",
+            "sortkey": ["dw_customer_id", "dw_active_record_ind"],
+        },
+        "product_history": {
+            "columns": [("dw_product_id", "INT"), ("MSRP", "DECIMAL(10,2)")] + HISTORY_AUDIT_COLUMNS,
+            "diststyle": "KEY", "distkey": "dw_product_id",
+            "sortkey": ["dw_product_id", "dw_active_record_ind"],
+        },
+        "employee_hierarchy": {
+            "columns": [("ancestor_employee_id", "INT NOT NULL"), ("descendant_employee_id", "INT NOT NULL"),
+                        ("depth", "INT NOT NULL"), ("dw_create_timestamp", "TIMESTAMP"),
+                        ("etl_batch_no", "INT"), ("etl_batch_date", "DATE")],
+            "diststyle": "KEY", "distkey": "descendant_employee_id",
+            "sortkey": ["descendant_employee_id", "depth"],
+        },
+        "order_line_fact": {
+            "columns": [("dw_order_id", "INT"), ("dw_customer_id", "INT"), ("dw_product_id", "INT"),
+                        ("src_orderNumber", "INT"), ("src_productCode", "VARCHAR(15)"),
+                        ("order_date", "DATE"), ("cancelled_date", "DATE"), ("shipped_date", "DATE"),
+                        ("status", "VARCHAR(15)"), ("is_cancelled", "BOOLEAN"), ("is_shipped", "BOOLEAN"),
+                        ("quantity_ordered", "INT"), ("price_each", "DECIMAL(10,2)"), ("msrp", "DECIMAL(10,2)"),
+                        ("cost_amount", "DECIMAL(18,2)"), ("mrp_amount", "DECIMAL(18,2)"),
+                        ("dw_create_timestamp", "TIMESTAMP"), ("etl_batch_no", "INT"), ("etl_batch_date", "DATE")],
+            "diststyle": "KEY", "distkey": "dw_order_id", "sortkey": ["order_date"],
+        },
+        "daily_customer_summary": {
+            "columns": summary_columns([("summary_date", "DATE"), ("dw_customer_id", "INT")],
+                                       DAILY_CUSTOMER_METRICS, CUSTOMER_DAY_SKETCHES),
+            "diststyle": "KEY", "distkey": "dw_customer_id", "sortkey": ["summary_date", "dw_customer_id"],
+        },
+        "daily_product_summary": {
+            "columns": summary_columns([("summary_date", "DATE"), ("dw_product_id", "INT")],
+                                       DAILY_PRODUCT_METRICS, PRODUCT_SKETCHES),
+            "diststyle": "KEY", "distkey": "dw_product_id", "sortkey": ["summary_date", "dw_product_id"],
+        },
+        "monthly_customer_summary": {
+            "columns": summary_columns([("start_of_the_month_date", "DATE"), ("dw_customer_id", "INT")],
+                                       MONTHLY_CUSTOMER_METRICS, CUSTOMER_DAY_SKETCHES),
+            "diststyle": "KEY", "distkey": "dw_customer_id",
+            "sortkey": ["start_of_the_month_date", "dw_customer_id"],
+        },
+        "monthly_product_summary": {
+            "columns": summary_columns([("start_of_the_month_date", "DATE"), ("dw_product_id", "INT")],
+                                       MONTHLY_PRODUCT_METRICS, PRODUCT_SKETCHES),
+            "diststyle": "KEY", "distkey": "dw_product_id",
+            "sortkey": ["start_of_the_month_date", "dw_product_id"],
+        },
+    },
+    METADATA_SCHEMA: {
+        "summary_load_log": {
+            "columns": [("table_name", "VARCHAR(128)"), ("range_start", "DATE"), ("range_end", "DATE"),
+                        ("rows_deleted", "BIGINT"), ("rows_inserted", "BIGINT"),
+                        ("etl_batch_no", "INT"), ("etl_batch_date", "DATE"), ("load_timestamp", "TIMESTAMP")],
+            "diststyle": "EVEN", "sortkey": ["load_timestamp"],
+        },
+        "summary_affected_keys": {
+            "columns": [("etl_batch_no", "INT"), ("event_type", "VARCHAR(16)"), ("summary_date", "DATE"),
+                        ("dw_customer_id", "INT"), ("dw_product_id", "INT"), ("record_timestamp", "TIMESTAMP")],
+            "diststyle": "EVEN", "sortkey": ["etl_batch_no", "summary_date"],
+        },
+        "step_log": {
+            "columns": [("run_id", "VARCHAR(64)"), ("etl_batch_no", "INT"), ("stage", "VARCHAR(32)"),
+                        ("table_name", "VARCHAR(128)"), ("step_name", "VARCHAR(128)"),
+                        ("engine", "VARCHAR(16)"), ("query_id", "VARCHAR(64)"), ("rowcount", "BIGINT"),
+                        ("bytes", "BIGINT"), ("wall_seconds", "DOUBLE PRECISION"), ("status", "CHAR(1)"),
+                        ("cpu_seconds", "DOUBLE PRECISION"), ("peak_rss_mb", "DOUBLE PRECISION"),
+                        ("rows_per_second", "DOUBLE PRECISION"), ("bytes_fetched", "BIGINT"),
+                        ("bytes_written", "BIGINT"), ("top_allocations", "VARCHAR(2048)"),
+                        ("error", "VARCHAR(512)"), ("start_time", "TIMESTAMP"), ("end_time", "TIMESTAMP")],
+            "diststyle": "EVEN", "sortkey": ["run_id", "start_time"],
+        },
+        "task_state": {
+            "columns": [("run_id", "VARCHAR(64)"), ("etl_batch_no", "INT"), ("stage", "VARCHAR(32)"),
+                        ("table_name", "VARCHAR(128)"), ("status", "VARCHAR(8)"),
+                        ("output_location", "VARCHAR(512)"), ("attempts", "INT"),
+                        ("error", "VARCHAR(512)"), ("updated_at", "TIMESTAMP")],
+            "diststyle": "ALL", "sortkey": ["run_id"],
+        },
+        "summary_backfill_state": {
+            "columns": [("backfill_id", "VARCHAR(64)"), ("table_name", "VARCHAR(128)"),
+                        ("range_start", "DATE"), ("range_end", "DATE"), ("status", "VARCHAR(8)"),
+                        ("rows_deleted", "BIGINT"), ("rows_inserted", "BIGINT"),
+                        ("wall_seconds", "DOUBLE PRECISION"), ("attempts", "INT"),
+                        ("error", "VARCHAR(512)"), ("updated_at", "TIMESTAMP")],
+            "diststyle": "ALL", "sortkey": ["backfill_id", "table_name", "range_start"],
+        },
+    },
+}
+
+
+def column_encoding(spec, name, col_type):
+    """Declared encoding of one column: explicit override, else the type rule"""
+    overrides = spec.get("encodings", {})
+    if name in overrides:
+        return overrides[name]
+    base = col_type.split("(")[0].split()[0].upper()
+    if base == "HLLSKETCH" or (spec.get("sortkey") and spec["sortkey"][0] == name):
+        return "RAW"
+    if base in AZ64_TYPES:
+        return "AZ64"
+    return "ZSTD"
+
+
+def render_create_table(schema, table, spec):
+    """CREATE TABLE IF NOT EXISTS statement for a declared table"""
+    cols = ",\n            ".join(
+        f"{name} {col_type} ENCODE {column_encoding(spec, name, col_type)}"
+        for name, col_type in spec["columns"]
+    )
+    dist = f"DISTSTYLE {spec['diststyle']}"
+    if spec["diststyle"] == "KEY":
+        dist += f"\n        DISTKEY ({spec['distkey']})"
+    sort = f"\n        COMPOUND SORTKEY ({', '.join(spec['sortkey'])})" if spec.get("sortkey") else ""
+    return f"""
+        CREATE TABLE IF NOT EXISTS {schema}.{table} (
+            {cols}
+        )
+        {dist}{sort};
+        """
+
+
+def ensure_table(cur, schema, table):
+    """Create a declared table if it does not exist yet"""
+    cur.execute(render_create_table(schema, table, TABLES[schema][table]))
+
+
+def fetch_live_table(cur, schema, table):
+    """Current columns, encodings, dist and sort keys of a table, or None if absent"""
+    # pg_table_def only lists tables on the search_path
+    cur.execute(f"SET search_path TO {schema};")
+    cur.execute("""
+        SELECT "column", type, encoding, distkey, sortkey
+        FROM pg_table_def
+        WHERE schemaname = %s
+          AND tablename = %s;
+    """, (schema.lower(), table.lower()))
+    rows = cur.fetchall()
+    if not rows:
+        return None
+
+    cur.execute("""
+        SELECT diststyle
+        FROM svv_table_info
+        WHERE "schema" = %s
+          AND "table" = %s;
+    """, (schema.lower(), table.lower()))
+    info = cur.fetchone()
+    diststyle = (info[0] if info else "").upper()
+
+    return {
+        "columns": {r[0].lower(): ("RAW" if r[2].lower() == "none" else r[2].upper()) for r in rows},
+        "distkey": next((r[0].lower() for r in rows if r[3]), None),
+        "sortkey": [r[0].lower() for r in sorted((r for r in rows if r[4] > 0), key=lambda r: r[4])],
+        "diststyle": diststyle,
+    }
+
+
+def diff_table(schema, table, spec, live):
+    """List of (description, fix_sql) needed to bring a live table to its declaration"""
+    target = f"{schema}.{table}"
+    if live is None:
+        return [(f"{target}: missing", render_create_table(schema, table, spec))]
+
+    changes = []
+    for name, col_type in spec["columns"]:
+        encoding = column_encoding(spec, name, col_type)
+        live_encoding = live["columns"].get(name.lower())
+        if live_encoding is None:
+            add_type = col_type.replace(" IDENTITY(1,1)", "")
+            changes.append((f"{target}.{name}: missing column",
+                            f"ALTER TABLE {target} ADD COLUMN {name} {add_type} ENCODE {encoding};"))
+        elif live_encoding != encoding and "IDENTITY" not in col_type:
+            changes.append((f"{target}.{name}: encoding {live_encoding} -> {encoding}",
+                            f"ALTER TABLE {target} ALTER COLUMN {name} ENCODE {encoding};"))
+
+    if spec["diststyle"] == "KEY":
+        if live["distkey"] != spec["distkey"].lower():
+            changes.append((f"{target}: distkey {live['distkey']} -> {spec['distkey']}",
+                            f"ALTER TABLE {target} ALTER DISTKEY {spec['distkey']};"))
+    elif not live["diststyle"].startswith(spec["diststyle"]):
+        changes.append((f"{target}: diststyle {live['diststyle']} -> {spec['diststyle']}",
+                        f"ALTER TABLE {target} ALTER DISTSTYLE {spec['diststyle']};"))
+
+    wanted_sort = [c.lower() for c in spec.get("sortkey", [])]
+    if live["sortkey"] != wanted_sort:
+        changes.append((f"{target}: sortkey {live['sortkey']} -> {wanted_sort}",
+                        f"ALTER TABLE {target} ALTER COMPOUND SORTKEY ({', '.join(spec['sortkey'])});"))
+    return changes
+
+
+def diff_schema(cur):
+    """Differences between every declared table and the live cluster"""
+    changes = []
+    for schema, tables in TABLES.items():
+        for table, spec in tables.items():
+            changes.extend(diff_table(schema, table, spec, fetch_live_table(cur, schema, table)))
+    return changes
+
+
+def manage_schema(apply=False):
+    """Print the schema diff; with apply=True also run the fixes (one ALTER per statement)"""
+    from warehouse_utils import warehouse_engine
+    if warehouse_engine() != "redshift":
+        print("Encodings, dist and sort keys only exist on Redshift; "
+              "create local tables with: python warehouse_utils.py init")
+        return []
+    conn = get_redshift_connection()
+    # ALTER DISTKEY/SORTKEY/ENCODE cannot run inside a transaction block
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    print("======================================")
+    print(f"Managed schema {'apply' if apply else 'diff'}")
+    print("======================================")
+
+    try:
+        changes = diff_schema(cur)
+        if not changes:
+            print("All managed tables match their declarations.")
+        for description, fix_sql in changes:
+            print(description)
+            if apply:
+                cur.execute(fix_sql)
+                print("  applied.")
+        return changes
+
+    finally:
+        cur.close()
+        conn.close()
+        print("Connection closed.")
+
+
+if __name__ == "__main__":
+    manage_schema(apply=len(sys.argv) > 1 and sys.argv[1] == "apply")
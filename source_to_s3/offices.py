@@ -5,6 +5,9 @@ import boto3
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_utils import get_connection, prepare_dblink, upload_to_s3,get_batch_date_from_redshift
+from step_log_utils import StepLogger, oracle_last_sql_id
+from storage_utils import table_key
+from catchup_utils import catch_up_dates, split_by_batch
 from dotenv import load_dotenv
 
 
@@ -22,28 +25,41 @@ def offices():
     """Extract offices data from Oracle and upload to S3"""
     print("Connecting to Oracle...")
     conn = get_connection()
+    step_log = StepLogger("source_to_s3", TABLE)
     cur = conn.cursor()
     BATCH_DATE = get_batch_date_from_redshift()
+    # In catch-up mode one extract, from the last pending batch's schema, covers every pending batch
+    BATCH_DATES = catch_up_dates(BATCH_DATE)
     # Create DBLink for this batch date
-    prepare_dblink(cur, BATCH_DATE)
+    prepare_dblink(cur, BATCH_DATES[-1])
 
     # Query remote schema via DBLink
     query = f"""
         SELECT {OFFICES_COL}
         FROM {TABLE}@gokul_dblink
-        WHERE UPDATE_TIMESTAMP >= TO_DATE('{BATCH_DATE}', 'YYYY-MM-DD')
+        WHERE UPDATE_TIMESTAMP >= TO_DATE('{BATCH_DATES[0]}', 'YYYY-MM-DD')
     """
 
     # Read into DataFrame
-    df = pd.read_sql_query(query, conn,dtype_backend="pyarrow")
+    with step_log.step("fetch", engine="oracle") as step:
+        df = pd.read_sql_query(query, conn, dtype_backend="pyarrow")
+        step["rowcount"] = len(df)
+        step["bytes"] = int(df.memory_usage(deep=True).sum())
+        step["query_id"] = oracle_last_sql_id(cur)
     print(f"Fetched {len(df)} rows from {TABLE}@gokul_dblink")
 
     # Upload to S3
-    s3_key = f"{TABLE.upper()}/{BATCH_DATE}/{TABLE}.csv"
-    upload_to_s3(df, S3_BUCKET_NAME, s3_key)
+    for batch_date, rows in split_by_batch(df, BATCH_DATES):
+        s3_key = table_key(TABLE, batch_date, f"{TABLE}.csv")
+        with step_log.step("upload", engine="s3") as step:
+            request_id, size = upload_to_s3(rows, S3_BUCKET_NAME, s3_key)
+            step["rowcount"] = len(rows)
+            step["bytes"] = size
+            step["query_id"] = request_id
 
     conn.close()
     print("Connection closed.")
+    step_log.flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,265 @@
+import os
+import re
+import sys
+import time
+import uuid
+import resource
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, METADATA_SCHEMA
+from schema_utils import ensure_table
+from profile_utils import span
+from trace_utils import trace_span
+from plan_utils import plan_capture_enabled, capture_plan
+
+STEP_LOG = "step_log"
+
+# ETL_TRACEMALLOC=<n> records the top n allocation sites of each task
+TRACEMALLOC_ENV = "ETL_TRACEMALLOC"
+
+# First keywords of a statement and its target, used when no step name is given
+STATEMENT_PATTERN = re.compile(
+    r"^\s*(CREATE\s+TEMP\s+TABLE|CREATE\s+TABLE(?:\s+IF\s+NOT\s+EXISTS)?|DROP\s+TABLE(?:\s+IF\s+EXISTS)?"
+    r"|INSERT\s+INTO|DELETE\s+FROM|UPDATE|MERGE\s+INTO|TRUNCATE\s+TABLE|COPY|ALTER\s+TABLE"
+    r"|SELECT|VACUUM|ANALYZE)\s*([\w.]*)",
+    re.IGNORECASE,
+)
+
+
+def current_run_id():
+    """Run id shared by master.py and every stage script it starts (via ETL_RUN_ID)"""
+    if not os.getenv("ETL_RUN_ID"):
+        os.environ["ETL_RUN_ID"] = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+    return os.environ["ETL_RUN_ID"]
+
+
+def default_step_name(sql):
+    """'INSERT INTO j25gokulraj_devdw.offices' style label of a statement"""
+    match = STATEMENT_PATTERN.match(sql)
+    if not match:
+        return sql.strip().split(None, 1)[0].upper() if sql.strip() else "EMPTY"
+    verb = " ".join(match.group(1).upper().split())
+    return f"{verb} {match.group(2)}".strip()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux)"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def top_allocations(limit):
+    """'file:line size' of the largest live allocation sites, biggest first"""
+    stats = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+    return "; ".join(
+        f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno} {s.size / 1048576:.1f}MB"
+        for s in stats
+    )[:2048]
+
+
+def oracle_last_sql_id(oracle_cursor):
+    """sql_id of the previous statement of this Oracle session, if v$session is readable"""
+    try:
+        oracle_cursor.execute("""
+            SELECT prev_sql_id
+            FROM v$session
+            WHERE sid = SYS_CONTEXT('USERENV', 'SID')
+        """)
+        row = oracle_cursor.fetchone()
+        return row[0] if row else None
+    except Exception:
+        return None
+
+
+class InstrumentedCursor:
+    """psycopg2 cursor that times every execute() and records it in a StepLogger.
+
+    Everything other than execute() is passed through, so it can be handed to
+    any helper that expects a plain cursor.
+    """
+
+    def __init__(self, cur, logger):
+        self._cur = cur
+        self._logger = logger
+
+    def execute(self, sql, params=None, step=None):
+        step = step or default_step_name(sql)
+        if plan_capture_enabled() and not capture_plan(self._cur, self._logger.table, step, sql, params):
+            return
+        with self._logger.step(step) as record:
+            self._cur.execute(sql, params)
+            record["rowcount"] = self._cur.rowcount
+            record["query_id"] = self._last_query_id()
+
+    def _last_query_id(self):
+        # Separate cursor so a pending SELECT result is not discarded
+        probe = self._cur.connection.cursor()
+        try:
+            probe.execute("SELECT pg_last_query_id();")
+            return probe.fetchone()[0]
+        except Exception:
+            return None
+        finally:
+            probe.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class StepLogger:
+    """Collects one record per statement / fetch / upload of a table script.
+
+    Records are kept in memory and written by flush() over a separate
+    connection, so a rolled back load still leaves its step log behind.
+    flush() also adds a "task" record with the CPU time, peak RSS, bytes
+    fetched/written and rows per second of the whole script.
+    """
+
+    def __init__(self, stage, table):
+        self.run_id = current_run_id()
+        self.stage = stage
+        self.table = table
+        self.records = []
+        self.task_start = time.perf_counter()
+        self.task_cpu_start = time.process_time()
+        self.task_started_at = datetime.now()
+        self.task_steps = []
+        self.tracemalloc_top = int(os.getenv(TRACEMALLOC_ENV, "0"))
+        if self.tracemalloc_top and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def cursor(self, cur):
+        return InstrumentedCursor(cur, self)
+
+    @contextmanager
+    def step(self, name, engine="redshift"):
+        """Time the enclosed block; the caller may fill rowcount, bytes and query_id"""
+        record = {
+            "step_name": name[:128],
+            "engine": engine,
+            "query_id": None,
+            "rowcount": None,
+            "bytes": None,
+            "status": "S",
+            "error": None,
+            "start_time": datetime.now(),
+        }
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        with trace_span(name, "step", engine=engine, table=self.table) as attributes:
+            try:
+                with span(name):
+                    yield record
+            except Exception as e:
+                record["status"] = "F"
+                record["error"] = str(e)[:512]
+                raise
+            finally:
+                record["wall_seconds"] = round(time.perf_counter() - start, 3)
+                record["cpu_seconds"] = round(time.process_time() - cpu_start, 3)
+                record["peak_rss_mb"] = peak_rss_mb()
+                record["end_time"] = datetime.now()
+                if record["rowcount"] and record["rowcount"] > 0 and record["wall_seconds"] > 0:
+                    record["rows_per_second"] = round(record["rowcount"] / record["wall_seconds"], 1)
+                attributes.update({k: record[k] for k in ("rowcount", "bytes", "query_id") if record[k] is not None})
+                self.records.append(record)
+                self.task_steps.append(record)
+                # Scripts that die on this error may never reach their own flush()
+                if record["status"] == "F":
+                    self._write()
+
+    def task_record(self):
+        """Resource totals of the whole table task"""
+        wall_seconds = round(time.perf_counter() - self.task_start, 3)
+        # Rows of the biggest step: the fetched/uploaded frame or the largest DML
+        rows = max((s["rowcount"] or 0 for s in self.task_steps), default=0)
+        record = {
+            "step_name": "task",
+            "engine": "python",
+            "query_id": None,
+            "rowcount": rows,
+            "bytes": None,
+            "bytes_fetched": sum(s["bytes"] or 0 for s in self.task_steps if s["engine"] == "oracle"),
+            "bytes_written": sum(s["bytes"] or 0 for s in self.task_steps if s["engine"] == "s3"),
+            "status": "F" if any(s["status"] == "F" for s in self.task_steps) else "S",
+            "error": None,
+            "start_time": self.task_started_at,
+            "end_time": datetime.now(),
+            "wall_seconds": wall_seconds,
+            "cpu_seconds": round(time.process_time() - self.task_cpu_start, 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "rows_per_second": round(rows / wall_seconds, 1) if rows and wall_seconds > 0 else None,
+            "top_allocations": top_allocations(self.tracemalloc_top) if self.tracemalloc_top else None,
+        }
+        print(f"Task {self.table}: {record['wall_seconds']}s wall, {record['cpu_seconds']}s CPU, "
+              f"peak RSS {record['peak_rss_mb']} MB, {record['bytes_fetched']} bytes fetched, "
+              f"{record['bytes_written']} bytes written, {record['rows_per_second']} rows/s")
+        if record["top_allocations"]:
+            print(f"Top allocations: {record['top_allocations']}")
+        return record
+
+    def flush(self):
+        """Add the task totals and write everything to the step log"""
+        self.records.append(self.task_record())
+        self._write()
+
+    def _write(self):
+        """Write the collected records to the step log; never fails the load"""
+        if not self.records:
+            return
+        if plan_capture_enabled():
+            # Plan capture runs load nothing, so they leave no step log either
+            self.records = []
+            return
+        try:
+            conn = get_redshift_connection()
+            cur = conn.cursor()
+            ensure_table(cur, METADATA_SCHEMA, STEP_LOG)
+            for r in self.records:
+                cur.execute(f"""
+                    INSERT INTO {METADATA_SCHEMA}.{STEP_LOG} (
+                        run_id,
+                        etl_batch_no,
+                        stage,
+                        table_name,
+                        step_name,
+                        engine,
+                        query_id,
+                        rowcount,
+                        bytes,
+                        wall_seconds,
+                        cpu_seconds,
+                        peak_rss_mb,
+                        rows_per_second,
+                        bytes_fetched,
+                        bytes_written,
+                        top_allocations,
+                        status,
+                        error,
+                        start_time,
+                        end_time
+                    )
+                    SELECT
+                        %s,
+                        b.etl_batch_no,
+                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+                    FROM {METADATA_SCHEMA}.batch_control b
+                    ORDER BY b.etl_batch_no DESC
+                    LIMIT 1;
+                """, (
+                    self.run_id, self.stage, self.table, r["step_name"], r["engine"],
+                    None if r["query_id"] is None else str(r["query_id"]),
+                    r["rowcount"], r["bytes"], r["wall_seconds"], r.get("cpu_seconds"),
+                    r.get("peak_rss_mb"), r.get("rows_per_second"), r.get("bytes_fetched"),
+                    r.get("bytes_written"), r.get("top_allocations"), r["status"], r["error"],
+                    r["start_time"], r["end_time"],
+                ))
+            conn.commit()
+            cur.close()
+            conn.close()
+            print(f"Step log: {len(self.records)} step(s) recorded for run {self.run_id}.")
+            self.records = []
+        except Exception as e:
+            print(f"Error writing step log: {e}")
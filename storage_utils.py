@@ -0,0 +1,134 @@
+import os
+import json
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# STORAGE_BACKEND picks where extracts are written and loaders read them from:
+#   s3      the bucket itself (default, production)
+#   local   LOCAL_EXTRACT_DIR/<bucket>/<key>, for co-located runs on the DuckDB engine
+#   memory  a dict in this process, for single-process benchmarks and experiments
+STORAGE_BACKEND_ENV = "STORAGE_BACKEND"
+LOCAL_EXTRACT_DIR_ENV = "LOCAL_EXTRACT_DIR"
+
+# Objects above the threshold go up as multipart uploads of PART_SIZE parts
+# (S3 needs at least 5 MB per part except the last one)
+MULTIPART_THRESHOLD = int(os.getenv("MULTIPART_THRESHOLD_MB", "64")) * 1024 * 1024
+PART_SIZE = int(os.getenv("MULTIPART_PART_SIZE_MB", "16")) * 1024 * 1024
+
+
+def table_key(table, batch_date, filename):
+    """Key of an extract file: TABLE/BATCH_DATE/filename"""
+    return f"{table.upper()}/{batch_date}/{filename}"
+
+
+def object_url(bucket, key):
+    return f"s3://{bucket}/{key}"
+
+
+def local_path(bucket, key):
+    return os.path.join(os.getenv(LOCAL_EXTRACT_DIR_ENV, os.path.join(ROOT_DIR, "extracts")), bucket, key)
+
+
+def split_parts(body, part_size=PART_SIZE):
+    return [body[i:i + part_size] for i in range(0, len(body), part_size)] or [b""]
+
+
+class S3Storage:
+    def __init__(self):
+        import boto3
+        self.client = boto3.client("s3")
+
+    def put(self, bucket, key, body):
+        """Store body (bytes); returns the request id"""
+        if len(body) <= MULTIPART_THRESHOLD:
+            response = self.client.put_object(Bucket=bucket, Key=key, Body=body)
+            return response["ResponseMetadata"].get("RequestId")
+
+        upload = self.client.create_multipart_upload(Bucket=bucket, Key=key)
+        try:
+            parts = []
+            for number, part in enumerate(split_parts(body), 1):
+                response = self.client.upload_part(Bucket=bucket, Key=key, UploadId=upload["UploadId"],
+                                                   PartNumber=number, Body=part)
+                parts.append({"PartNumber": number, "ETag": response["ETag"]})
+            response = self.client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload["UploadId"], MultipartUpload={"Parts": parts})
+        except Exception:
+            # Do not leave billed, invisible parts behind
+            self.client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload["UploadId"])
+            raise
+        return response["ResponseMetadata"].get("RequestId")
+
+    def get(self, bucket, key):
+        return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+
+class LocalStorage:
+    """Same keys as S3, under LOCAL_EXTRACT_DIR. Like a multipart upload, an
+    object only becomes visible once it is complete."""
+
+    def put(self, bucket, key, body):
+        path = local_path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(temp_path, "wb") as f:
+                for part in split_parts(body):
+                    f.write(part)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return uuid.uuid4().hex
+
+    def get(self, bucket, key):
+        with open(local_path(bucket, key), "rb") as f:
+            return f.read()
+
+
+class MemoryStorage:
+    """Objects in a dict; only visible inside this process"""
+
+    objects = {}
+
+    def put(self, bucket, key, body):
+        self.objects[(bucket, key)] = b"".join(split_parts(body))
+        return uuid.uuid4().hex
+
+    def get(self, bucket, key):
+        return self.objects[(bucket, key)]
+
+
+BACKENDS = {"s3": S3Storage, "local": LocalStorage, "memory": MemoryStorage}
+
+
+def storage_backend():
+    backend = os.getenv(STORAGE_BACKEND_ENV, "s3").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown {STORAGE_BACKEND_ENV} {backend!r}; expected one of {tuple(BACKENDS)}")
+    return backend
+
+
+def get_storage():
+    return BACKENDS[storage_backend()]()
+
+
+def write_manifest(storage, bucket, manifest_key, keys, sizes):
+    """Redshift COPY manifest listing the given objects (COPY ... MANIFEST)"""
+    manifest = {"entries": [
+        {"url": object_url(bucket, key), "mandatory": True, "meta": {"content_length": size}}
+        for key, size in zip(keys, sizes)
+    ]}
+    storage.put(bucket, manifest_key, json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+
+def read_manifest(storage, bucket, manifest_key):
+    """(bucket, key) of every entry of a COPY manifest"""
+    manifest = json.loads(storage.get(bucket, manifest_key))
+    return [tuple(entry["url"][len("s3://"):].split("/", 1)) for entry in manifest["entries"]]
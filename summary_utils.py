@@ -0,0 +1,218 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, METADATA_SCHEMA
+from schema_utils import ensure_table
+from catchup_utils import affected_batch_filter
+
+SUMMARY_LOAD_LOG = "summary_load_log"
+AFFECTED_KEYS = "summary_affected_keys"
+
+
+def stage_summary_rows(cur, staging_table, columns, select_sql):
+    """Materialize the recomputed summary rows into a temp table"""
+    cur.execute(f"DROP TABLE IF EXISTS {staging_table};")
+    cur.execute(f"""
+        CREATE TEMP TABLE {staging_table} ({", ".join(columns)})
+        AS {select_sql};
+    """)
+
+
+def replace_summary_range(cur, target, staging_table, columns, range_start,
+                          range_end=None, date_column="summary_date"):
+    """Swap [range_start, range_end] of target for the staged rows.
+
+    If range_end is None the range is closed at the latest date found in the
+    staged rows or already in the target, so stale rows past the recomputed
+    data are removed too. Nothing is committed here: the caller commits once,
+    which makes DELETE + INSERT + log entry a single transaction and a rerun
+    of the same batch a no-op on row counts.
+    """
+    if range_end is None:
+        cur.execute(f"""
+            SELECT MAX(d) FROM (
+                SELECT MAX({date_column}) AS d FROM {staging_table}
+                UNION ALL
+                SELECT MAX({date_column}) FROM {target}
+                WHERE {date_column} >= '{range_start}'
+            ) x;
+        """)
+        range_end = cur.fetchone()[0] or range_start
+
+    cur.execute(f"""
+        DELETE FROM {target}
+        WHERE {date_column} BETWEEN '{range_start}' AND '{range_end}';
+    """)
+    rows_deleted = cur.rowcount
+
+    cols = ", ".join(columns)
+    cur.execute(f"""
+        INSERT INTO {target} ({cols})
+        SELECT {cols}
+        FROM {staging_table}
+        WHERE {date_column} BETWEEN '{range_start}' AND '{range_end}';
+    """)
+    rows_inserted = cur.rowcount
+
+    record_replaced_range(cur, target, range_start, range_end, rows_deleted, rows_inserted)
+    print(f"Replaced {target} [{range_start} .. {range_end}]: "
+          f"{rows_deleted} rows deleted, {rows_inserted} rows inserted.")
+    return range_end, rows_deleted, rows_inserted
+
+
+def record_replaced_range(cur, target, range_start, range_end, rows_deleted, rows_inserted):
+    """Append the replaced range to the summary load log"""
+    ensure_table(cur, METADATA_SCHEMA, SUMMARY_LOAD_LOG)
+    cur.execute(f"""
+        INSERT INTO {METADATA_SCHEMA}.{SUMMARY_LOAD_LOG} (
+            table_name,
+            range_start,
+            range_end,
+            rows_deleted,
+            rows_inserted,
+            etl_batch_no,
+            etl_batch_date,
+            load_timestamp
+        )
+        SELECT
+            %s, %s, %s, %s, %s,
+            b.etl_batch_no,
+            b.etl_batch_date,
+            GETDATE()
+        FROM {METADATA_SCHEMA}.batch_control b
+        ORDER BY b.etl_batch_no DESC
+        LIMIT 1;
+    """, (target, str(range_start), str(range_end), rows_deleted, rows_inserted))
+
+
+def create_affected_keys(cur):
+    """Create the table of summary keys touched by each batch"""
+    ensure_table(cur, METADATA_SCHEMA, AFFECTED_KEYS)
+
+
+def record_affected_keys(cur, event_type, select_sql):
+    """Record the (summary_date, dw_customer_id, dw_product_id) rows of select_sql
+    as touched by the current batch. Loaders call this for both the old and the
+    new version of every changed fact so moved dates are recomputed on both ends.
+    """
+    create_affected_keys(cur)
+    cur.execute(f"""
+        INSERT INTO {METADATA_SCHEMA}.{AFFECTED_KEYS} (
+            etl_batch_no,
+            event_type,
+            summary_date,
+            dw_customer_id,
+            dw_product_id,
+            record_timestamp
+        )
+        SELECT
+            b.etl_batch_no,
+            '{event_type}',
+            k.summary_date,
+            k.dw_customer_id,
+            k.dw_product_id,
+            GETDATE()
+        FROM ({select_sql}) k
+        CROSS JOIN (
+            SELECT etl_batch_no
+            FROM {METADATA_SCHEMA}.batch_control
+            ORDER BY etl_batch_no DESC
+            LIMIT 1
+        ) b
+        WHERE k.summary_date IS NOT NULL;
+    """)
+
+
+def purge_affected_keys():
+    """Delete the affected keys of every batch up to the last passed one.
+
+    A passed batch's keys have been consumed by every summary, and a
+    --catch-up only recomputes from the batch after the last passed one, so
+    nothing reads them again; rerunning a batch records its keys anew.
+    """
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        create_affected_keys(cur)
+        cur.execute(f"""
+            DELETE FROM {METADATA_SCHEMA}.{AFFECTED_KEYS}
+            WHERE etl_batch_no <= (
+                SELECT MAX(etl_batch_no)
+                FROM {METADATA_SCHEMA}.batch_control_log
+                WHERE etl_batch_status = 'P'
+            );
+        """)
+        conn.commit()
+        print(f"Purged {cur.rowcount} consumed affected key(s).")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error purging affected keys: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def stage_affected_cells(cur, cells_table, key_column, event_types=None, grain="day"):
+    """Materialize the distinct (summary_date, key) cells touched by the current batch
+    (by every batch of the catch-up, see catchup_utils).
+
+    grain="month" truncates summary_date to the first of the month. Returns
+    (first_date, cell_count); first_date is None when nothing was touched.
+    """
+    create_affected_keys(cur)
+    date_expr = "k.summary_date" if grain == "day" else "DATE_TRUNC('month', k.summary_date)::date"
+    event_filter = ""
+    if event_types:
+        event_filter = "AND k.event_type IN (" + ", ".join(f"'{e}'" for e in event_types) + ")"
+
+    cur.execute(f"DROP TABLE IF EXISTS {cells_table};")
+    cur.execute(f"""
+        CREATE TEMP TABLE {cells_table}
+        DISTKEY ({key_column})
+        SORTKEY (summary_date, {key_column})
+        AS
+        SELECT DISTINCT
+            {date_expr} AS summary_date,
+            k.{key_column}
+        FROM {METADATA_SCHEMA}.{AFFECTED_KEYS} k
+        WHERE {affected_batch_filter("k.etl_batch_no")}
+          AND k.{key_column} IS NOT NULL
+          {event_filter};
+    """)
+    cur.execute(f"SELECT MIN(summary_date), COUNT(*) FROM {cells_table};")
+    first_date, cell_count = cur.fetchone()
+    print(f"{cell_count} affected ({grain}, {key_column}) cells from {first_date}.")
+    return first_date, cell_count
+
+
+def replace_summary_cells(cur, target, staging_table, columns, cells_table, key_column,
+                          date_column="summary_date"):
+    """Swap exactly the affected cells of target for the staged rows.
+
+    Cells that no longer produce a row (e.g. an order moved to another day)
+    are deleted and not reinserted. Like replace_summary_range, the caller
+    commits.
+    """
+    cur.execute(f"""
+        DELETE FROM {target}
+        USING {cells_table} c
+        WHERE {target}.{date_column} = c.summary_date
+          AND {target}.{key_column} = c.{key_column};
+    """)
+    rows_deleted = cur.rowcount
+
+    cols = ", ".join(columns)
+    cur.execute(f"""
+        INSERT INTO {target} ({cols})
+        SELECT {cols}
+        FROM {staging_table};
+    """)
+    rows_inserted = cur.rowcount
+
+    cur.execute(f"SELECT MIN(summary_date), MAX(summary_date) FROM {cells_table};")
+    range_start, range_end = cur.fetchone()
+    record_replaced_range(cur, target, range_start, range_end, rows_deleted, rows_inserted)
+    print(f"Replaced affected cells of {target} [{range_start} .. {range_end}]: "
+          f"{rows_deleted} rows deleted, {rows_inserted} rows inserted.")
+    return rows_deleted, rows_inserted
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import subprocess
+from datetime import datetime
+from dotenv import dotenv_values
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import get_redshift_connection, get_batch_date_from_redshift, METADATA_SCHEMA
+from schema_utils import ensure_table, DEVSTAGE_SCHEMA, DEVDW_SCHEMA
+from step_log_utils import current_run_id, STEP_LOG
+from storage_utils import table_key, object_url
+from profile_utils import task_command
+from trace_utils import trace_span, child_env
+from retry_utils import transient_class, retry_delay
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+TASK_STATE = "task_state"
+
+# Set by master.py --resume: stage runners skip tasks already done in this run
+RESUME_ENV = "ETL_RESUME"
+
+# Stage -> the .env list naming its table scripts
+STAGE_SCRIPT_LISTS = {
+    "source_to_s3": "scripts",
+    "s3_to_devstage": "scripts",
+    "devstage_to_devdw": "alltable",
+}
+
+# devdw tables and the other devdw tables they read. A task is rerun on
+# resume when anything upstream of it is rerun.
+DEVDW_DEPENDENCIES = {
+    "products": ["productlines"],
+    "employees": ["offices"],
+    "customers": ["employees"],
+    "orders": ["customers", "products"],
+    "orderdetails": ["orders", "products"],
+    "payments": ["customers"],
+    "customer_history": ["customers"],
+    "product_history": ["products"],
+    "dimension_history": ["customers", "products"],
+    "daily_customer_summary": ["customers", "orders", "orderdetails", "products", "payments"],
+    "daily_product_summary": ["orders", "orderdetails", "products"],
+    "monthly_customer_summary": ["daily_customer_summary"],
+    "monthly_product_summary": ["orders", "orderdetails", "products", "daily_product_summary"],
+}
+
+
+def stage_tables():
+    """{stage: [table, ...]} in run order, from each stage's .env script list"""
+    tables = {}
+    for stage, variable in STAGE_SCRIPT_LISTS.items():
+        env = dict(dotenv_values(os.path.join(ROOT_DIR, ".env")))
+        env.update(dotenv_values(os.path.join(ROOT_DIR, stage, ".env")))
+        scripts = os.getenv(variable) or env.get(variable) or ""
+        tables[stage] = [s.strip()[:-3] for s in scripts.split(",") if s.strip()]
+    return tables
+
+
+def upstream_tasks(stage, table, tables):
+    """(stage, table) tasks whose output this task reads"""
+    if stage == "s3_to_devstage":
+        upstream = [("source_to_s3", table)]
+    elif stage == "devstage_to_devdw":
+        upstream = [("s3_to_devstage", table)]
+        upstream += [("devstage_to_devdw", t) for t in DEVDW_DEPENDENCIES.get(table, [])]
+    else:
+        upstream = []
+    return [(s, t) for s, t in upstream if t in tables.get(s, [])]
+
+
+def output_location(stage, table):
+    if stage == "source_to_s3":
+        return object_url(os.getenv("S3_BUCKET_NAME"),
+                          table_key(table, get_batch_date_from_redshift(), f"{table}.csv"))
+    if stage == "s3_to_devstage":
+        return f"{DEVSTAGE_SCHEMA}.{table}"
+    return f"{DEVDW_SCHEMA}.{table}"
+
+
+def load_task_states(run_id):
+    """{(stage, table): status} of one run"""
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        ensure_table(cur, METADATA_SCHEMA, TASK_STATE)
+        cur.execute(f"""
+            SELECT stage, table_name, status
+            FROM {METADATA_SCHEMA}.{TASK_STATE}
+            WHERE run_id = %s;
+        """, (run_id,))
+        states = {(stage, table): status for stage, table, status in cur.fetchall()}
+        conn.commit()
+        return states
+    finally:
+        cur.close()
+        conn.close()
+
+
+def set_task_state(run_id, stage, table, status, output=None, error=None):
+    """Record pending / running / done / failed for one (stage, table) of a run"""
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        ensure_table(cur, METADATA_SCHEMA, TASK_STATE)
+        cur.execute(f"""
+            UPDATE {METADATA_SCHEMA}.{TASK_STATE}
+            SET
+                status = %s,
+                output_location = COALESCE(%s, output_location),
+                attempts = attempts + %s,
+                error = %s,
+                updated_at = GETDATE()
+            WHERE run_id = %s
+              AND stage = %s
+              AND table_name = %s;
+        """, (status, output, 1 if status == "running" else 0, error, run_id, stage, table))
+        if cur.rowcount == 0:
+            cur.execute(f"""
+                INSERT INTO {METADATA_SCHEMA}.{TASK_STATE} (
+                    run_id,
+                    etl_batch_no,
+                    stage,
+                    table_name,
+                    status,
+                    output_location,
+                    attempts,
+                    error,
+                    updated_at
+                )
+                SELECT
+                    %s,
+                    b.etl_batch_no,
+                    %s, %s, %s, %s, %s, %s,
+                    GETDATE()
+                FROM {METADATA_SCHEMA}.batch_control b
+                ORDER BY b.etl_batch_no DESC
+                LIMIT 1;
+            """, (run_id, stage, table, status, output, 1 if status == "running" else 0, error))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error recording task state {stage}/{table}: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def step_log_failure(run_id, stage, table, since):
+    """Error of the latest failed step of a task attempt started at `since`, else None.
+
+    Only read after a non-zero exit: the exit code is the success signal and
+    the step log, written best effort, just supplies the error text.
+    """
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT error
+            FROM {METADATA_SCHEMA}.{STEP_LOG}
+            WHERE run_id = %s
+              AND stage = %s
+              AND table_name = %s
+              AND status = 'F'
+              AND step_name <> 'task'
+              AND start_time >= %s
+            ORDER BY start_time DESC
+            LIMIT 1;
+        """, (run_id, stage, table, since))
+        row = cur.fetchone()
+        return (row[0] or "step failed") if row else None
+    except Exception as e:
+        print(f"Error reading step log for {stage}/{table}: {e}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def run_table_task(stage, script):
+    """Run one table script of a stage, recording its task state; returns True on success.
+
+    A table task is the retry unit for transient errors: extracts rewrite
+    the same key, COPYs truncate first and transforms commit once, so a
+    rerun of the whole script is safe where a rerun of one statement of a
+    rolled back transaction is not.
+    """
+    run_id = current_run_id()
+    table = script[:-3]
+    if os.getenv(RESUME_ENV) and load_task_states(run_id).get((stage, table)) == "done":
+        print(f"Skipping {script}: already done in run {run_id}")
+        return True
+
+    start = time.time()
+    attempt = 0
+    while True:
+        attempt += 1
+        print(f"Running {script} ..." if attempt == 1 else f"Retrying {script} (attempt {attempt}) ...")
+        set_task_state(run_id, stage, table, "running")
+        started_at = datetime.now()
+        with trace_span(script, "table", attempt=attempt) as attributes:
+            attributes["returncode"] = subprocess.run(task_command(stage, script), env=child_env()).returncode
+        if attributes["returncode"] == 0:
+            set_task_state(run_id, stage, table, "done", output=output_location(stage, table))
+            return True
+
+        # The failed step's error text tells a transient failure apart
+        error = step_log_failure(run_id, stage, table, started_at) or f"exit code {attributes['returncode']}"
+        error_class = transient_class(error)
+        delay = retry_delay(error_class, attempt, time.time() - start)
+        if delay is None:
+            set_task_state(run_id, stage, table, "failed", error=error[:512])
+            return False
+        print(f"Transient {error_class} failure of {script}: {error.splitlines()[0]}; "
+              f"retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def plan_resume(run_id):
+    """Mark the tasks a resumed run must execute as pending: every task not
+    done yet, plus everything downstream of one. Returns how many there are."""
+    tables = stage_tables()
+    states = load_task_states(run_id)
+    rerun = set()
+    for stage, stage_list in tables.items():
+        for table in stage_list:
+            if states.get((stage, table)) != "done" or any(
+                    task in rerun for task in upstream_tasks(stage, table, tables)):
+                rerun.add((stage, table))
+
+    print("======================================")
+    print(f"Resuming run {run_id}: {len(rerun)} task(s) to run")
+    print("======================================")
+    for stage, stage_list in tables.items():
+        for table in stage_list:
+            if (stage, table) in rerun:
+                print(f"  {stage}/{table} ({states.get((stage, table), 'never run')})")
+                set_task_state(run_id, stage, table, "pending")
+    return len(rerun)
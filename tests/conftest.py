@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "devstage_to_devdw"))
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+
+@pytest.fixture
+def duckdb_warehouse(tmp_path, monkeypatch):
+    """Empty local DuckDB warehouse (WAREHOUSE_ENGINE=duckdb) with local storage"""
+    import warehouse_utils
+    import storage_utils
+
+    monkeypatch.setenv(warehouse_utils.WAREHOUSE_ENGINE_ENV, "duckdb")
+    monkeypatch.setenv(warehouse_utils.DUCKDB_PATH_ENV, str(tmp_path / "warehouse.duckdb"))
+    monkeypatch.setenv(storage_utils.STORAGE_BACKEND_ENV, "local")
+    monkeypatch.setenv(storage_utils.LOCAL_EXTRACT_DIR_ENV, str(tmp_path / "s3"))
+    warehouse_utils.init_warehouse()
+    return tmp_path
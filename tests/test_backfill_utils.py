@@ -0,0 +1,42 @@
+from datetime import date
+
+import pytest
+
+from backfill_utils import month_partitions, BACKFILL_TABLES
+
+
+def test_single_month():
+    assert month_partitions("2004-03", "2004-03") == [(date(2004, 3, 1), date(2004, 3, 31))]
+
+
+def test_february_and_leap_years():
+    assert month_partitions("2004-02", "2004-02") == [(date(2004, 2, 1), date(2004, 2, 29))]
+    assert month_partitions("2005-02", "2005-02") == [(date(2005, 2, 1), date(2005, 2, 28))]
+
+
+def test_range_across_a_year_boundary():
+    assert month_partitions("2003-11", "2004-02") == [
+        (date(2003, 11, 1), date(2003, 11, 30)),
+        (date(2003, 12, 1), date(2003, 12, 31)),
+        (date(2004, 1, 1), date(2004, 1, 31)),
+        (date(2004, 2, 1), date(2004, 2, 29)),
+    ]
+
+
+def test_partitions_are_contiguous():
+    partitions = month_partitions("2001-01", "2005-12")
+    assert len(partitions) == 60
+    for (_, end), (start, _) in zip(partitions, partitions[1:]):
+        assert (start - end).days == 1
+
+
+def test_range_ending_before_it_starts():
+    with pytest.raises(ValueError):
+        month_partitions("2004-03", "2004-02")
+
+
+def test_monthly_tables_follow_their_daily_table():
+    order = list(BACKFILL_TABLES)
+    for table, dependencies in BACKFILL_TABLES.items():
+        for dependency in dependencies:
+            assert order.index(dependency) < order.index(table)
@@ -0,0 +1,80 @@
+import pytest
+
+import retry_utils
+from retry_utils import transient_class, retry_delay, retry_call, RETRY_POLICIES
+
+
+@pytest.mark.parametrize("error, expected", [
+    ("server closed the connection unexpectedly", "connection"),
+    ("could not connect to server: Connection refused", "connection"),
+    ("SSL SYSCALL error: EOF detected", "connection"),
+    ("An error occurred (SlowDown) when calling the PutObject operation", "throttling"),
+    ("botocore.exceptions.ClientError: ... (Status Code: 503)", "throttling"),
+    ("ORA-03113: end-of-file on communication channel", "oracle_network"),
+    ("DPY-4011: the database or network closed the connection", "oracle_network"),
+    ("ERROR: 1023 DETAIL: Serializable isolation violation on table", "serialization"),
+    # permanent errors
+    ("relation \"j25gokulraj_devdw.orders\" does not exist", None),
+    ("ORA-00942: table or view does not exist", None),
+    ("duplicate key value; order 503 already loaded", None),
+    ("invalid input syntax for type integer: \"1023x\"", None),
+    ("", None),
+    (None, None),
+])
+def test_transient_class(error, expected):
+    assert transient_class(error) == expected
+
+
+def test_transient_class_of_exception():
+    assert transient_class(ConnectionResetError("connection reset by peer")) == "connection"
+    assert transient_class(ValueError("bad value")) is None
+
+
+def test_retry_delay_is_full_jitter_within_the_cap():
+    policy = RETRY_POLICIES["connection"]
+    for attempt in range(1, policy["attempts"]):
+        ceiling = min(policy["cap_seconds"], policy["base_seconds"] * 2 ** (attempt - 1))
+        for _ in range(50):
+            assert 0 <= retry_delay("connection", attempt, 0) <= ceiling
+
+
+def test_retry_delay_stops():
+    assert retry_delay(None, 1, 0) is None
+    assert retry_delay("throttling", RETRY_POLICIES["throttling"]["attempts"], 0) is None
+    assert retry_delay("throttling", 1, retry_utils.RETRY_BUDGET_SECONDS) is None
+
+
+def test_retry_call_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(retry_utils.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("server closed the connection unexpectedly")
+        return "ok"
+    assert retry_call(flaky) == "ok"
+    assert len(calls) == 3
+
+
+def test_retry_call_gives_up(monkeypatch):
+    monkeypatch.setattr(retry_utils.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise ConnectionError("could not connect to server")
+    with pytest.raises(ConnectionError):
+        retry_call(down)
+    assert len(calls) == RETRY_POLICIES["connection"]["attempts"]
+
+
+def test_retry_call_does_not_retry_permanent_errors():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("syntax error at or near SELECT")
+    with pytest.raises(ValueError):
+        retry_call(broken)
+    assert len(calls) == 1
@@ -0,0 +1,37 @@
+import duckdb
+
+from scd2_utils import hash_expr, build_snapshot_sql, SCD2_DIMENSIONS, snapshot_table
+
+
+def row_hash(columns, values):
+    """hash_expr evaluated over one row with the given column values"""
+    select = ", ".join(f"CAST(? AS VARCHAR) AS {col}" for col in columns)
+    return duckdb.sql(f"SELECT {hash_expr('s', columns)} FROM (SELECT {select}) s", params=values).fetchone()[0]
+
+
+def test_hash_expr_sql():
+    assert hash_expr("s", ["creditLimit"]) == "MD5(COALESCE(CAST(s.creditLimit AS VARCHAR), ''))"
+    assert hash_expr("h", ["a", "b"]) == (
+        "MD5(COALESCE(CAST(h.a AS VARCHAR), '') || '|' || COALESCE(CAST(h.b AS VARCHAR), ''))")
+
+
+def test_hash_expr_is_null_safe():
+    assert row_hash(["a", "b"], ["x", None]) is not None
+    assert row_hash(["a", "b"], ["x", None]) != row_hash(["a", "b"], ["x", "y"])
+
+
+def test_hash_expr_separates_columns():
+    assert row_hash(["a", "b"], ["ab", "c"]) != row_hash(["a", "b"], ["a", "bc"])
+
+
+def test_hash_expr_depends_on_column_order():
+    assert row_hash(["a", "b"], ["1", "2"]) != row_hash(["a", "b"], ["2", "1"])
+
+
+def test_snapshot_has_one_hash_per_group():
+    sql = build_snapshot_sql("customers", SCD2_DIMENSIONS["customers"])
+    assert snapshot_table("customers") in sql
+    for history_table, columns in SCD2_DIMENSIONS["customers"]["groups"].items():
+        assert f"{hash_expr('s', columns)} AS hash_{history_table}" in sql
+    assert "WHERE s.etl_batch_no = b.etl_batch_no" in sql
+    assert "WHERE" not in build_snapshot_sql("customers", SCD2_DIMENSIONS["customers"], full_refresh=True)
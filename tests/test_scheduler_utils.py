@@ -0,0 +1,58 @@
+import pytest
+
+from scheduler_utils import task_ranks, ready_tasks, simulate, critical_path, stage_dependencies
+
+# b -> c is the long chain; a is long on its own
+TABLES = ["a", "b", "c"]
+DEPS = {"a": [], "b": [], "c": ["b"]}
+DURATIONS = {"a": 10.0, "b": 1.0, "c": 20.0}
+
+
+def test_task_ranks_add_the_longest_dependent_chain():
+    assert task_ranks(TABLES, DEPS, DURATIONS) == {"a": 10.0, "b": 21.0, "c": 20.0}
+
+
+def test_task_ranks_take_the_longest_of_several_chains():
+    deps = {"x": [], "y": ["x"], "z": ["x"], "w": ["z"]}
+    durations = {"x": 1.0, "y": 5.0, "z": 2.0, "w": 4.0}
+    assert task_ranks(list(deps), deps, durations) == {"x": 7.0, "y": 5.0, "z": 6.0, "w": 4.0}
+
+
+def test_ready_tasks_longest_first():
+    ranks = task_ranks(TABLES, DEPS, DURATIONS)
+    assert ready_tasks({"a", "b", "c"}, set(), DEPS, ranks) == ["b", "a"]
+    assert ready_tasks({"a", "c"}, {"b"}, DEPS, ranks) == ["c", "a"]
+
+
+@pytest.mark.parametrize("workers, expected", [
+    (1, {"b": (0.0, 1.0), "c": (1.0, 21.0), "a": (21.0, 31.0)}),
+    (2, {"b": (0.0, 1.0), "a": (0.0, 10.0), "c": (1.0, 21.0)}),
+    (3, {"b": (0.0, 1.0), "a": (0.0, 10.0), "c": (1.0, 21.0)}),
+])
+def test_simulate(workers, expected):
+    ranks = task_ranks(TABLES, DEPS, DURATIONS)
+    assert simulate(TABLES, DEPS, DURATIONS, ranks, workers) == expected
+
+
+def test_simulate_respects_dependencies():
+    deps = stage_dependencies("devstage_to_devdw", ["productlines", "products", "offices", "employees",
+                                                    "customers", "orders", "orderdetails",
+                                                    "daily_customer_summary", "monthly_customer_summary"])
+    durations = {t: float(len(t)) for t in deps}
+    schedule = simulate(list(deps), deps, durations, task_ranks(list(deps), deps, durations), 4)
+    assert set(schedule) == set(deps)
+    for t, upstream in deps.items():
+        for u in upstream:
+            assert schedule[u][1] <= schedule[t][0]
+
+
+def test_critical_path():
+    ranks = task_ranks(TABLES, DEPS, DURATIONS)
+    assert critical_path(simulate(TABLES, DEPS, DURATIONS, ranks, 2), DEPS) == ["b", "c"]
+    assert critical_path({}, DEPS) == []
+
+
+def test_stage_dependencies_stay_within_the_stage():
+    deps = stage_dependencies("devstage_to_devdw", ["customers", "orders", "payments"])
+    assert deps == {"customers": [], "orders": ["customers"], "payments": ["customers"]}
+    assert stage_dependencies("s3_to_devstage", ["orders"]) == {"orders": []}
@@ -0,0 +1,85 @@
+import pytest
+
+import task_state_utils
+from task_state_utils import upstream_tasks, plan_resume, load_task_states, set_task_state, stage_tables
+from db_utils import get_redshift_connection, METADATA_SCHEMA
+
+SCRIPTS = "customers.py, orders.py, orderdetails.py"
+ALLTABLE = "customers.py, orders.py, orderdetails.py, daily_customer_summary.py, monthly_customer_summary.py"
+
+
+@pytest.fixture
+def run(duckdb_warehouse, monkeypatch):
+    """Run id of a batch whose every task is done"""
+    monkeypatch.setenv("scripts", SCRIPTS)
+    monkeypatch.setenv("alltable", ALLTABLE)
+    conn = get_redshift_connection()
+    cur = conn.cursor()
+    cur.execute(f"INSERT INTO {METADATA_SCHEMA}.batch_control VALUES (1, '2001-01-01');")
+    conn.commit()
+    conn.close()
+    for stage, tables in stage_tables().items():
+        for table in tables:
+            set_task_state("run-1", stage, table, "done")
+    return "run-1"
+
+
+def test_stage_tables_from_env(monkeypatch):
+    monkeypatch.setenv("scripts", SCRIPTS)
+    monkeypatch.setenv("alltable", ALLTABLE)
+    tables = stage_tables()
+    assert tables["source_to_s3"] == ["customers", "orders", "orderdetails"]
+    assert tables["s3_to_devstage"] == ["customers", "orders", "orderdetails"]
+    assert tables["devstage_to_devdw"][-1] == "monthly_customer_summary"
+
+
+def test_upstream_tasks():
+    tables = {"source_to_s3": ["orders"], "s3_to_devstage": ["orders"],
+              "devstage_to_devdw": ["customers", "orders", "daily_customer_summary"]}
+    assert upstream_tasks("source_to_s3", "orders", tables) == []
+    assert upstream_tasks("s3_to_devstage", "orders", tables) == [("source_to_s3", "orders")]
+    # products is not part of this run, so it is not waited for
+    assert upstream_tasks("devstage_to_devdw", "orders", tables) == [
+        ("s3_to_devstage", "orders"), ("devstage_to_devdw", "customers")]
+    assert upstream_tasks("devstage_to_devdw", "daily_customer_summary", tables) == [
+        ("devstage_to_devdw", "customers"), ("devstage_to_devdw", "orders")]
+
+
+def test_monthly_summaries_wait_for_their_daily_table():
+    for monthly, daily in (("monthly_customer_summary", "daily_customer_summary"),
+                           ("monthly_product_summary", "daily_product_summary")):
+        assert daily in task_state_utils.DEVDW_DEPENDENCIES[monthly]
+
+
+def test_resume_of_a_finished_run_runs_nothing(run):
+    assert plan_resume(run) == 0
+
+
+def test_resume_reruns_failed_task_and_its_dependents(run):
+    set_task_state(run, "devstage_to_devdw", "orders", "failed", error="boom")
+    assert plan_resume(run) == 4
+    states = load_task_states(run)
+    assert {task for task, status in states.items() if status == "pending"} == {
+        ("devstage_to_devdw", "orders"),
+        ("devstage_to_devdw", "orderdetails"),
+        ("devstage_to_devdw", "daily_customer_summary"),
+        ("devstage_to_devdw", "monthly_customer_summary"),
+    }
+    assert states[("devstage_to_devdw", "customers")] == "done"
+
+
+def test_resume_reruns_downstream_of_an_earlier_stage(run):
+    set_task_state(run, "source_to_s3", "orderdetails", "running")
+    plan_resume(run)
+    pending = {task for task, status in load_task_states(run).items() if status == "pending"}
+    assert pending == {
+        ("source_to_s3", "orderdetails"),
+        ("s3_to_devstage", "orderdetails"),
+        ("devstage_to_devdw", "orderdetails"),
+        ("devstage_to_devdw", "daily_customer_summary"),
+        ("devstage_to_devdw", "monthly_customer_summary"),
+    }
+
+
+def test_resume_of_an_unknown_run_runs_everything(run):
+    assert plan_resume("run-2") == 3 + 3 + 5
@@ -0,0 +1,88 @@
+import pytest
+
+import storage_utils
+import warehouse_utils
+from warehouse_utils import rewrite_for_duckdb
+
+
+def test_copy_csv_reads_local_extract(duckdb_warehouse):
+    sql, before = rewrite_for_duckdb(
+        "COPY j25gokulraj_devstage.customers FROM 's3://bench/CUSTOMERS/2001-01-01/customers.csv' "
+        "IAM_ROLE 'local' FORMAT AS CSV IGNOREHEADER 1;")
+    path = storage_utils.local_path("bench", "CUSTOMERS/2001-01-01/customers.csv")
+    assert sql == (f"INSERT INTO j25gokulraj_devstage.customers SELECT * FROM "
+                   f"read_csv(['{path}'], header = true, all_varchar = true)")
+    assert before == []
+
+
+def test_copy_without_header(duckdb_warehouse):
+    sql, _ = rewrite_for_duckdb("COPY t FROM 's3://bench/T/x.csv' FORMAT AS CSV;")
+    assert "header = false" in sql
+
+
+def test_copy_parquet(duckdb_warehouse):
+    sql, _ = rewrite_for_duckdb("COPY t FROM 's3://bench/T/part-0' FORMAT AS PARQUET;")
+    assert sql == f"INSERT INTO t SELECT * FROM read_parquet(['{storage_utils.local_path('bench', 'T/part-0')}'])"
+
+
+def test_copy_manifest_reads_every_entry(duckdb_warehouse):
+    storage = storage_utils.get_storage()
+    storage_utils.write_manifest(storage, "bench", "T/manifest", ["T/part-0.csv", "T/part-1.csv"], [10, 20])
+    sql, _ = rewrite_for_duckdb("COPY t FROM 's3://bench/T/manifest' FORMAT AS CSV MANIFEST;")
+    paths = [storage_utils.local_path("bench", f"T/part-{i}.csv") for i in range(2)]
+    assert f"read_csv(['{paths[0]}', '{paths[1]}']" in sql
+    assert storage_utils.local_path("bench", "T/manifest") not in sql
+
+
+def test_copy_from_memory_storage_is_rejected(monkeypatch):
+    monkeypatch.setenv(storage_utils.STORAGE_BACKEND_ENV, "memory")
+    with pytest.raises(ValueError):
+        rewrite_for_duckdb("COPY t FROM 's3://bench/T/x.csv' FORMAT AS CSV;")
+
+
+def test_redshift_ddl_is_stripped():
+    sql, before = rewrite_for_duckdb("""
+        CREATE TABLE s.t (
+            id INT ENCODE az64,
+            name VARCHAR(50) ENCODE zstd
+        )
+        DISTSTYLE KEY
+        DISTKEY (id)
+        COMPOUND SORTKEY (id, name);
+    """)
+    for keyword in ("ENCODE", "DISTSTYLE", "DISTKEY", "SORTKEY"):
+        assert keyword not in sql
+    assert "id INT," in sql
+    assert "name VARCHAR(50)\n" in sql
+    assert before == []
+
+
+def test_identity_becomes_sequence():
+    sql, before = rewrite_for_duckdb("CREATE TABLE IF NOT EXISTS s.t (dw_id INT IDENTITY(1,1), name VARCHAR(10));")
+    assert before == ["CREATE SEQUENCE IF NOT EXISTS seq_s_t_dw_id"]
+    assert "dw_id INT DEFAULT nextval('seq_s_t_dw_id')" in sql
+
+
+def test_dateadd_becomes_interval():
+    sql, _ = rewrite_for_duckdb("SELECT DATEADD(day, -1, b.etl_batch_date), DATEADD(month, 1, d) FROM b")
+    assert sql == "SELECT (b.etl_batch_date + INTERVAL (-1) DAY), (d + INTERVAL (1) MONTH) FROM b"
+
+
+def test_rewritten_sql_runs_on_duckdb(duckdb_warehouse):
+    conn = warehouse_utils.connect_warehouse()
+    cur = conn.cursor()
+    cur.execute("CREATE TABLE t (dw_id INT IDENTITY(1,1), d DATE ENCODE az64) DISTSTYLE ALL SORTKEY (d);")
+    cur.execute("INSERT INTO t (d) VALUES ('2001-01-31'), ('2001-02-01');")
+    assert cur.rowcount == 2
+    cur.execute("SELECT dw_id, CAST(DATEADD(month, 1, d) AS DATE) FROM t ORDER BY dw_id;")
+    assert [(r[0], str(r[1])) for r in cur.fetchall()] == [(1, "2001-02-28"), (2, "2001-03-01")]
+    cur.execute("SELECT HLL_CARDINALITY(HLL_CREATE_SKETCH(x)) FROM (VALUES (1), (2), (2)) v(x);")
+    assert cur.fetchone() == (2,)
+    conn.rollback()
+    conn.close()
+
+
+def test_unknown_engine(monkeypatch):
+    monkeypatch.setenv(warehouse_utils.WAREHOUSE_ENGINE_ENV, "sqlite")
+    with pytest.raises(ValueError):
+        warehouse_utils.warehouse_engine()
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import uuid
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Trace context handed from master to stage runners to table scripts.
+# A span puts its id in ETL_PARENT_SPAN_ID while it is open, so anything
+# started with subprocess inside it becomes its child. Spans opened in
+# worker threads only track their parent per thread; start their
+# subprocesses with env=child_env().
+TRACE_DIR_ENV = "ETL_TRACE_DIR"
+PARENT_SPAN_ENV = "ETL_PARENT_SPAN_ID"
+TRACE_DISABLE_ENV = "ETL_TRACE"    # ETL_TRACE=0 turns tracing off
+
+_open_spans = threading.local()
+
+def tracing_enabled():
+    return bool(os.getenv(TRACE_DIR_ENV))
+
+
+def init_tracing():
+    """Start writing spans for this run (traces/<run_id>) unless already on or disabled"""
+    if tracing_enabled() or os.getenv(TRACE_DISABLE_ENV) == "0":
+        return tracing_enabled()
+    sys.path.append(ROOT_DIR)
+    from step_log_utils import current_run_id
+    os.environ[TRACE_DIR_ENV] = os.path.join(ROOT_DIR, "traces", current_run_id())
+    os.makedirs(os.environ[TRACE_DIR_ENV], exist_ok=True)
+    print(f"Tracing into {os.environ[TRACE_DIR_ENV]}")
+    return True
+
+
+def current_span_id():
+    stack = getattr(_open_spans, "stack", None)
+    return stack[-1] if stack else os.environ.get(PARENT_SPAN_ENV)
+
+
+def child_env():
+    """Environment for a subprocess started inside the current thread's open span"""
+    env = dict(os.environ)
+    if current_span_id():
+        env[PARENT_SPAN_ENV] = current_span_id()
+    return env
+
+
+def write_span(record):
+    # One file per process, so parallel tasks never interleave lines
+    path = os.path.join(os.environ[TRACE_DIR_ENV], f"spans-{os.getpid()}.jsonl")
+    with open(path, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def trace_span(name, kind, **attributes):
+    """Open a span (run, stage, table or step); yields its attribute dict for the caller to fill"""
+    if not tracing_enabled():
+        yield attributes
+        return
+    parent = current_span_id()
+    span_id = uuid.uuid4().hex[:16]
+    main_thread = threading.current_thread() is threading.main_thread()
+    if not hasattr(_open_spans, "stack"):
+        _open_spans.stack = []
+    _open_spans.stack.append(span_id)
+    if main_thread:
+        os.environ[PARENT_SPAN_ENV] = span_id
+    record = {
+        "trace_id": os.getenv("ETL_RUN_ID"),
+        "span_id": span_id,
+        "parent_span_id": parent,
+        "name": name,
+        "kind": kind,
+        "start_ns": time.time_ns(),
+        "status": "OK",
+        "pid": os.getpid(),
+        "attributes": attributes,
+    }
+    try:
+        yield attributes
+    except BaseException as e:
+        record["status"] = "ERROR"
+        attributes["error"] = str(e)[:512]
+        raise
+    finally:
+        record["end_ns"] = time.time_ns()
+        _open_spans.stack.pop()
+        if main_thread:
+            if parent is None:
+                os.environ.pop(PARENT_SPAN_ENV, None)
+            else:
+                os.environ[PARENT_SPAN_ENV] = parent
+        write_span(record)
+
+
+def load_spans(trace_dir):
+    spans = []
+    for name in sorted(os.listdir(trace_dir)):
+        if name.startswith("spans-") and name.endswith(".jsonl"):
+            with open(os.path.join(trace_dir, name)) as f:
+                spans.extend(json.loads(line) for line in f if line.strip())
+    spans.sort(key=lambda s: s["start_ns"])
+    return spans
+
+
+def to_chrome_trace(spans):
+    """chrome://tracing / Perfetto JSON: one complete event per span, one lane per process"""
+    events = [{
+        "name": s["name"],
+        "cat": s["kind"],
+        "ph": "X",
+        "ts": s["start_ns"] / 1000.0,
+        "dur": (s["end_ns"] - s["start_ns"]) / 1000.0,
+        "pid": 1,
+        "tid": s["pid"],
+        "args": dict(s["attributes"], span_id=s["span_id"], parent_span_id=s["parent_span_id"]),
+    } for s in spans]
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans):
+    """OTLP/JSON ExportTraceServiceRequest (accepted by collectors' file receivers)"""
+    otlp_spans = []
+    for s in spans:
+        span = {
+            # OTLP trace ids are 16 bytes; derive one from the run id
+            "traceId": hashlib.md5(str(s["trace_id"]).encode()).hexdigest(),
+            "spanId": s["span_id"],
+            "name": s["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(s["start_ns"]),
+            "endTimeUnixNano": str(s["end_ns"]),
+            "attributes": [{"key": k, "value": otlp_value(v)}
+                           for k, v in dict(s["attributes"], **{"etl.kind": s["kind"]}).items()
+                           if v is not None],
+            "status": {"code": 2 if s["status"] == "ERROR" else 1},
+        }
+        if s["parent_span_id"]:
+            span["parentSpanId"] = s["parent_span_id"]
+        otlp_spans.append(span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "python-etl"}}]},
+        "scopeSpans": [{"scope": {"name": "trace_utils"}, "spans": otlp_spans}],
+    }]}
+
+
+def print_tree(spans, kinds=("run", "stage", "table")):
+    """Run timeline down to table level, with the idle gap before each span"""
+    children = {}
+    for s in spans:
+        children.setdefault(s["parent_span_id"], []).append(s)
+    ids = {s["span_id"] for s in spans}
+    roots = [s for s in spans if s["parent_span_id"] not in ids]
+
+    def walk(span, depth, prev_end):
+        seconds = (span["end_ns"] - span["start_ns"]) / 1e9
+        gap = (span["start_ns"] - prev_end) / 1e9 if prev_end else 0.0
+        print(f"{'  ' * depth}{span['name']:<{48 - 2 * depth}} {seconds:>9.2f}s"
+              f"{f'  (+{gap:.2f}s gap)' if gap > 0.5 else ''}  {span['status']}")
+        end = span["start_ns"]
+        for child in children.get(span["span_id"], []):
+            if child["kind"] in kinds:
+                end = walk(child, depth + 1, end)
+        return span["end_ns"]
+
+    for root in roots:
+        if root["kind"] in kinds:
+            walk(root, 0, None)
+
+
+def export(trace_dir, formats=("chrome",)):
+    """Merge a run's span files and write trace.chrome.json and/or trace.otlp.json"""
+    spans = load_spans(trace_dir)
+    print("======================================")
+    print(f"Trace {trace_dir}: {len(spans)} span(s)")
+    print("======================================")
+    print_tree(spans)
+    for fmt in formats:
+        payload = to_chrome_trace(spans) if fmt == "chrome" else to_otlp(spans)
+        path = os.path.join(trace_dir, f"trace.{fmt}.json")
+        with open(path, "w") as f:
+            json.dump(payload, f)
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    # python trace_utils.py <trace_dir> [chrome] [otlp]
+    export(sys.argv[1], tuple(sys.argv[2:]) or ("chrome",))
@@ -0,0 +1,219 @@
+import os
+import re
+import psycopg2
+from dotenv import load_dotenv
+from storage_utils import get_storage, storage_backend, local_path, read_manifest
+from retry_utils import retry_call
+
+load_dotenv()
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# WAREHOUSE_ENGINE=duckdb runs the devstage/devdw SQL on an embedded DuckDB
+# file instead of Redshift. COPY from s3://<bucket>/<key> then reads the
+# object from the STORAGE_BACKEND (CSV as written by source_to_s3, or Parquet).
+WAREHOUSE_ENGINE_ENV = "WAREHOUSE_ENGINE"
+ENGINES = ("redshift", "duckdb")
+DUCKDB_PATH_ENV = "WAREHOUSE_DUCKDB_PATH"
+
+
+def warehouse_engine():
+    engine = os.getenv(WAREHOUSE_ENGINE_ENV, "redshift").lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown {WAREHOUSE_ENGINE_ENV} {engine!r}; expected one of {ENGINES}")
+    return engine
+
+
+def duckdb_source(bucket, key):
+    """Path DuckDB reads an object from: a local file, or the S3 URL itself (httpfs)"""
+    backend = storage_backend()
+    if backend == "local":
+        return local_path(bucket, key)
+    if backend == "s3":
+        return f"s3://{bucket}/{key}"
+    raise ValueError(f"DuckDB cannot COPY from {backend} storage; use STORAGE_BACKEND=local")
+
+
+def connect_warehouse(**redshift_args):
+    """psycopg2 connection to Redshift, or a DuckDBConnection when WAREHOUSE_ENGINE=duckdb.
+
+    Takes the same keyword arguments as psycopg2.connect; DuckDB ignores them.
+    """
+    if warehouse_engine() == "duckdb":
+        return DuckDBConnection(os.getenv(DUCKDB_PATH_ENV, os.path.join(ROOT_DIR, "warehouse.duckdb")))
+    return retry_call(psycopg2.connect, description="Redshift connect", **redshift_args)
+
+
+# -- Dialect: Redshift statement -> DuckDB statement ------------------------
+
+# Redshift functions and types the transforms use, as DuckDB macros.
+# HLL sketches become exact distinct lists, so cardinalities are exact.
+DUCKDB_MACROS = [
+    "CREATE OR REPLACE TEMP MACRO getdate() AS CAST(current_timestamp AS TIMESTAMP)",
+    "CREATE OR REPLACE TEMP MACRO pg_last_query_id() AS -1",
+    "CREATE OR REPLACE TEMP MACRO hll_create_sketch(x) AS list_distinct(list(CAST(x AS VARCHAR)))",
+    "CREATE OR REPLACE TEMP MACRO hll_combine(s) AS list_distinct(flatten(list(s)))",
+    "CREATE OR REPLACE TEMP MACRO hll_combine_sketches(a, b) AS list_distinct(list_concat(a, b))",
+    "CREATE OR REPLACE TEMP MACRO hll_cardinality(s) AS len(s)",
+]
+
+DDL_REWRITES = [
+    (re.compile(r"\s+ENCODE\s+\w+", re.IGNORECASE), ""),
+    (re.compile(r"\s+DISTSTYLE\s+\w+", re.IGNORECASE), ""),
+    (re.compile(r"\s+DISTKEY\s*\([^)]*\)", re.IGNORECASE), ""),
+    (re.compile(r"\s+(COMPOUND\s+|INTERLEAVED\s+)?SORTKEY\s*\([^)]*\)", re.IGNORECASE), ""),
+]
+DATEADD_PATTERN = re.compile(r"DATEADD\(\s*(\w+)\s*,\s*([^,]+?)\s*,\s*([\w.]+)\s*\)", re.IGNORECASE)
+COPY_PATTERN = re.compile(r"^\s*COPY\s+(\S+)\s+FROM\s+'s3://([^/']+)/([^']+)'(.*)$", re.IGNORECASE | re.DOTALL)
+IDENTITY_PATTERN = re.compile(r"(\w+)\s+INT\s+IDENTITY\(\s*1\s*,\s*1\s*\)", re.IGNORECASE)
+CREATE_TABLE_PATTERN = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w.]+)", re.IGNORECASE)
+DML_PATTERN = re.compile(r"^\s*(INSERT|UPDATE|DELETE|MERGE|COPY|TRUNCATE)\b", re.IGNORECASE)
+
+
+def rewrite_for_duckdb(sql):
+    """Redshift statement -> (DuckDB statement, statements to run before it)"""
+    before = []
+    copy = COPY_PATTERN.match(sql)
+    if copy:
+        table, bucket, key, options = copy.groups()
+        objects = [(bucket, key)]
+        if re.search(r"\bMANIFEST\b", options, re.IGNORECASE):
+            objects = read_manifest(get_storage(), bucket, key)
+        paths = ", ".join(f"'{duckdb_source(b, k)}'" for b, k in objects)
+        if key.endswith(".parquet") or re.search(r"FORMAT\s+AS\s+PARQUET", options, re.IGNORECASE):
+            return f"INSERT INTO {table} SELECT * FROM read_parquet([{paths}])", before
+        header = "true" if re.search(r"IGNOREHEADER\s+1", options, re.IGNORECASE) else "false"
+        return f"INSERT INTO {table} SELECT * FROM read_csv([{paths}], header = {header}, all_varchar = true)", before
+
+    for pattern, replacement in DDL_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    sql = DATEADD_PATTERN.sub(lambda m: f"({m.group(3)} + INTERVAL ({m.group(2)}) {m.group(1).upper()})", sql)
+
+    if IDENTITY_PATTERN.search(sql):
+        table = CREATE_TABLE_PATTERN.search(sql).group(1).replace(".", "_")
+
+        def identity(m):
+            sequence = f"seq_{table}_{m.group(1)}"
+            before.append(f"CREATE SEQUENCE IF NOT EXISTS {sequence}")
+            return f"{m.group(1)} INT DEFAULT nextval('{sequence}')"
+        sql = IDENTITY_PATTERN.sub(identity, sql)
+    return sql, before
+
+
+class DuckDBCursor:
+    """psycopg2-like cursor. Results are fetched eagerly: a DuckDB connection
+    has one pending result, while psycopg2 cursors on one connection each
+    keep their own."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._rows = []
+        self.rowcount = -1
+        self.description = None
+
+    def execute(self, sql, params=None):
+        sql, before = rewrite_for_duckdb(sql)
+        if params is not None:
+            sql = sql.replace("%s", "?").replace("%%", "%")
+        self.connection._begin()
+        for statement in before:
+            self.connection.duck.execute(statement)
+        result = self.connection.duck.execute(sql, params)
+        self.description = result.description
+        self._rows = result.fetchall() if result.description else []
+        self.rowcount = len(self._rows)
+        if DML_PATTERN.match(sql):
+            self.rowcount = self._rows[0][0] if self._rows else 0
+            self.description = None
+            self._rows = []
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class DuckDBConnection:
+    """psycopg2-like connection: transactional unless autocommit is set"""
+
+    def __init__(self, path):
+        import duckdb
+        self.duck = duckdb.connect(path)
+        self.autocommit = False
+        self._in_transaction = False
+        existing = self.duck.execute(
+            "SELECT type_name FROM duckdb_types() WHERE type_name = 'hllsketch'").fetchall()
+        if not existing:
+            self.duck.execute("CREATE TYPE hllsketch AS VARCHAR[]")
+        for macro in DUCKDB_MACROS:
+            self.duck.execute(macro)
+
+    def _begin(self):
+        if not self.autocommit and not self._in_transaction:
+            self.duck.execute("BEGIN TRANSACTION")
+            self._in_transaction = True
+
+    def cursor(self):
+        return DuckDBCursor(self)
+
+    def commit(self):
+        if self._in_transaction:
+            self.duck.execute("COMMIT")
+            self._in_transaction = False
+
+    def rollback(self):
+        if self._in_transaction:
+            self.duck.execute("ROLLBACK")
+            self._in_transaction = False
+
+    def close(self):
+        self.rollback()
+        self.duck.close()
+
+
+def init_warehouse():
+    """Create the schemas, every declared table and the batch control tables if missing"""
+    from db_utils import get_redshift_connection, METADATA_SCHEMA
+    from schema_utils import TABLES, render_create_table
+
+    conn = get_redshift_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        for schema in TABLES:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema};")
+            for table, spec in TABLES[schema].items():
+                cur.execute(render_create_table(schema, table, spec))
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {METADATA_SCHEMA}.batch_control (
+                etl_batch_no INT,
+                etl_batch_date DATE
+            );
+        """)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {METADATA_SCHEMA}.batch_control_log (
+                etl_batch_no INT,
+                etl_batch_date DATE,
+                etl_batch_status VARCHAR(1),
+                etl_batch_start_time TIMESTAMP,
+                etl_batch_end_time TIMESTAMP
+            );
+        """)
+        print(f"Warehouse initialized ({warehouse_engine()}).")
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    # WAREHOUSE_ENGINE=duckdb python warehouse_utils.py init
+    import sys
+    if sys.argv[1:] == ["init"]:
+        init_warehouse()
+    else:
+        sys.exit("Usage: python warehouse_utils.py init")